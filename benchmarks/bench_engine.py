@@ -0,0 +1,298 @@
+'''
+Benchmark backtest wall time against table size and strategy count.
+
+Every case runs SmaCrossOpGen strategies over a synthetic price series
+in a separate process and records wall time, peak RSS and cost per op
+and row. Results are written as JSON and drawn as a chart.
+The stream engine runs once for every chunk size, to find the optimal one.
+
+If a baseline is given, exits with 1 when any case is slower than
+its baseline by more than the threshold.
+'''
+import argparse
+import json
+import multiprocessing
+import platform
+import queue
+import resource
+import sys
+import time
+import numpy as np
+import pandas as pd
+import vfin
+import vplot
+import vtable
+import vtime
+import backtest.plot
+import backtest.program
+import backtest.stream
+import backtest.vector
+import strategies.sma_cross
+import strategies.sma_cross_batch
+
+TICKER = 'BENCH'
+INSTRUMENT = vfin.InstrumentInfo(ticker_name=TICKER,
+                                 di={'close': vtable.DataInfo(TICKER, 'Close')},
+                                 slippage=0.5)
+ENGINES = {'vfin': vfin.BacktestEngine,
+           'vector': backtest.vector.BacktestEngine,
+           'program': backtest.program.BacktestEngine,
+           'stream': backtest.stream.BacktestEngine,
+           'batch': None}
+
+
+def synthetic_dfs(bars: int) -> dict[str, pd.DataFrame]:
+    '''
+    Return a deterministic hourly random walk of `bars` rows.
+    '''
+    rng = np.random.default_rng(bars)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, bars)))
+    index = pd.date_range('1960-01-01', periods=bars, freq='h')
+    return {TICKER: pd.DataFrame({'Close': close}, index=index)}
+
+
+def params(n: int) -> list[dict[str, int]]:
+    '''
+    Return `n` distinct SmaCrossOpGen params.
+    '''
+    ret = []
+    for i in range(n):
+        fast = 5 + i % 50
+        slow = fast + 10 + i // 50
+        ret.append({'long entry fast sma': fast,
+                    'long entry slow sma': slow,
+                    'long exit fast sma': fast,
+                    'long exit slow sma': slow})
+    return ret
+
+
+# pylint: disable=too-many-arguments
+def _run_case(engine: str,
+              bars: int,
+              n: int,
+              chunk_size: int,
+              results: multiprocessing.Queue):
+    dfs = synthetic_dfs(bars)
+    monthly_alarm = vtime.Alarm('monthly')
+    start = time.perf_counter()
+    if engine == 'batch':
+        strategies.sma_cross_batch.SmaCrossBatch(
+            params=params(n),
+            price_info=INSTRUMENT,
+            initial_cash=1000,
+            add_cash=100,
+            add_cash_alarm=monthly_alarm).run(dfs)
+        n_ops = n
+    else:
+        opgens = [strategies.sma_cross.SmaCrossOpGen(
+            price_info=INSTRUMENT,
+            initial_cash=1000,
+            add_cash=100,
+            add_cash_alarm=monthly_alarm,
+            params=p,
+            name=f'sma cross {i}') for i, p in enumerate(params(n))]
+        ops = []
+        for opgen in opgens:
+            ops += opgen.ops()
+        n_ops = len(ops)
+        if engine == 'stream':
+            # results are dropped chunk by chunk, memory stays constant
+            for _ in ENGINES[engine](
+                    ops,
+                    dfs=dfs,
+                    lookback=backtest.stream.max_lookback(opgens),
+                    chunk_size=chunk_size).chunks():
+                pass
+        else:
+            ENGINES[engine](ops, dfs=dfs).run()
+    wall = time.perf_counter() - start
+    # kilobytes on linux, bytes on macos
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        rss *= 1024
+    results.put({'engine': engine,
+                 'bars': bars,
+                 'strategies': n,
+                 'chunk size': chunk_size,
+                 'ops': n_ops,
+                 'wall s': wall,
+                 'peak rss bytes': rss,
+                 'op row ns': wall / (n_ops * bars) * 1e9})
+
+
+def run_case(engine: str,
+             bars: int,
+             n: int,
+             chunk_size: int = None,
+             timeout: float = None) -> dict:
+    '''
+    Run one case in a separate process, so peak RSS is its own.
+
+    Returns:
+        case results, or the case with 'error' if the process
+        exited with an error or ran longer than `timeout` seconds
+    '''
+    ctx = multiprocessing.get_context()
+    results = ctx.Queue()
+    p = ctx.Process(target=_run_case,
+                    args=(engine, bars, n, chunk_size, results))
+    p.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    result = None
+    timed_out = False
+    while result is None:
+        try:
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            if not p.is_alive():
+                # results are put before exit, a last read takes them
+                try:
+                    result = results.get(timeout=1.0)
+                except queue.Empty:
+                    pass
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                p.terminate()
+                timed_out = True
+                break
+    p.join()
+    error = None
+    if timed_out:
+        error = f'timed out after {timeout} s'
+    elif p.exitcode:
+        error = f'exit code {p.exitcode}'
+    elif result is None:
+        error = 'no results'
+    if error is None:
+        return result
+    return {'engine': engine,
+            'bars': bars,
+            'strategies': n,
+            'chunk size': chunk_size,
+            'error': error}
+
+
+def case_id(case: dict) -> str:
+    '''
+    Return the id of a case, equal for equal setups.
+    '''
+    ret = f'{case["engine"]}/{case["bars"]}/{case["strategies"]}'
+    if case.get('chunk size'):
+        ret += f'/{case["chunk size"]}'
+    return ret
+
+
+def regressions(cases: list[dict],
+                baseline: list[dict],
+                threshold: float) -> list[str]:
+    '''
+    Return descriptions of cases slower than their baseline.
+    '''
+    base = {case_id(c): c for c in baseline}
+    ret = []
+    for c in cases:
+        b = base.get(case_id(c))
+        if b and c['wall s'] > b['wall s'] * (1 + threshold):
+            ret.append(f'{case_id(c)}: {c["wall s"]:.3f} s, '
+                       f'baseline {b["wall s"]:.3f} s')
+    return ret
+
+
+def plot(cases: list[dict], filename: str):
+    '''
+    Draw wall time against bars, one trace per engine and strategy count.
+    '''
+    traces = []
+    keys = sorted({(c['engine'], c['strategies'], c.get('chunk size') or 0)
+                   for c in cases})
+    for i, (engine, n, chunk_size) in enumerate(keys):
+        cs = sorted((c for c in cases
+                     if c['engine'] == engine
+                     and c['strategies'] == n
+                     and (c.get('chunk size') or 0) == chunk_size),
+                    key=lambda c: c['bars'])
+        name = f'{engine}, {n} strategies'
+        if chunk_size:
+            name += f', {chunk_size} rows per chunk'
+        traces.append(vplot.Scatter(
+            x=[c['bars'] for c in cs],
+            y=[c['wall s'] for c in cs],
+            color=backtest.plot.color(i),
+            width=1.0,
+            mode='lines+markers',
+            name=name))
+    backtest.plot.to_file([vplot.Subplot(col=1, row=1, traces=traces)],
+                          filename)
+
+
+def main() -> int:
+    '''
+    Run benchmarks from the command line.
+    '''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--engine', nargs='+', choices=list(ENGINES),
+                        default=['vector', 'batch'])
+    parser.add_argument('--bars', nargs='+', type=int,
+                        default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--strategies', nargs='+', type=int,
+                        default=[1, 10, 100, 1000])
+    parser.add_argument('--chunk-size', nargs='+', type=int,
+                        default=[backtest.stream.CHUNK_SIZE],
+                        help='chunk sizes of the stream engine')
+    parser.add_argument('--max-cells', type=int, default=10_000_000,
+                        help='skip cases with more bars * strategies')
+    parser.add_argument('--timeout', type=float,
+                        help='seconds before a case fails')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--plot', default='bench_results.html')
+    parser.add_argument('--baseline',
+                        help='results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    cases = []
+    failed = []
+    for engine in args.engine:
+        for bars in args.bars:
+            for n in args.strategies:
+                if bars * n > args.max_cells:
+                    continue
+                chunk_sizes = [None]
+                if engine == 'stream':
+                    chunk_sizes = args.chunk_size
+                for chunk_size in chunk_sizes:
+                    case = run_case(engine, bars, n, chunk_size,
+                                    args.timeout)
+                    if 'error' in case:
+                        print(f'{case_id(case)}: failed, {case["error"]}')
+                        failed.append(case)
+                        continue
+                    print(f'{case_id(case)}: {case["wall s"]:.3f} s, '
+                          f'{case["peak rss bytes"] / 2**20:.0f} MiB, '
+                          f'{case["op row ns"]:.1f} ns/op/row')
+                    cases.append(case)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'python': platform.python_version(),
+                   'machine': platform.machine(),
+                   'cases': cases,
+                   'failed': failed}, f, indent=4)
+    if args.plot:
+        plot(cases, args.plot)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['cases']
+        slow = regressions(cases, baseline, args.threshold)
+        for s in slow:
+            print(f'regression: {s}')
+        if slow:
+            return 1
+    if failed:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+'''
+Vectorized alarm signals.
+
+The signal of a periodic alarm is calculated at once from the table
+index by detecting period changes, e.g. month changes for 'monthly',
+the first row is always on. Signals are cached per (alarm state, index)
+in a bounded LRU, so every opgen using the same alarm over the same data
+shares one mask. Only alarms equal to the plain alarm of a period are
+vectorized.
+
+Alarms with unknown periods are run through vfin_ops.AlarmOpGen
+by the reference engine, also once per (alarm, index).
+'''
+import collections
+import functools
+import hashlib
+import json
+import typing
+import numpy as np
+import pandas as pd
+import vfin
+import vfin_ops
+import vtime
+import backtest.memo
+import backtest.vector
+
+PERIODS = ['daily', 'weekly', 'monthly', 'quarterly', 'yearly']
+# cached signals, least recently used are dropped
+MAX_MASKS = 64
+
+# signals by (alarm key, index key)
+_MASKS = collections.OrderedDict()
+
+
+def _alarm_key(alarm: typing.Union[str, vtime.Alarm]) \
+        -> typing.Optional[str]:
+    # the whole state, alarms differing in any attribute differ
+    try:
+        return json.dumps(backtest.memo.normalize(alarm), sort_keys=True)
+    except TypeError:
+        return None
+
+
+def period(alarm: typing.Union[str, vtime.Alarm]) -> typing.Optional[str]:
+    '''
+    Return the period of `alarm`, None if not one of PERIODS
+    or if the alarm differs from the plain periodic alarm,
+    e.g. by an offset.
+    '''
+    if isinstance(alarm, str):
+        return alarm if alarm in PERIODS else None
+    key = _alarm_key(alarm)
+    if key is None:
+        return None
+    for v in getattr(alarm, '__dict__', {}).values():
+        if not isinstance(v, str) or v not in PERIODS:
+            continue
+        try:
+            plain = type(alarm)(v)
+        except (TypeError, ValueError):
+            return None
+        return v if _alarm_key(plain) == key else None
+    return None
+
+
+def _index_key(index: pd.Index) -> tuple:
+    h = hashlib.sha1(index.to_numpy(dtype='datetime64[ns]')
+                     .view(np.int64).tobytes())
+    return len(index), str(getattr(index, 'tz', None)), h.hexdigest()
+
+
+def changes(values: np.ndarray) -> np.ndarray:
+    '''
+    Return True where a value differs from the previous one
+    and for the first value.
+    '''
+    ret = np.ones(len(values), dtype=bool)
+    ret[1:] = values[1:] != values[:-1]
+    return ret
+
+
+def period_mask(p: str, index: pd.DatetimeIndex) -> np.ndarray:
+    '''
+    Return the signal of a periodic alarm for every row of `index`.
+    '''
+    if p == 'daily':
+        values = index.year * 10000 + index.month * 100 + index.day
+    elif p == 'weekly':
+        iso = index.isocalendar()
+        values = iso['year'].to_numpy() * 100 + iso['week'].to_numpy()
+    elif p == 'monthly':
+        values = index.year * 12 + index.month
+    elif p == 'quarterly':
+        values = index.year * 4 + index.quarter
+    elif p == 'yearly':
+        values = index.year
+    else:
+        raise ValueError(f'unknown period {p}')
+    return changes(np.asarray(values))
+
+
+def reference_mask(alarm: typing.Union[str, vtime.Alarm],
+                   dfs: dict[str, pd.DataFrame]) -> np.ndarray:
+    '''
+    Return the signal run through vfin_ops.AlarmOpGen by vfin.BacktestEngine.
+    '''
+    opgen = vfin_ops.AlarmOpGen(alarm)
+    table = vfin.BacktestEngine(opgen.ops(), dfs).run()
+    return table[opgen.di['signal'].name].to_numpy(dtype=bool)
+
+
+def mask(alarm: typing.Union[str, vtime.Alarm],
+         dfs: dict[str, pd.DataFrame]) -> np.ndarray:
+    '''
+    Return the read-only alarm signal for every row of the first table
+    of `dfs`, cached per alarm state and index.
+    '''
+    index = next(iter(dfs.values())).index
+    alarm_key = _alarm_key(alarm)
+    if alarm_key is None:
+        ret = reference_mask(alarm, dfs)
+        ret.flags.writeable = False
+        return ret
+    key = (alarm_key, _index_key(index))
+    ret = _MASKS.get(key)
+    if ret is not None:
+        _MASKS.move_to_end(key)
+        return ret
+    p = period(alarm)
+    if p is not None:
+        ret = period_mask(p, index)
+    else:
+        ret = reference_mask(alarm, dfs)
+    ret.flags.writeable = False
+    _MASKS[key] = ret
+    while len(_MASKS) > MAX_MASKS:
+        _MASKS.popitem(last=False)
+    return ret
+
+
+def vectorize(opgen: vfin_ops.AlarmOpGen,
+              alarm: typing.Union[str, vtime.Alarm]) -> vfin_ops.AlarmOpGen:
+    '''
+    Mark ops of `opgen` as one group calculating its signal,
+    replaced by the cached mask() in engines that run vector ops,
+    see backtest.vector.Group. Other engines run the ops as they are.
+
+    Alarms whose state can not be keyed are not marked.
+
+    Returns:
+        `opgen`
+    '''
+    alarm_key = _alarm_key(alarm)
+    if alarm_key is None:
+        return opgen
+    ops = opgen.ops
+
+    def vector_ops() -> list[vfin.Operation]:
+        return backtest.vector.group(
+            ops(),
+            backtest.vector.Group(
+                vector_function=functools.partial(mask, alarm),
+                ret=opgen.di['signal'],
+                key=('alarm', alarm_key)))
+
+    opgen.ops = vector_ops
+    return opgen
@@ -0,0 +1,232 @@
+'''
+Saved backtests.
+
+A checkpoint directory holds a completed or partly completed sweep:
+    meta.json   - version, input data hash and the saved chunks
+    defs.pickle - strategy definitions, see backtest.sweep.OpGenDef
+    <chunk>/    - result table of one chunk of strategies:
+        meta.json    - column names, time zone
+        index.npy    - int64 nanoseconds since epoch
+        <i>.npy      - one file per column
+
+Opgens hold functions and are not saved, they are created again from
+their definitions. Result tables are memory-mapped on load, so strategy
+infos of a saved sweep are available without simulating again.
+'''
+import hashlib
+import json
+import os
+import pickle
+import typing
+import numpy as np
+import pandas as pd
+import vstats
+import backtest.memo
+
+VERSION = 1
+
+
+def data_hash(dfs: dict[str, pd.DataFrame]) -> str:
+    '''
+    Return the content hash of input tables: names, index and values.
+    '''
+    h = hashlib.sha256()
+    for key in sorted(dfs):
+        df = dfs[key]
+        h.update(key.encode())
+        h.update(df.index.to_numpy(dtype='datetime64[ns]')
+                 .view(np.int64).tobytes())
+        for col in df.columns:
+            h.update(str(col).encode())
+            h.update(np.ascontiguousarray(df[col].to_numpy()).tobytes())
+    return h.hexdigest()
+
+
+def _write_json(path: str, data: dict):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp, path)
+
+
+def save_table(path: str, df: pd.DataFrame):
+    '''
+    Save `df` as one .npy file per column.
+    '''
+    os.makedirs(path, exist_ok=True)
+    index = df.index
+    tz = str(index.tz) if index.tz is not None else None
+    if tz:
+        index = index.tz_convert('UTC').tz_localize(None)
+    np.save(os.path.join(path, 'index.npy'),
+            index.to_numpy(dtype='datetime64[ns]').view(np.int64))
+    for i, col in enumerate(df.columns):
+        np.save(os.path.join(path, f'{i}.npy'), df[col].to_numpy())
+    # written last, a table without meta.json is incomplete
+    _write_json(os.path.join(path, 'meta.json'),
+                {'columns': list(df.columns),
+                 'index name': df.index.name,
+                 'tz': tz})
+
+
+def load_table(path: str) -> pd.DataFrame:
+    '''
+    Return the table saved by save_table() with memory-mapped columns.
+    '''
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    index = pd.DatetimeIndex(
+        np.load(os.path.join(path, 'index.npy')).view('datetime64[ns]'),
+        name=meta['index name'])
+    if meta['tz']:
+        index = index.tz_localize('UTC').tz_convert(meta['tz'])
+    return pd.DataFrame({col: np.load(os.path.join(path, f'{i}.npy'),
+                                      mmap_mode='r')
+                         for i, col in enumerate(meta['columns'])},
+                        index=index,
+                        copy=False)
+
+
+class Checkpoint:
+    '''
+    Saved sweep, extended chunk by chunk.
+
+    Args:
+        path: checkpoint directory
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self.defs = []
+        self.chunks = []
+        self.data_hash = None
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, 'meta.json')
+
+    def exists(self) -> bool:
+        '''
+        Return True if a checkpoint is saved in `path`.
+        '''
+        return os.path.exists(self._meta_path())
+
+    def load(self):
+        '''
+        Load definitions and the list of saved chunks.
+        '''
+        with open(self._meta_path(), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != VERSION:
+            raise ValueError(f'{self.path}: unsupported version '
+                             f'{meta.get("version")}')
+        self.data_hash = meta['data hash']
+        self.chunks = meta['chunks']
+        with open(os.path.join(self.path, 'defs.pickle'), 'rb') as f:
+            self.defs = pickle.load(f)
+
+    def begin(self, defs: list, dfs: dict[str, pd.DataFrame]) -> set[str]:
+        '''
+        Start a new sweep or resume the saved one.
+
+        Args:
+            defs: strategy definitions of the sweep
+            dfs: input tables
+
+        Returns:
+            names of strategies that are already saved
+
+        Raises:
+            ValueError: if the saved sweep was run over other input data
+                        or saved strategies are defined differently
+        '''
+        h = data_hash(dfs)
+        if self.exists():
+            self.load()
+            if self.data_hash != h:
+                raise ValueError(f'{self.path}: saved for other input data')
+            self._check(defs)
+        os.makedirs(self.path, exist_ok=True)
+        self.data_hash = h
+        self.defs = list(defs)
+        tmp = os.path.join(self.path, 'defs.pickle.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(self.defs, f)
+        os.replace(tmp, os.path.join(self.path, 'defs.pickle'))
+        self._save_meta()
+        return self.saved()
+
+    def _check(self, defs: list):
+        saved = self.saved()
+        before = {d.name: d for d in self.defs if d.name in saved}
+        changed = [d.name for d in defs
+                   if d.name in before
+                   and backtest.memo.definition(d)
+                   != backtest.memo.definition(before[d.name])]
+        if changed:
+            raise ValueError(f'{self.path}: saved with other definitions '
+                             f'of {", ".join(changed)}')
+        # results without a saved definition could not be checked later
+        names = {d.name for d in defs}
+        for c in self.chunks:
+            c['names'] = [name for name in c['names'] if name in names]
+
+    def saved(self) -> set[str]:
+        '''
+        Return names of strategies with saved results.
+        '''
+        return {name for c in self.chunks for name in c['names']}
+
+    def _save_meta(self):
+        _write_json(self._meta_path(), {'version': VERSION,
+                                        'data hash': self.data_hash,
+                                        'chunks': self.chunks})
+
+    def add(self, names: list[str], table: pd.DataFrame):
+        '''
+        Save the result table of strategies `names`.
+        '''
+        chunk = f'chunk_{len(self.chunks):06}'
+        save_table(os.path.join(self.path, chunk), table)
+        self.chunks.append({'table': chunk, 'names': list(names)})
+        self._save_meta()
+
+    def tables(self) -> dict[str, pd.DataFrame]:
+        '''
+        Return result tables of all saved strategies by name,
+        in the order of definitions, strategies of a chunk share one table.
+        '''
+        tables = {}
+        for c in self.chunks:
+            table = load_table(os.path.join(self.path, c['table']))
+            for name in c['names']:
+                tables[name] = table
+        return {d.name: tables[d.name] for d in self.defs if d.name in tables}
+
+    def strategy_infos(self) -> list[vstats.StrategyInfo]:
+        '''
+        Return strategy infos of all saved strategies,
+        in the order of definitions.
+        '''
+        tables = self.tables()
+        return [vstats.StrategyInfo(d.name, d.create(), tables[d.name])
+                for d in self.defs if d.name in tables]
+
+
+def load(path: str,
+         dfs: typing.Optional[dict[str, pd.DataFrame]] = None) \
+        -> list[vstats.StrategyInfo]:
+    '''
+    Return strategy infos of a saved sweep, e.g. for
+    vstats.print_results() and vstats.plot_results().
+
+    Args:
+        path: checkpoint directory
+        dfs: if set, input tables the sweep must have been run over
+
+    Raises:
+        ValueError: if `dfs` differ from the saved input data
+    '''
+    checkpoint = Checkpoint(path)
+    checkpoint.load()
+    if dfs is not None and data_hash(dfs) != checkpoint.data_hash:
+        raise ValueError(f'{path}: saved for other input data')
+    return checkpoint.strategy_infos()
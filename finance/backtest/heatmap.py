@@ -0,0 +1,199 @@
+'''
+Probability heatmaps of forward returns after indicator triggers.
+
+A trigger is a bar where an indicator signal turns on, e.g. a fast SMA
+crossing above a slow one. For every trigger the return from its close
+to the close `h` bars later is taken for every horizon `h` and counted
+into return buckets, so a heatmap is a (horizon x bucket) histogram:
+how likely the price ends in a bucket `h` bars after the trigger.
+
+Forward returns are read from a sliding-window view of the close column,
+windows are not copied, only the (trigger x horizon) returns are.
+Heatmaps of several indicators over equal horizons and buckets
+are combined by multiplying their probabilities.
+
+Histograms are cached on disk by the content of the close column,
+the signal, horizons and buckets.
+'''
+import hashlib
+import os
+import numpy as np
+import backtest.surface
+
+# change when histograms change for equal inputs
+VERSION = 1
+DEFAULT_PATH = '__heatmap_cache__'
+
+
+class Heatmap:
+    '''
+    Histogram of forward returns after triggers.
+
+    Args:
+        horizons: bars after the trigger, (n_horizons,)
+        edges: return bucket edges, (n_buckets + 1,),
+               returns outside the edges are counted in the first
+               and the last bucket
+        counts: triggers per horizon and bucket, (n_horizons, n_buckets)
+        name: indicator name
+    '''
+    def __init__(self,
+                 horizons: np.ndarray,
+                 edges: np.ndarray,
+                 counts: np.ndarray,
+                 name: str = ''):
+        self.horizons = np.asarray(horizons)
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = counts
+        self.name = name
+
+    def probabilities(self) -> np.ndarray:
+        '''
+        Return the probability of every bucket per horizon,
+        NaN for horizons without triggers.
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.counts / self.counts.sum(axis=1, keepdims=True)
+
+    def grid(self) -> backtest.surface.Grid:
+        '''
+        Return probabilities as a grid over horizons and bucket centers,
+        e.g. for backtest.surface.to_file().
+        '''
+        centers = (self.edges[:-1] + self.edges[1:]) / 2
+        return backtest.surface.Grid(['horizon', 'return'],
+                                     [self.horizons, centers],
+                                     self.probabilities(),
+                                     self.name)
+
+
+def triggers(signal: np.ndarray) -> np.ndarray:
+    '''
+    Return bars where `signal` turns on, including the first bar if on.
+    '''
+    signal = np.asarray(signal, dtype=bool)
+    on = np.empty(len(signal), dtype=bool)
+    on[:1] = signal[:1]
+    on[1:] = signal[1:] & ~signal[:-1]
+    return np.flatnonzero(on)
+
+
+def forward_returns(close: np.ndarray,
+                    events: np.ndarray,
+                    horizons: np.ndarray) -> np.ndarray:
+    '''
+    Return returns from the close of every event bar to the close
+    `h` bars later, (n_events, n_horizons), NaN past the last bar.
+
+    Args:
+        close: close price, (n_bars,)
+        events: event bars, see triggers()
+        horizons: bars after the event, positive
+    '''
+    horizons = np.asarray(horizons)
+    assert len(horizons) and horizons.min() > 0
+    close = np.asarray(close, dtype=np.float64)
+    # every event has a full window, past the last bar is NaN
+    padded = np.concatenate((close, np.full(horizons.max(), np.nan)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded,
+                                                       horizons.max() + 1)
+    start = windows[events, 0][:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return windows[events[:, np.newaxis], horizons] / start - 1
+
+
+def histogram(returns: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    '''
+    Count returns into buckets per horizon, NaNs are skipped.
+
+    Args:
+        returns: (n_events, n_horizons), see forward_returns()
+        edges: bucket edges, (n_buckets + 1,)
+
+    Returns:
+        counts, (n_horizons, n_buckets)
+    '''
+    n_buckets = len(edges) - 1
+    n_horizons = returns.shape[1]
+    valid = ~np.isnan(returns)
+    buckets = np.clip(np.searchsorted(edges, returns, side='right') - 1,
+                      0,
+                      n_buckets - 1)
+    cells = np.arange(n_horizons) * n_buckets + buckets
+    return np.bincount(cells[valid],
+                       minlength=n_horizons * n_buckets) \
+        .reshape(n_horizons, n_buckets)
+
+
+def _key(close: np.ndarray,
+         signal: np.ndarray,
+         horizons: np.ndarray,
+         edges: np.ndarray) -> str:
+    h = hashlib.sha256()
+    h.update(str(VERSION).encode())
+    for a in (np.asarray(close, dtype=np.float64),
+              np.asarray(signal, dtype=bool),
+              np.asarray(horizons, dtype=np.int64),
+              np.asarray(edges, dtype=np.float64)):
+        h.update(str(a.shape).encode())
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+
+def heatmap(close: np.ndarray,
+            signal: np.ndarray,
+            horizons: np.ndarray,
+            edges: np.ndarray,
+            name: str = '',
+            path: str = DEFAULT_PATH) -> Heatmap:
+    '''
+    Return the heatmap of forward returns after triggers of `signal`.
+
+    Args:
+        close: close price, (n_bars,)
+        signal: indicator signal, (n_bars,)
+        horizons: bars after the trigger
+        edges: return bucket edges
+        name: indicator name
+        path: cache directory, if None - not cached
+    '''
+    horizons = np.asarray(horizons, dtype=np.int64)
+    edges = np.asarray(edges, dtype=np.float64)
+    filename = None
+    if path:
+        filename = os.path.join(path,
+                                f'{_key(close, signal, horizons, edges)}.npy')
+        if os.path.exists(filename):
+            return Heatmap(horizons, edges, np.load(filename), name)
+    counts = histogram(forward_returns(close, triggers(signal), horizons),
+                       edges)
+    if filename:
+        os.makedirs(path, exist_ok=True)
+        tmp = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, counts)
+        os.replace(tmp, filename)
+    return Heatmap(horizons, edges, counts, name)
+
+
+def combine(heatmaps: list[Heatmap]) -> Heatmap:
+    '''
+    Multiply probabilities of heatmaps over equal horizons and buckets,
+    normalized again per horizon.
+
+    Returns:
+        heatmap with probabilities as counts
+    '''
+    assert heatmaps
+    first = heatmaps[0]
+    p = np.ones(first.counts.shape)
+    for h in heatmaps:
+        assert np.array_equal(h.horizons, first.horizons)
+        assert np.array_equal(h.edges, first.edges)
+        p = p * h.probabilities()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = p / p.sum(axis=1, keepdims=True)
+    return Heatmap(first.horizons,
+                   first.edges,
+                   p,
+                   ' x '.join(h.name for h in heatmaps))
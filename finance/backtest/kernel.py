@@ -0,0 +1,193 @@
+'''
+NumPy trading kernel.
+
+Simulates the trading rules of vfin_ops.TradingOpGen for many strategies
+at once. State of every strategy is one element of (n_strategies,) arrays,
+time is stepped once for all strategies.
+
+Rules per row:
+- add `add_cash` if the alarm is on
+- long exit: sell all long units at the sell price
+- short exit: buy back all short units at the buy price
+- long entry: buy long units for all cash at the buy price
+- short entry: sell short units for all cash at the sell price,
+  the cash is kept as collateral
+- total = cash + long value + short collateral and proceeds - short cost
+
+Prices include slippage in percents:
+buy = close * (1 + slippage / 100), sell = close * (1 - slippage / 100).
+'''
+import typing
+import numpy as np
+import pandas as pd
+import vfin
+import vtime
+import backtest.alarm
+import backtest.vector
+
+
+def alarm_signal(alarm: typing.Union[str, vtime.Alarm],
+                 dfs: dict[str, pd.DataFrame]) -> np.ndarray:
+    '''
+    Return the alarm signal for every row of `dfs` as a bool array.
+    '''
+    return backtest.alarm.mask(alarm, dfs)
+
+
+def prices(close: np.ndarray,
+           slippage: float) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Return buy and sell prices.
+    '''
+    close = np.asarray(close, dtype=np.float64)
+    return close * (1 + slippage / 100), close * (1 - slippage / 100)
+
+
+def _signal(signal: typing.Optional[np.ndarray],
+            shape: tuple[int, int]) -> np.ndarray:
+    if signal is None:
+        return np.zeros(shape, dtype=bool)
+    # nan compares as False, same as in the sequential ops
+    signal = np.asarray(signal, dtype=bool)
+    if signal.ndim == 1:
+        # shared by all strategies
+        signal = signal[:, np.newaxis]
+    return np.broadcast_to(signal, shape)
+
+
+# pylint: disable=too-many-arguments,too-many-locals
+def simulate(close: np.ndarray,
+             slippage: float,
+             initial_cash: typing.Union[int, float],
+             add_cash: typing.Union[int, float] = 0,
+             alarm: np.ndarray = None,
+             long_entry: np.ndarray = None,
+             long_exit: np.ndarray = None,
+             short_entry: np.ndarray = None,
+             short_exit: np.ndarray = None,
+             n: int = 1) -> np.ndarray:
+    '''
+    Simulate `n` strategies over the same prices.
+
+    Args:
+        close: close price, (n_bars,)
+        slippage: slippage in percents
+        initial_cash: initial cash
+        add_cash: the amount of cash added when the alarm is on
+        alarm: add cash signal, (n_bars,)
+        long_entry, long_exit, short_entry, short_exit:
+            signals, (n_bars, n) or (n_bars,) if shared,
+            None if never on
+        n: number of strategies
+
+    Returns:
+        total, (n_bars, n)
+    '''
+    n_bars = len(close)
+    shape = (n_bars, n)
+    buy, sell = prices(close, slippage)
+    if alarm is None or not add_cash:
+        alarm = np.zeros(n_bars, dtype=bool)
+    long_entry = _signal(long_entry, shape)
+    long_exit = _signal(long_exit, shape)
+    short_entry = _signal(short_entry, shape)
+    short_exit = _signal(short_exit, shape)
+
+    cash = np.full(n, initial_cash, dtype=np.float64)
+    long_units = np.zeros(n)
+    short_units = np.zeros(n)
+    # collateral and proceeds of the short position
+    short_basis = np.zeros(n)
+    total = np.empty(shape)
+    for i in range(n_bars):
+        if alarm[i]:
+            cash += add_cash
+        m = long_exit[i] & (long_units > 0)
+        if m.any():
+            cash[m] += long_units[m] * sell[i]
+            long_units[m] = 0
+        m = short_exit[i] & (short_units > 0)
+        if m.any():
+            cash[m] += short_basis[m] - short_units[m] * buy[i]
+            short_units[m] = 0
+            short_basis[m] = 0
+        m = long_entry[i] & (cash > 0)
+        if m.any():
+            long_units[m] += cash[m] / buy[i]
+            cash[m] = 0
+        m = short_entry[i] & (cash > 0)
+        if m.any():
+            short_units[m] += cash[m] / sell[i]
+            short_basis[m] += 2 * cash[m]
+            cash[m] = 0
+        total[i] = cash + long_units * sell[i] \
+            + short_basis - short_units * buy[i]
+    return total
+
+
+def saving(initial_cash: typing.Union[int, float],
+           add_cash: typing.Union[int, float],
+           alarm: np.ndarray) -> np.ndarray:
+    '''
+    Return the total of a strategy only adding cash, (n_bars,).
+
+    The cumulative sum adds the same values in the same order
+    as the sequential ops, so the result is equal bit for bit.
+
+    Args:
+        initial_cash: initial cash
+        add_cash: the amount of cash added when the alarm is on
+        alarm: add cash signal, (n_bars,)
+    '''
+    deposits = np.empty(len(alarm) + 1)
+    deposits[0] = initial_cash
+    deposits[1:] = np.where(np.asarray(alarm, dtype=bool),
+                            np.float64(add_cash or 0),
+                            0.0)
+    return np.cumsum(deposits)[1:]
+
+
+def money_avg(close: np.ndarray,
+              slippage: float,
+              initial_cash: typing.Union[int, float],
+              add_cash: typing.Union[int, float],
+              alarm: np.ndarray) -> np.ndarray:
+    '''
+    Return the total of a strategy buying long units for all cash
+    whenever the alarm is on, (n_bars,).
+
+    Cash is zero after the first alarm, so units are the cumulative sum
+    of deposits divided by the buy price, equal bit for bit to simulate().
+
+    Args:
+        close: close price, (n_bars,)
+        slippage: slippage in percents
+        initial_cash: initial cash
+        add_cash: the amount of cash added when the alarm is on
+        alarm: add cash and long entry signal, (n_bars,)
+    '''
+    alarm = np.asarray(alarm, dtype=bool)
+    if not (add_cash and add_cash > 0 and initial_cash >= 0):
+        # cash can stay after an alarm
+        return simulate(close, slippage, initial_cash, add_cash,
+                        alarm=alarm, long_entry=alarm)[:, 0]
+    buy, sell = prices(close, slippage)
+    deposits = np.where(alarm, np.float64(add_cash), 0.0)
+    first = np.argmax(alarm) if alarm.any() else len(alarm)
+    if first < len(alarm):
+        deposits[first] = np.float64(initial_cash) + add_cash
+    with np.errstate(invalid='ignore', divide='ignore'):
+        units = np.cumsum(np.where(alarm, deposits / buy, 0.0))
+    cash = np.zeros(len(alarm))
+    cash[:first] = initial_cash
+    return cash + units * sell
+
+
+def close_price(price_info: vfin.InstrumentInfo,
+                dfs: dict[str, pd.DataFrame]) -> pd.Series:
+    '''
+    Return the close price column of the instrument.
+    '''
+    close = backtest.vector.column(dfs, price_info.di['close'])
+    assert close is not None
+    return close
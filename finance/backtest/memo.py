@@ -0,0 +1,306 @@
+'''
+Persistent cache of strategy results.
+
+Results of every strategy are stored under a key made of the strategy
+class, its normalized init arguments (params, cash, alarm, instrument
+and slippage), the hash of the input data and the backtest engine,
+so equal strategies over equal data are simulated once across runs.
+
+Every entry is a directory of the result columns of one strategy,
+see backtest.checkpoint.save_table(). Columns are stored under the path
+of their DataInfo in the opgen, e.g. 'total' or 'add cash alarm/signal',
+so entries are independent of the strategy name.
+The least recently used entries are removed when the cache grows over
+its size limit.
+'''
+import enum
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import types
+import typing
+import numpy as np
+import pandas as pd
+import vfin_ops
+import vtable
+import backtest.checkpoint
+import backtest.vector
+
+# change when strategy results change for equal arguments
+VERSION = 2
+DEFAULT_PATH = '__result_cache__'
+DEFAULT_MAX_BYTES = 2**30
+# init arguments that do not change results
+IGNORED_KWARGS = {'name', 'indicator_cache'}
+
+logger = logging.getLogger(__name__)
+
+
+def _qualname(v) -> str:
+    name = f'{v.__module__}.{v.__qualname__}'
+    if '<' in name:
+        # lambdas and local functions are not identified by their name
+        raise TypeError(f'can not normalize {name}')
+    return name
+
+
+# pylint: disable=too-many-return-statements
+def normalize(v):
+    '''
+    Return `v` as JSON types, equal for equal values across runs:
+    objects by type and attributes, functions by qualified name.
+
+    Raises:
+        TypeError: if `v` holds a value that can not be normalized,
+                   e.g. a lambda
+    '''
+    if isinstance(v, dict):
+        return {str(k): normalize(x)
+                for k, x in sorted(v.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(v, (list, tuple)):
+        return [normalize(x) for x in v]
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, np.ndarray):
+        return {'dtype': str(v.dtype),
+                'shape': list(v.shape),
+                'sha256': hashlib.sha256(
+                    np.ascontiguousarray(v).tobytes()).hexdigest()}
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if isinstance(v, enum.Enum):
+        return f'{_qualname(type(v))}.{v.name}'
+    if isinstance(v, types.MethodType):
+        return {'type': _qualname(types.MethodType),
+                'func': normalize(v.__func__),
+                'self': normalize(v.__self__)}
+    if isinstance(v, type) or callable(v) and hasattr(v, '__qualname__'):
+        # functions by name, their code is not part of the key
+        return _qualname(v)
+    if isinstance(v, functools.partial):
+        return {'type': _qualname(functools.partial),
+                'func': normalize(v.func),
+                'args': normalize(v.args),
+                'keywords': normalize(v.keywords)}
+    if hasattr(v, '__dict__'):
+        return {'type': normalize(type(v)), 'vars': normalize(vars(v))}
+    slots = [n for c in type(v).__mro__ for n in getattr(c, '__slots__', ())]
+    if slots:
+        return {'type': normalize(type(v)),
+                'vars': normalize({n: getattr(v, n) for n in slots
+                                   if hasattr(v, n)})}
+    # the repr of other objects may hold addresses, keys would never match
+    raise TypeError(f'can not normalize {type(v).__name__}')
+
+
+def definition(d) -> list:
+    '''
+    Return the strategy class and init arguments of a definition
+    normalized to JSON types, equal for strategies with equal results.
+
+    Args:
+        d: strategy definition, see backtest.sweep.OpGenDef
+
+    Raises:
+        TypeError: if an init argument can not be normalized
+    '''
+    kwargs = {k: v for k, v in d.kwargs.items() if k not in IGNORED_KWARGS}
+    opgen = d.create()
+    if hasattr(opgen, 'params'):
+        # e.g. missing SMA periods filled with 0
+        kwargs['params'] = opgen.params
+    return [normalize(d.cls), normalize(kwargs)]
+
+
+def key(d, digest: str, engine: type, variant: str = '') -> str:
+    '''
+    Return the cache key of a strategy.
+
+    Args:
+        d: strategy definition, see backtest.sweep.OpGenDef
+        digest: input data hash, see backtest.checkpoint.data_hash()
+        engine: backtest engine class, engines differ in column dtypes
+        variant: results of other variants are cached separately,
+                 e.g. tables without transient columns
+
+    Raises:
+        TypeError: if an init argument can not be normalized
+    '''
+    data = json.dumps([VERSION,
+                       definition(d),
+                       digest,
+                       normalize(engine),
+                       variant],
+                      sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def dis(opgen: vfin_ops.TradingOpGen, prefix: str = '') \
+        -> dict[str, vtable.DataInfo]:
+    '''
+    Return DataInfos of `opgen` and its nested opgens by path.
+    '''
+    ret = {}
+    for k, di in getattr(opgen, 'di', {}).items():
+        if isinstance(di, vtable.DataInfo):
+            ret[f'{prefix}{k}'] = di
+    for k, og in getattr(opgen, 'opgens', {}).items():
+        ret.update(dis(og, f'{prefix}{k}/'))
+    return ret
+
+
+class ResultCache:
+    '''
+    Size-bounded on-disk LRU cache of strategy results.
+
+    Args:
+        path: cache directory
+        max_bytes: size limit, least recently used entries are removed
+    '''
+    def __init__(self,
+                 path: str = DEFAULT_PATH,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def _dir(self, k: str) -> str:
+        return os.path.join(self.path, k)
+
+    def get(self,
+            k: str,
+            opgen: vfin_ops.TradingOpGen) -> typing.Optional[pd.DataFrame]:
+        '''
+        Return the cached table of `opgen` with memory-mapped columns,
+        None if not cached.
+
+        Args:
+            k: cache key, see key()
+            opgen: strategy, columns are named by its DataInfos
+        '''
+        d = self._dir(k)
+        try:
+            table = backtest.checkpoint.load_table(d)
+        except FileNotFoundError:
+            return None
+        # the access time is the modification time of the entry
+        os.utime(d)
+        names = {path: di.name for path, di in dis(opgen).items()}
+        return table.rename(columns=names)
+
+    def put(self,
+            k: str,
+            opgen: vfin_ops.TradingOpGen,
+            table: pd.DataFrame):
+        '''
+        Store result columns of `opgen` from `table`.
+        '''
+        cols = {path: table[di.name] for path, di in dis(opgen).items()
+                if di.name in table}
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self._dir(f'.{k}.{os.getpid()}.tmp')
+        backtest.checkpoint.save_table(tmp,
+                                       pd.DataFrame(cols, index=table.index))
+        shutil.rmtree(self._dir(k), ignore_errors=True)
+        os.replace(tmp, self._dir(k))
+        self.evict()
+
+    def evict(self):
+        '''
+        Remove least recently used entries over the size limit.
+        '''
+        entries = []
+        total = 0
+        for e in os.scandir(self.path):
+            if not e.is_dir() or e.name.startswith('.'):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(e.path))
+            entries.append((e.stat().st_mtime, size, e.path))
+            total += size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def lookup(self,
+               defs: list,
+               dfs: dict[str, pd.DataFrame],
+               engine: type,
+               variant: str = '') \
+            -> tuple[dict[str, str], dict[str, pd.DataFrame]]:
+        '''
+        Look up results of all strategies.
+
+        Args:
+            defs: strategy definitions, see backtest.sweep.OpGenDef
+            dfs: input tables
+            engine: backtest engine class
+            variant: see key()
+
+        Returns:
+            keys by strategy name, cached tables by strategy name
+        '''
+        digest = backtest.checkpoint.data_hash(dfs)
+        keys = {}
+        tables = {}
+        for d in defs:
+            keys[d.name] = key(d, digest, engine, variant)
+            table = self.get(keys[d.name], d.create())
+            if table is not None:
+                tables[d.name] = table
+        return keys, tables
+
+
+def default_cache() -> ResultCache:
+    '''
+    Return the cache configured by the environment:
+    RESULT_CACHE - cache path,
+    RESULT_CACHE_MAX_BYTES - size limit.
+    '''
+    return ResultCache(
+        path=os.environ.get('RESULT_CACHE', DEFAULT_PATH),
+        max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES',
+                                     DEFAULT_MAX_BYTES)))
+
+
+def run(defs: list,
+        dfs: dict[str, pd.DataFrame],
+        cache: ResultCache = None,
+        engine: type = backtest.vector.BacktestEngine) \
+        -> list[tuple[vfin_ops.TradingOpGen, pd.DataFrame]]:
+    '''
+    Run a backtest of the strategies that are not cached.
+
+    Args:
+        defs: strategy definitions, see backtest.sweep.OpGenDef
+        dfs: input tables
+        cache: result cache,
+               if None - default_cache()
+        engine: backtest engine class
+
+    Returns:
+        (opgen, table) for every definition, in the order of `defs`
+    '''
+    if cache is None:
+        cache = default_cache()
+    start = time.perf_counter()
+    keys, tables = cache.lookup(defs, dfs, engine)
+    misses = [d for d in defs if d.name not in tables]
+    opgens = {d.name: d.create() for d in defs}
+    if misses:
+        ops = []
+        for d in misses:
+            ops += opgens[d.name].ops()
+        table = engine(ops, dfs).run()
+        for d in misses:
+            cache.put(keys[d.name], opgens[d.name], table)
+            tables[d.name] = table
+    logger.debug('%d of %d strategies cached, %.1f s',
+                 len(defs) - len(misses),
+                 len(defs),
+                 time.perf_counter() - start)
+    return [(opgens[d.name], tables[d.name]) for d in defs]
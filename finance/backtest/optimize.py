@@ -0,0 +1,275 @@
+'''
+Parameter optimization.
+
+Instead of backtesting the whole cartesian product of a parameter space,
+candidates are evaluated in batches over a process pool, see
+backtest.sweep.scores(), and only promising ones are evaluated further:
+
+    random              - random candidates from the space
+    successive_halving  - random candidates over a growing part of
+                          the history, the best 1/eta are kept each round
+    coordinate_descent  - best value of one parameter at a time,
+                          all values of a parameter are one batch
+
+Every evaluation is kept in the history, equal candidates over equal
+data are evaluated once. NaN scores are never the best, if no candidate
+has a score over the whole history, e.g. no valid candidates,
+ValueError is raised.
+'''
+import math
+import typing
+import numpy as np
+import pandas as pd
+import backtest.stream
+import backtest.sweep
+import backtest.vector
+
+# bars scored after the longest lookback in a partial history,
+# a year of daily bars
+EVAL_BARS = 252
+
+
+class Evaluation:
+    '''
+    One evaluated candidate.
+
+    Args:
+        params: opgen params
+        score: backtest score, higher is better,
+               NaN if the candidate could not be scored
+        fraction: part of the history the backtest was run over
+    '''
+    def __init__(self, params: dict, score: float, fraction: float):
+        self.params = params
+        self.score = score
+        self.fraction = fraction
+
+    def __repr__(self) -> str:
+        return f'Evaluation({self.params}, {self.score}, {self.fraction})'
+
+
+class Result:
+    '''
+    Result of an optimization.
+
+    Args:
+        best: best candidate evaluated over the whole history
+        history: all evaluations in the order they were made
+    '''
+    def __init__(self, best: Evaluation, history: list[Evaluation]):
+        self.best = best
+        self.history = history
+
+    @property
+    def best_params(self) -> dict:
+        '''
+        Params of the best candidate.
+        '''
+        return self.best.params
+
+    @property
+    def best_score(self) -> float:
+        '''
+        Score of the best candidate.
+        '''
+        return self.best.score
+
+
+def head(dfs: dict[str, pd.DataFrame],
+         fraction: float) -> dict[str, pd.DataFrame]:
+    '''
+    Return the first `fraction` of the history of all tables,
+    cut at the same time.
+    '''
+    if fraction >= 1:
+        return dfs
+    start = min(df.index[0] for df in dfs.values() if len(df))
+    end = max(df.index[-1] for df in dfs.values() if len(df))
+    cut = start + (end - start) * fraction
+    return {k: df[df.index <= cut] for k, df in dfs.items()}
+
+
+def _key(params: dict) -> tuple:
+    return tuple(sorted(params.items()))
+
+
+class Optimizer:
+    '''
+    Optimize params of one strategy class.
+
+    Args:
+        cls: operation generator class, accepting `name` and `params`
+        kwargs: other init arguments
+        dfs: input tables
+        space: values of every param, e.g. {'long entry fast sma': [5, 10]}
+        valid: if set, candidates for which it returns False are skipped,
+               e.g. fast period below slow period
+        score: picklable function of (opgen, table), higher is better
+        workers: number of worker processes,
+                 if None - number of CPUs
+        engine: backtest engine class
+        seed: random seed
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 cls: type,
+                 kwargs: dict,
+                 dfs: dict[str, pd.DataFrame],
+                 space: dict[str, list],
+                 valid: typing.Callable[[dict], bool] = None,
+                 score: typing.Callable = backtest.sweep.final_total,
+                 workers: int = None,
+                 engine: type = backtest.vector.BacktestEngine,
+                 seed: int = None):
+        self.cls = cls
+        self.kwargs = kwargs
+        self.dfs = dfs
+        self.space = {k: list(v) for k, v in space.items()}
+        self.valid = valid
+        self.score = score
+        self.workers = workers
+        self.engine = engine
+        self.rng = np.random.default_rng(seed)
+        self.history = []
+        self._scores = {}
+
+    def size(self) -> int:
+        '''
+        Return the number of points in the space, valid or not.
+        '''
+        return math.prod(len(v) for v in self.space.values())
+
+    def evaluate(self,
+                 candidates: list[dict],
+                 fraction: float = 1.0) -> list[float]:
+        '''
+        Return scores of `candidates` over the first `fraction`
+        of the history, evaluate new ones as one batch.
+        '''
+        new = {}
+        for p in candidates:
+            if (_key(p), fraction) not in self._scores:
+                new.setdefault(_key(p), p)
+        new = list(new.values())
+        if new:
+            defs = [backtest.sweep.OpGenDef(
+                        name=f'candidate {len(self.history) + i}',
+                        cls=self.cls,
+                        kwargs=dict(self.kwargs, params=p))
+                    for i, p in enumerate(new)]
+            scores = backtest.sweep.scores(defs,
+                                           head(self.dfs, fraction),
+                                           score=self.score,
+                                           workers=self.workers,
+                                           engine=self.engine)
+            for p, s in zip(new, scores):
+                # NaN totals, e.g. not enough history, are the worst
+                self._scores[(_key(p), fraction)] = \
+                    -math.inf if math.isnan(s) else s
+                self.history.append(Evaluation(p, s, fraction))
+        return [self._scores[(_key(p), fraction)] for p in candidates]
+
+    def sample(self, n: int) -> list[dict]:
+        '''
+        Return up to `n` distinct random valid candidates.
+        '''
+        ret = {}
+        for _ in range(n * 100):
+            if len(ret) >= n:
+                break
+            p = {k: v[self.rng.integers(len(v))]
+                 for k, v in self.space.items()}
+            if self.valid is None or self.valid(p):
+                ret.setdefault(_key(p), p)
+        return list(ret.values())
+
+    def _result(self) -> Result:
+        # first of equal scores, NaN scores are never the best
+        full = [e for e in self.history
+                if e.fraction >= 1 and not math.isnan(e.score)]
+        if not full:
+            raise ValueError('no candidate scored over the whole history')
+        return Result(max(full, key=lambda e: e.score), self.history)
+
+    def random(self, n: int) -> Result:
+        '''
+        Evaluate `n` random candidates.
+        '''
+        self.evaluate(self.sample(n))
+        return self._result()
+
+    def successive_halving(self,
+                           n: int,
+                           eta: int = 3,
+                           min_fraction: float = None,
+                           min_bars: int = None) -> Result:
+        '''
+        Evaluate `n` random candidates over a part of the history,
+        keep the best 1/eta and evaluate them over more history,
+        until the whole history is used. The history grows geometrically,
+        one round per reduction. Equal scores are ranked randomly.
+
+        Args:
+            n: number of candidates
+            eta: reduction factor
+            min_fraction: history part of the first round,
+                          if None - eta times less per round
+            min_bars: bars of the first round at least,
+                      if None - the longest lookback of the candidates
+                      and EVAL_BARS, so indicators are warm
+        '''
+        candidates = self.sample(n)
+        rounds = max(0, math.ceil(math.log(max(len(candidates), 1), eta)))
+        if min_fraction is None:
+            min_fraction = eta ** -rounds
+        if min_bars is None:
+            min_bars = backtest.stream.max_lookback(
+                [self.cls(name='lookback', **dict(self.kwargs, params=p))
+                 for p in candidates]) + EVAL_BARS
+        bars = max(len(df) for df in self.dfs.values())
+        min_fraction = min(1.0, max(min_fraction, min_bars / bars))
+        for r in range(rounds + 1):
+            fraction = 1.0 if r == rounds \
+                else min_fraction ** (1 - r / rounds)
+            scores = self.evaluate(candidates, fraction)
+            if fraction >= 1:
+                break
+            # stable sort of a random order, equal scores in random order
+            order = self.rng.permutation(len(candidates))
+            ranked = sorted(order, key=lambda i: scores[i], reverse=True)
+            keep = max(1, math.ceil(len(candidates) / eta))
+            candidates = [candidates[i] for i in ranked[:keep]]
+        return self._result()
+
+    def coordinate_descent(self,
+                           start: dict = None,
+                           rounds: int = 3) -> Result:
+        '''
+        Starting from `start`, set every param to its best value
+        with the other params fixed, repeat until nothing improves.
+
+        Args:
+            start: first candidate,
+                   if None - a random valid one
+            rounds: maximum passes over all params
+        '''
+        best = start
+        if best is None:
+            sample = self.sample(1)
+            if not sample:
+                raise ValueError('no valid candidate in the space')
+            best = sample[0]
+        best_score = self.evaluate([best])[0]
+        for _ in range(rounds):
+            improved = False
+            for k, values in self.space.items():
+                candidates = [dict(best, **{k: v}) for v in values]
+                candidates = [p for p in candidates
+                              if self.valid is None or self.valid(p)]
+                for p, s in zip(candidates, self.evaluate(candidates)):
+                    if s > best_score:
+                        best, best_score = p, s
+                        improved = True
+            if not improved:
+                break
+        return self._result()
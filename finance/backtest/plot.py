@@ -0,0 +1,145 @@
+'''
+Plot output helpers.
+
+Large tables are downsampled before drawing: rows are split into buckets
+and the minimum and maximum of every column in a bucket are kept,
+so spikes and signal edges stay visible with a bounded number of points.
+'''
+import concurrent.futures
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+import vplot
+import backtest.memo
+
+COLORS = [vplot.CSSColor.BLUE,
+          vplot.CSSColor.RED,
+          vplot.CSSColor.GREEN,
+          vplot.CSSColor.BLACK]
+# points per column of a downsampled table
+DEFAULT_POINTS = 2000
+
+
+def color(i: int) -> vplot.CSSColor:
+    '''
+    Return a trace color by trace number.
+    '''
+    return COLORS[i % len(COLORS)]
+
+
+def to_file(subplots: list[vplot.Subplot], filename: str):
+    '''
+    Draw `subplots` into `filename`, format by the file extension.
+    '''
+    vplot.PlotlyPlot(subplots=subplots).to_file(filename)
+
+
+def decimate(values: np.ndarray, points: int) -> np.ndarray:
+    '''
+    Return sorted row numbers of the minimum and maximum of every bucket,
+    at most `points` rows including the first and the last one.
+    NaNs are skipped, all-NaN buckets keep their first row.
+    '''
+    n = len(values)
+    if n <= points:
+        return np.arange(n)
+    buckets = max(1, (points - 2) // 2)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(buckets, size)
+    starts = np.arange(buckets) * size
+    nan = np.isnan(padded)
+    low = np.argmin(np.where(nan, np.inf, padded), axis=1) + starts
+    high = np.argmax(np.where(nan, -np.inf, padded), axis=1) + starts
+    rows = np.concatenate(([0, n - 1], low, high))
+    return np.unique(rows[rows < n])
+
+
+def downsample(table: pd.DataFrame,
+               points: int = DEFAULT_POINTS,
+               columns: list[str] = None) -> pd.DataFrame:
+    '''
+    Return rows of `table` keeping the shape of `columns`.
+
+    Args:
+        table: table to draw
+        points: points per column,
+                the result has at most `points` rows per column
+        columns: columns to keep the shape of,
+                 if None - all columns
+    '''
+    if len(table) <= points:
+        return table
+    if columns is None:
+        columns = table.columns
+    rows = [np.array([0])]
+    for c in columns:
+        values = table[c].to_numpy()
+        if values.dtype == object:
+            values = pd.to_numeric(table[c], errors='coerce').to_numpy()
+        rows.append(decimate(values.astype(np.float64), points))
+    return table.iloc[np.unique(np.concatenate(rows))]
+
+
+def debug_table(opgen, table: pd.DataFrame,
+                points: int = DEFAULT_POINTS) -> pd.DataFrame:
+    '''
+    Return `table` downsampled by the columns of `opgen`,
+    see backtest.memo.dis(), by all columns if none is in `table`.
+    '''
+    columns = [di.name for di in backtest.memo.dis(opgen).values()
+               if di.name in table]
+    return downsample(table, points, columns or None)
+
+
+# per-process state, set by _init_worker()
+_PLOTS = None
+
+
+def _init_worker(plots: list[tuple]):
+    # pylint: disable=global-statement
+    global _PLOTS
+    _PLOTS = plots
+
+
+def _debug_plot(i: int) -> str:
+    opgen, table, filename, points = _PLOTS[i]
+    if points:
+        table = debug_table(opgen, table, points)
+    opgen.debug_plot(table, filename)
+    return filename
+
+
+def debug_plots(plots: dict[str, tuple],
+                points: int = DEFAULT_POINTS,
+                workers: int = None):
+    '''
+    Draw debug plots of opgens, files in parallel.
+
+    Tables are downsampled and subplots are built in the worker
+    drawing the file, opgens and tables are not pickled.
+
+    Args:
+        plots: (opgen, table) by file name
+        points: points per column, if None - tables are not downsampled
+        workers: number of worker processes,
+                 if None - number of CPUs
+    '''
+    items = [(opgen, table, filename, points)
+             for filename, (opgen, table) in plots.items()]
+    workers = min(workers or os.cpu_count() or 1, len(items))
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        _init_worker(items)
+        for i in range(len(items)):
+            _debug_plot(i)
+        return
+    # forked workers inherit the plots
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=(items,)) as executor:
+        for _ in executor.map(_debug_plot, range(len(items))):
+            pass
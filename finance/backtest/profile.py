@@ -0,0 +1,218 @@
+'''
+Per-op profiling.
+
+Opt-in: ops are instrumented only when generated through Profiler.ops(),
+ops generated by opgen.ops() are not touched and cost nothing extra.
+'''
+import contextlib
+import json
+import time
+import tracemalloc
+import typing
+import vfin
+import vfin_ops
+import vplot
+import backtest.plot
+
+
+class OpStats:
+    '''
+    Statistics of one op.
+    '''
+    def __init__(self, opgen: str, index: int, function: str):
+        self.opgen = opgen
+        self.index = index
+        self.function = function
+        self.calls = 0
+        self.ns = 0
+        self.alloc_bytes = 0
+
+    @property
+    def name(self) -> str:
+        '''
+        Unique op name.
+        '''
+        return f'{self.opgen}[{self.index}] {self.function}'
+
+    def to_dict(self) -> dict:
+        '''
+        Return statistics as a JSON serializable dict.
+        '''
+        return {'opgen': self.opgen,
+                'index': self.index,
+                'function': self.function,
+                'calls': self.calls,
+                'ns': self.ns,
+                'alloc bytes': self.alloc_bytes}
+
+
+def _function_name(function: typing.Callable) -> str:
+    name = getattr(function, '__qualname__', None)
+    if name is None:
+        name = type(function).__qualname__
+    return name
+
+
+class Profiler:
+    '''
+    Collect call count, time and allocations of every op.
+
+    Args:
+        allocations: also trace allocated bytes, slow
+    '''
+    def __init__(self, allocations: bool = False):
+        self.allocations = allocations
+        self.stats = []
+        self.run_ns = 0
+
+    def _wrap(self, function: typing.Callable, stats: OpStats):
+        if self.allocations:
+            def wrapper(*args, **kwargs):
+                mem = tracemalloc.get_traced_memory()[0]
+                start = time.perf_counter_ns()
+                ret = function(*args, **kwargs)
+                stats.ns += time.perf_counter_ns() - start
+                stats.alloc_bytes += max(
+                    0, tracemalloc.get_traced_memory()[0] - mem)
+                stats.calls += 1
+                return ret
+        else:
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter_ns()
+                ret = function(*args, **kwargs)
+                stats.ns += time.perf_counter_ns() - start
+                stats.calls += 1
+                return ret
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def instrument(self,
+                   ops: list[vfin.Operation],
+                   opgen_name: str) -> list[vfin.Operation]:
+        '''
+        Instrument every function called by `ops`.
+        '''
+        for i, op in enumerate(ops):
+            for k, v in list(getattr(op, '__dict__', {}).items()):
+                if not callable(v) or isinstance(v, type):
+                    continue
+                stats = OpStats(opgen_name, i, f'{k}={_function_name(v)}')
+                self.stats.append(stats)
+                setattr(op, k, self._wrap(v, stats))
+        return ops
+
+    def ops(self, opgen: vfin_ops.TradingOpGen) -> list[vfin.Operation]:
+        '''
+        Return instrumented `opgen.ops()`.
+        '''
+        return self.instrument(opgen.ops(), opgen.name)
+
+    @contextlib.contextmanager
+    def run(self):
+        '''
+        Measure the whole backtest run, e.g.:
+
+            with profiler.run():
+                big_table = engine.run()
+        '''
+        if self.allocations:
+            tracemalloc.start()
+        start = time.perf_counter_ns()
+        try:
+            yield self
+        finally:
+            self.run_ns += time.perf_counter_ns() - start
+            if self.allocations:
+                tracemalloc.stop()
+
+    def ranked(self) -> list[OpStats]:
+        '''
+        Return op statistics, most time first.
+        '''
+        return sorted(self.stats, key=lambda s: s.ns, reverse=True)
+
+    def opgens(self) -> dict[str, dict]:
+        '''
+        Return statistics summed per opgen, most time first.
+        '''
+        ret = {}
+        for s in self.stats:
+            r = ret.setdefault(s.opgen, {'calls': 0,
+                                         'ns': 0,
+                                         'alloc bytes': 0})
+            r['calls'] += s.calls
+            r['ns'] += s.ns
+            r['alloc bytes'] += s.alloc_bytes
+        return dict(sorted(ret.items(),
+                           key=lambda kv: kv[1]['ns'],
+                           reverse=True))
+
+    def report(self, top: int = 20) -> str:
+        '''
+        Return the hot-op report.
+
+        Time of the run not spent in ops is reported as engine time,
+        it includes table reads and writes.
+        '''
+        ops_ns = sum(s.ns for s in self.stats)
+        lines = [f'{"rank":>4} {"calls":>10} {"total ms":>10} '
+                 f'{"call us":>8} {"alloc KiB":>10}  op']
+        for i, s in enumerate(self.ranked()[:top]):
+            per_call = s.ns / s.calls / 1e3 if s.calls else 0
+            lines.append(f'{i + 1:>4} {s.calls:>10} {s.ns / 1e6:>10.1f} '
+                         f'{per_call:>8.2f} {s.alloc_bytes / 1024:>10.1f}'
+                         f'  {s.name}')
+        lines.append('')
+        lines.append(f'{"calls":>15} {"total ms":>10} {"alloc KiB":>10}'
+                     f'  opgen')
+        for name, r in self.opgens().items():
+            lines.append(f'{r["calls"]:>15} {r["ns"] / 1e6:>10.1f} '
+                         f'{r["alloc bytes"] / 1024:>10.1f}  {name}')
+        if self.run_ns:
+            lines.append('')
+            lines.append(f'run: {self.run_ns / 1e6:.1f} ms, '
+                         f'ops: {ops_ns / 1e6:.1f} ms, '
+                         f'engine: {(self.run_ns - ops_ns) / 1e6:.1f} ms')
+        return '\n'.join(lines)
+
+    def to_json(self, filename: str):
+        '''
+        Write statistics to `filename`.
+        '''
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'run ns': self.run_ns,
+                       'opgens': self.opgens(),
+                       'ops': [s.to_dict() for s in self.ranked()]},
+                      f,
+                      indent=4)
+
+    def plot(self, filename: str):
+        '''
+        Draw a flame-style chart: opgens on the bottom level,
+        their ops on top, width is the time spent.
+        '''
+        traces = []
+        x = 0
+        for i, (name, r) in enumerate(self.opgens().items()):
+            traces.append(vplot.Scatter(
+                x=[x / 1e6, (x + r['ns']) / 1e6],
+                y=[0, 0],
+                color=backtest.plot.color(i),
+                width=20.0,
+                mode='lines',
+                name=name))
+            op_x = x
+            for s in sorted((s for s in self.stats if s.opgen == name),
+                            key=lambda s: s.ns,
+                            reverse=True):
+                traces.append(vplot.Scatter(
+                    x=[op_x / 1e6, (op_x + s.ns) / 1e6],
+                    y=[1, 1],
+                    color=backtest.plot.color(i),
+                    width=20.0,
+                    mode='lines',
+                    name=s.name))
+                op_x += s.ns
+            x += r['ns']
+        backtest.plot.to_file([vplot.Subplot(col=1, row=1, traces=traces)],
+                              filename)
@@ -0,0 +1,325 @@
+'''
+Compile an op list into a single fused per-row program.
+
+Every DataInfo is resolved to an integer column slot once, duplicate ops
+are calculated once, and one Python function is generated that executes
+all ops for every row over plain NumPy arrays:
+
+    def program(start, stop):
+        for i in range(start, stop):
+            a5[i - 1] = f0(x=a2[:i])
+            ...
+
+Columns are preallocated once in a backtest.table.ResultTable and keep
+one leading row before the first table row, holding the DataInfo
+first_value, so `x[-2]` of the first row is the first value.
+
+Transient DataInfos are not table columns, they live in a 2-row scratch
+area holding the previous and the current row, so ops may only read
+`x[-1]` and `x[-2]` of them. BacktestEngine calculates them row by row
+instead of over whole columns, see backtest.vector.prepare(), so they
+are never allocated at full length. Transient input columns are only
+left out of the output table.
+'''
+import logging
+import typing
+import numpy as np
+import pandas as pd
+import vfin
+import vfin_ops
+import vtable
+import backtest.table
+import backtest.vector
+
+logger = logging.getLogger(__name__)
+
+
+class CompileError(Exception):
+    '''
+    The op list can not be compiled.
+    '''
+
+
+def _call_parts(op: vfin.Operation) \
+        -> tuple[typing.Callable, dict, vtable.DataInfo]:
+    if not isinstance(op, vfin_ops.Call):
+        raise CompileError(f'unsupported op {type(op).__name__}')
+    try:
+        return op.function, op.kwargs, op.ret
+    except AttributeError as e:
+        raise CompileError(f'unsupported op {type(op).__name__}') from e
+
+
+class Program:
+    '''
+    Fused per-row program.
+
+    Args:
+        ops: sequential ops, only vfin_ops.Call ops are supported
+        dfs: input tables
+        transient: names of DataInfos that are not stored in the table
+        results: names of DataInfos returned in the table,
+                 if None - all that are not transient
+
+    Raises:
+        CompileError: if the ops can not be compiled
+    '''
+    def __init__(self,
+                 ops: list[vfin.Operation],
+                 dfs: dict[str, pd.DataFrame],
+                 transient: set[str] = None,
+                 results: set[str] = None):
+        self.results = results
+        self.transient_names = transient or set()
+        self.slots = {}
+        self.dis = []
+        self.index = None
+        self.inputs = {}
+        self.steps = []
+        self.duplicates = 0
+
+        calls = [_call_parts(op) for op in ops]
+        written = set()
+        for _, _, ret in calls:
+            written.add(self._slot(ret))
+        for _, kwargs, _ in calls:
+            for v in kwargs.values():
+                if not isinstance(v, vtable.DataInfo):
+                    continue
+                s = self._slot(v)
+                if s in written or s in self.inputs:
+                    continue
+                col = backtest.vector.column(dfs, v)
+                if col is None:
+                    continue
+                if self.index is None:
+                    self.index = col.index
+                elif not col.index.equals(self.index):
+                    col = col.reindex(self.index)
+                self.inputs[s] = col.to_numpy(dtype=np.float64)
+        if self.index is None:
+            raise CompileError('no input columns')
+
+        # number of ops writing to every slot
+        writers = {}
+        for _, _, ret in calls:
+            s = self.slots[ret.name]
+            writers[s] = writers.get(s, 0) + 1
+        # the same function of the same inputs is calculated once,
+        # results of duplicates are aliased to the first result;
+        # inputs are equal only if they are input columns or slots
+        # with a single writer already executed in the row,
+        # slots written by several ops, e.g. cash, change within the row
+        alias = {}
+        seen = {}
+        skip = set()
+        computed = set()
+        for i, (function, kwargs, ret) in enumerate(calls):
+            ret_slot = self.slots[ret.name]
+            if writers[ret_slot] != 1:
+                continue
+            args = self._args(kwargs, alias)
+            stable = all(v[0] in self.inputs or v[0] in computed
+                         for v in args.values() if isinstance(v, tuple))
+            key = self._key(function, args) if stable else None
+            if key is not None and key in seen:
+                alias[ret_slot] = seen[key]
+                skip.add(i)
+            elif key is not None:
+                seen[key] = ret_slot
+            computed.add(ret_slot)
+        self.duplicates = len(skip)
+        for name, s in self.slots.items():
+            self.slots[name] = alias.get(s, s)
+        for i, (function, kwargs, ret) in enumerate(calls):
+            if i in skip:
+                continue
+            self.steps.append((function,
+                               self._args(kwargs, alias),
+                               self.slots[ret.name]))
+
+        # a slot is transient only if all its names are
+        self.transient = set()
+        if transient:
+            names = {}
+            for name, s in self.slots.items():
+                names.setdefault(s, []).append(name)
+            self.transient = {s for s, ns in names.items()
+                              if s not in self.inputs
+                              and all(n in transient for n in ns)}
+        self.source, self._namespace = self._generate()
+
+    def _slot(self, di: vtable.DataInfo) -> int:
+        if di.name not in self.slots:
+            self.slots[di.name] = len(self.dis)
+            self.dis.append(di)
+        return self.slots[di.name]
+
+    def _args(self, kwargs: dict, alias: dict[int, int]) -> dict:
+        # DataInfo arguments are (slot,), constants are kept
+        args = {}
+        for k, v in kwargs.items():
+            if isinstance(v, vtable.DataInfo):
+                s = self.slots[v.name]
+                args[k] = (alias.get(s, s),)
+            else:
+                args[k] = v
+        return args
+
+    @staticmethod
+    def _key(function: typing.Callable, args: dict) -> typing.Optional[tuple]:
+        key = (function, tuple(sorted(args.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _generate(self) -> tuple[str, dict]:
+        namespace = {}
+        lines = ['def program(start, stop):']
+        used = sorted({s for _, args, ret in self.steps
+                       for s in [ret] + [v[0] for v in args.values()
+                                         if isinstance(v, tuple)]})
+        for s in used:
+            lines.append(f'    a{s} = columns[{s}]')
+        lines.append('    for i in range(start, stop):')
+        for s in used:
+            if s in self.transient:
+                namespace[f'v{s}'] = backtest.table.first_value(
+                    self.dis[s])
+                lines.append(f'        a{s}[0] = a{s}[1]')
+                lines.append(f'        a{s}[1] = v{s}')
+        for k, (function, args, ret) in enumerate(self.steps):
+            namespace[f'f{k}'] = function
+            kwargs = []
+            for name, v in args.items():
+                if isinstance(v, tuple):
+                    history = '' if v[0] in self.transient else '[:i]'
+                    kwargs.append(f'{name}=a{v[0]}{history}')
+                else:
+                    namespace[f'c{k}_{name}'] = v
+                    kwargs.append(f'{name}=c{k}_{name}')
+            row = '1' if ret in self.transient else 'i - 1'
+            lines.append(f'        a{ret}[{row}] = f{k}({", ".join(kwargs)})')
+        if not self.steps:
+            lines.append('        pass')
+        return '\n'.join(lines) + '\n', namespace
+
+    def table(self) -> backtest.table.ResultTable:
+        '''
+        Return a new result table with input columns written,
+        2-row scratch columns for transient slots.
+        '''
+        table = backtest.table.ResultTable(self.index,
+                                           self.dis,
+                                           scratch=self.transient)
+        for s, values in self.inputs.items():
+            table.write(s, values)
+        return table
+
+    def run(self) -> pd.DataFrame:
+        '''
+        Execute the program for every row.
+
+        Returns:
+            table with a column for every result DataInfo,
+            a view of the result table columns
+        '''
+        table = self.table()
+        program = self.compiled(table.columns)
+        program(2, len(self.index) + 2)
+        return table.frame(self.outputs())
+
+    def outputs(self) -> dict[str, int]:
+        '''
+        Return slots of the result DataInfos by name.
+        '''
+        return {name: s
+                for name, s in self.slots.items()
+                if name not in self.transient_names
+                and s not in self.transient
+                and (self.results is None or name in self.results)}
+
+    def functions(self) -> list[typing.Callable]:
+        '''
+        Return functions called by the program, every function once.
+        '''
+        ret = []
+        for function, _, _ in self.steps:
+            if not any(function is f for f in ret):
+                ret.append(function)
+        return ret
+
+    def compiled(self, columns: list[np.ndarray]) -> typing.Callable:
+        '''
+        Return `program(start, stop)` executing rows over `columns`.
+
+        Row `i` writes row `i - 1` and reads history `[:i]`.
+        '''
+        namespace = dict(self._namespace)
+        namespace['columns'] = columns
+        # pylint: disable=exec-used
+        exec(compile(self.source, '<backtest.program>', 'exec'), namespace)
+        return namespace['program']
+
+
+# pylint: disable=too-few-public-methods
+class BacktestEngine:
+    '''
+    Backtest engine executing vector ops first,
+    then the remaining ops as one compiled program for every row.
+
+    Falls back to vfin.BacktestEngine if the ops can not be compiled.
+
+    Args:
+        ops: all ops
+        dfs: input tables
+        debug: execute op by op with vfin.BacktestEngine
+        cache: vector op results, see backtest.vector.prepare()
+        transient: DataInfos that are not stored in the table,
+                   e.g. from opgen.transient_dis()
+        results: DataInfos returned in the table,
+                 if None - all that are not transient
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 ops: list[vfin.Operation],
+                 dfs: dict[str, pd.DataFrame],
+                 debug: bool = False,
+                 cache: dict = None,
+                 transient: list[vtable.DataInfo] = None,
+                 results: list[vtable.DataInfo] = None):
+        self.program = None
+        self._engine = None
+        self.results = None
+        if results is not None:
+            self.results = {di.name for di in results}
+        if debug:
+            self._engine = vfin.BacktestEngine(ops, dfs)
+            return
+        transient_names = {di.name for di in transient or []}
+        # transient columns are calculated row by row in scratch rows
+        seq_ops, dfs = backtest.vector.prepare(ops,
+                                               dfs,
+                                               cache,
+                                               sequential=transient_names)
+        try:
+            self.program = Program(seq_ops,
+                                   dfs,
+                                   transient=transient_names,
+                                   results=self.results)
+        except CompileError as e:
+            logger.warning('not compiled, executing op by op: %s', e)
+            self._engine = vfin.BacktestEngine(seq_ops, dfs)
+
+    def run(self) -> pd.DataFrame:
+        '''
+        Run the backtest.
+        '''
+        if self.program is not None:
+            return self.program.run()
+        table = self._engine.run()
+        if self.results is not None:
+            table = table[[c for c in table.columns if c in self.results]]
+        return table
@@ -0,0 +1,317 @@
+'''
+Summary statistics of many strategies at once.
+
+Totals of all strategies are stacked into one (bar x strategy) array
+and every metric is one vectorized pass over it:
+
+    final         - total of the last row
+    cagr          - compound annual growth rate
+    max drawdown  - largest relative drop from a peak, negative
+    sharpe        - annualized mean / standard deviation of returns
+    sortino       - annualized mean / downside deviation of returns
+    exposure      - part of bars in the market
+    trades        - number of positions opened
+
+Returns are time-weighted: cash added during a bar is not a return,
+so strategies adding cash compare with strategies that do not.
+Deposits are taken from the `add_cash` and `add_cash_alarm` of opgens.
+
+Exposure and trades are taken from the positions replayed from
+the entry and exit signal columns of a strategy, see positions().
+If its table has no signals, e.g. transient in backtest.program,
+they are estimated from the totals instead: a bar with a non-zero return
+is in the market, so a bar in the market with an unchanged price counts
+as out of the market, and trades are periods in the market.
+'''
+import typing
+import numpy as np
+import pandas as pd
+import vfin_ops
+import backtest.alarm
+
+PERIODS_PER_YEAR = 252
+COLUMNS = ['final', 'cagr', 'max drawdown', 'sharpe', 'sortino',
+           'exposure', 'trades']
+# smaller returns are out of the market
+RETURN_EPS = 1e-12
+# position flags, see positions()
+LONG = 1
+SHORT = 2
+SIGNALS = ['long entry', 'long exit', 'short entry', 'short exit']
+_NS_PER_YEAR = 365.25 * 24 * 3600 * 1e9
+
+
+def stack(totals: list[pd.Series]) -> tuple[pd.Index, np.ndarray]:
+    '''
+    Align totals to the union of their indexes.
+
+    Returns:
+        index, (bar x strategy) float64 array, NaN where a total has no row
+    '''
+    index = None
+    for t in totals:
+        index = t.index if index is None else index.union(t.index)
+    ret = np.full((len(index), len(totals)), np.nan)
+    for i, t in enumerate(totals):
+        ret[index.get_indexer(t.index), i] = t.to_numpy(dtype=np.float64)
+    return index, ret
+
+
+def returns(totals: np.ndarray, deposits: np.ndarray = None) -> np.ndarray:
+    '''
+    Return time-weighted returns of every bar, NaN for the first bar
+    and where the previous total is missing.
+
+    Args:
+        totals: (bar x strategy) totals
+        deposits: cash added in every bar, (bar,) or (bar x strategy)
+    '''
+    prev = totals[:-1]
+    cur = totals[1:]
+    if deposits is not None:
+        deposits = np.asarray(deposits, dtype=np.float64)
+        if deposits.ndim == 1:
+            deposits = deposits[:, np.newaxis]
+        cur = cur - deposits[1:]
+    ret = np.full(totals.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret[1:] = cur / prev - 1
+    ret[~np.isfinite(ret)] = np.nan
+    return ret
+
+
+def _signal(signal: typing.Optional[np.ndarray],
+            shape: tuple[int, int]) -> np.ndarray:
+    if signal is None:
+        return np.zeros(shape, dtype=bool)
+    # nan is off, same as in the sequential ops
+    signal = np.asarray(signal, dtype=np.float64)
+    return np.broadcast_to(~np.isnan(signal) & (signal != 0), shape)
+
+
+# pylint: disable=too-many-arguments
+def positions(initial_cash: np.ndarray,
+              deposits: np.ndarray,
+              long_entry: np.ndarray = None,
+              long_exit: np.ndarray = None,
+              short_entry: np.ndarray = None,
+              short_exit: np.ndarray = None) -> np.ndarray:
+    '''
+    Return positions held at the end of every bar, LONG | SHORT flags,
+    replayed from the trading signals by the rules of backtest.kernel:
+    exits before entries, an entry only with cash, i.e. initial cash,
+    a deposit or an exit before it. Exits are assumed to return cash.
+
+    Args:
+        initial_cash: initial cash, (strategy,)
+        deposits: cash added in every bar, (bar x strategy)
+        long_entry, long_exit, short_entry, short_exit:
+            signals, (bar x strategy), None if never on
+
+    Returns:
+        (bar x strategy) int8 array
+    '''
+    deposits = np.asarray(deposits, dtype=np.float64)
+    shape = deposits.shape
+    long_entry = _signal(long_entry, shape)
+    long_exit = _signal(long_exit, shape)
+    short_entry = _signal(short_entry, shape)
+    short_exit = _signal(short_exit, shape)
+    cash = np.asarray(initial_cash, dtype=np.float64) > 0
+    long = np.zeros(shape[1], dtype=bool)
+    short = np.zeros(shape[1], dtype=bool)
+    ret = np.empty(shape, dtype=np.int8)
+    for i in range(shape[0]):
+        cash |= deposits[i] > 0
+        m = long_exit[i] & long
+        long &= ~m
+        cash |= m
+        m = short_exit[i] & short
+        short &= ~m
+        cash |= m
+        m = long_entry[i] & cash
+        long |= m
+        cash &= ~m
+        m = short_entry[i] & cash
+        short |= m
+        cash &= ~m
+        ret[i] = np.where(long, LONG, 0) | np.where(short, SHORT, 0)
+    return ret
+
+
+def summary(names: list[str],
+            index: pd.Index,
+            totals: np.ndarray,
+            deposits: np.ndarray = None,
+            periods_per_year: int = PERIODS_PER_YEAR,
+            held: np.ndarray = None) -> pd.DataFrame:
+    '''
+    Return statistics of every strategy, a row per strategy.
+
+    Args:
+        names: strategy names
+        index: datetime index of the rows
+        totals: (bar x strategy) totals, see stack()
+        deposits: cash added in every bar, see returns()
+        periods_per_year: bars per year for annualizing
+        held: positions held at the end of every bar, see positions(),
+              (bar x strategy), columns of -1 where exposure and trades
+              are estimated from returns,
+              if None - estimated for all strategies
+    '''
+    n_bars, n = totals.shape
+    cols = np.arange(n)
+    r = returns(totals, deposits)
+    valid = ~np.isnan(r)
+    count = valid.sum(axis=0)
+    r0 = np.where(valid, r, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = r0.sum(axis=0) / count
+        std = np.sqrt(np.where(valid, (r0 - mean) ** 2, 0.0).sum(axis=0)
+                      / (count - 1))
+        downside = np.sqrt((np.minimum(r0, 0.0) ** 2).sum(axis=0) / count)
+        sharpe = mean / std * np.sqrt(periods_per_year)
+        sortino = mean / downside * np.sqrt(periods_per_year)
+
+        # growth of one unit invested in the first bar
+        equity = np.cumprod(1 + r0, axis=0)
+        drawdown = (equity / np.maximum.accumulate(equity, axis=0) - 1) \
+            .min(axis=0)
+
+        has = ~np.isnan(totals)
+        first = np.argmax(has, axis=0)
+        last = n_bars - 1 - np.argmax(has[::-1], axis=0)
+        ns = index.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        years = (ns[last] - ns[first]) / _NS_PER_YEAR
+        cagr = equity[-1] ** (1 / years) - 1
+
+        # deposits can leave rounding errors in returns
+        exposed = valid & (np.abs(r0) > RETURN_EPS)
+    trades = exposed[:1].sum(axis=0) \
+        + (exposed[1:] & ~exposed[:-1]).sum(axis=0)
+    if held is not None:
+        known = (np.asarray(held) >= 0).all(axis=0)
+        # positions before every bar, returns of a bar are of them
+        before = np.zeros((n_bars, int(known.sum())), dtype=np.int8)
+        before[1:] = held[:-1, known]
+        exposed[:, known] = valid[:, known] & (before != 0)
+        opened = held[:, known] & ~before
+        trades[known] = (opened & LONG != 0).sum(axis=0) \
+            + (opened & SHORT != 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exposure = exposed.sum(axis=0) / count
+
+    empty = ~has.any(axis=0)
+    final = totals[last, cols]
+    final[empty] = np.nan
+    ret = pd.DataFrame({'final': final,
+                        'cagr': cagr,
+                        'max drawdown': drawdown,
+                        'sharpe': sharpe,
+                        'sortino': sortino,
+                        'exposure': exposure,
+                        'trades': trades},
+                       index=pd.Index(names, name='strategy'),
+                       columns=COLUMNS)
+    ret.loc[empty | (count == 0), COLUMNS[1:]] = np.nan
+    return ret
+
+
+def opgen_deposits(opgen: vfin_ops.TradingOpGen,
+                   index: pd.Index) -> np.ndarray:
+    '''
+    Return cash added by `opgen` in every row of `index`:
+    `add_cash` where its `add_cash_alarm` is on.
+    '''
+    add_cash = getattr(opgen, 'add_cash', None)
+    if not add_cash:
+        return np.zeros(len(index))
+    alarm = backtest.alarm.mask(opgen.add_cash_alarm,
+                                {'index': pd.DataFrame(index=index)})
+    return np.where(alarm, np.float64(add_cash), 0.0)
+
+
+def _signals(opgen: vfin_ops.TradingOpGen,
+             table: pd.DataFrame,
+             index: pd.Index) -> typing.Optional[dict[str, np.ndarray]]:
+    # signal columns of the opgen aligned to `index`,
+    # None if not all of them are in the table
+    dis = {s: opgen.di[f'{s} signal']
+           for s in SIGNALS if f'{s} signal' in opgen.di}
+    if not dis or any(di.name not in table for di in dis.values()):
+        return None
+    return {s.replace(' ', '_'): table[di.name].reindex(index)
+            .to_numpy(dtype=np.float64)[:, np.newaxis]
+            for s, di in dis.items()}
+
+
+def from_tables(opgens: dict[str, vfin_ops.TradingOpGen],
+                tables: dict[str, pd.DataFrame],
+                deposits: np.ndarray = None,
+                periods_per_year: int = PERIODS_PER_YEAR) -> pd.DataFrame:
+    '''
+    Return statistics of strategies from their result tables,
+    see summary().
+
+    Positions are replayed from the signal columns of a strategy
+    if they are all in its table, see positions(),
+    with the first total as the initial cash.
+
+    Args:
+        opgens: strategies by name
+        tables: result table of every strategy by name,
+                tables may be shared, e.g. by backtest.sweep.tables()
+        deposits: cash added in every row of the stacked index,
+                  if None - of every strategy, see opgen_deposits()
+        periods_per_year: bars per year for annualizing
+    '''
+    # all strategies of a shared table are taken in one step
+    by_table = {}
+    for name, opgen in opgens.items():
+        table = tables[name]
+        by_table.setdefault(id(table), (table, []))[1].append(
+            (name, opgen.di['total'].name))
+    if len(by_table) == 1:
+        table, cols = next(iter(by_table.values()))
+        index = table.index
+        names = [name for name, _ in cols]
+        totals = table[[c for _, c in cols]].to_numpy(dtype=np.float64)
+    else:
+        names = []
+        series = []
+        for table, cols in by_table.values():
+            for name, c in cols:
+                names.append(name)
+                series.append(table[c])
+        index, totals = stack(series)
+    if deposits is None:
+        deposits = np.stack([opgen_deposits(opgens[name], index)
+                             for name in names], axis=1)
+    deposits = np.broadcast_to(
+        np.asarray(deposits, dtype=np.float64).reshape(len(index), -1),
+        totals.shape)
+    held = np.full(totals.shape, -1, dtype=np.int8)
+    for i, name in enumerate(names):
+        signals = _signals(opgens[name], tables[name], index)
+        if signals is not None:
+            # cash before any entry
+            first = totals[np.argmax(~np.isnan(totals[:, i])), i]
+            held[:, i] = positions([first],
+                                   deposits[:, i:i + 1],
+                                   **signals)[:, 0]
+    ret = summary(names, index, totals, deposits, periods_per_year, held)
+    return ret.loc[list(opgens)]
+
+
+def top(stats: pd.DataFrame,
+        k: int = 10,
+        by: str = 'sharpe',
+        ascending: bool = False) -> pd.DataFrame:
+    '''
+    Return the best `k` strategies by the `by` column, NaNs last.
+    '''
+    return stats.sort_values(by,
+                             ascending=ascending,
+                             na_position='last',
+                             kind='stable').head(k)
@@ -0,0 +1,206 @@
+'''
+Local on-disk price store.
+
+Every ticker is stored as one directory:
+    meta.json     - store version, columns, time zone and the fetched range
+    index.npy     - int64 nanoseconds since epoch
+    <column>.npy  - one file per column
+
+Columns are memory-mapped on load, date range requests are slices
+of the mapped columns and are not copied.
+Only the missing part of the requested range is downloaded.
+'''
+import datetime
+import json
+import os
+import re
+import typing
+import numpy as np
+import pandas as pd
+import vfin
+
+VERSION = 1
+DEFAULT_PATH = '__price_store__'
+
+
+def _file_name(col: str) -> str:
+    return re.sub(r'[^\w\-]', '_', col) + '.npy'
+
+
+def _timestamp(t: typing.Union[datetime.datetime, pd.Timestamp, str]) \
+        -> pd.Timestamp:
+    return pd.Timestamp(t).tz_localize(None)
+
+
+class PriceStore:
+    '''
+    Versioned columnar price store.
+
+    Args:
+        path: store directory
+        offline: never download, only serve stored ranges
+    '''
+    def __init__(self,
+                 path: str = DEFAULT_PATH,
+                 offline: bool = False):
+        self.path = path
+        self.offline = offline
+        self._loaded = {}
+
+    def _dir(self, ticker: str) -> str:
+        return os.path.join(self.path, re.sub(r'[^\w\-]', '_', ticker))
+
+    def _meta(self, ticker: str) -> typing.Optional[dict]:
+        try:
+            with open(os.path.join(self._dir(ticker), 'meta.json'),
+                      encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if meta.get('version') != VERSION:
+            return None
+        return meta
+
+    def load(self, ticker: str) -> typing.Optional[pd.DataFrame]:
+        '''
+        Return all stored rows of `ticker` with memory-mapped columns,
+        None if not stored.
+        '''
+        meta = self._meta(ticker)
+        if meta is None:
+            return None
+        loaded = self._loaded.get(ticker)
+        if loaded is not None and loaded[0] == meta:
+            return loaded[1]
+        d = self._dir(ticker)
+        index = pd.DatetimeIndex(
+            np.load(os.path.join(d, 'index.npy')).view('datetime64[ns]'),
+            name=meta['index name'])
+        if meta['tz']:
+            index = index.tz_localize('UTC').tz_convert(meta['tz'])
+        cols = {col: np.load(os.path.join(d, _file_name(col)),
+                             mmap_mode='r')
+                for col in meta['columns']}
+        df = pd.DataFrame(cols, index=index, copy=False)
+        self._loaded[ticker] = (meta, df)
+        return df
+
+    def save(self,
+             ticker: str,
+             df: pd.DataFrame,
+             start: pd.Timestamp,
+             end: pd.Timestamp):
+        '''
+        Replace stored rows of `ticker`.
+
+        Args:
+            ticker: ticker name
+            df: all rows of the ticker, sorted by index
+            start: start of the fetched range
+            end: end of the fetched range
+        '''
+        d = self._dir(ticker)
+        os.makedirs(d, exist_ok=True)
+        index = df.index
+        tz = str(index.tz) if index.tz is not None else None
+        if tz:
+            index = index.tz_convert('UTC').tz_localize(None)
+
+        def write(name, values):
+            tmp = os.path.join(d, f'.{name}.tmp.npy')
+            np.save(tmp, values)
+            os.replace(tmp, os.path.join(d, name))
+
+        write('index.npy', index.to_numpy(dtype='datetime64[ns]')
+              .view(np.int64))
+        for col in df.columns:
+            write(_file_name(col), df[col].to_numpy())
+        meta = {'version': VERSION,
+                'columns': list(df.columns),
+                'index name': df.index.name,
+                'tz': tz,
+                'start': start.isoformat(),
+                'end': end.isoformat()}
+        tmp = os.path.join(d, '.meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(tmp, os.path.join(d, 'meta.json'))
+        self._loaded.pop(ticker, None)
+
+    def fetch_ticker(self,
+                     ticker: str,
+                     start: datetime.datetime,
+                     end: datetime.datetime) -> pd.DataFrame:
+        '''
+        Return rows of `ticker` in [start, end), same as vfin.fetch_ticker().
+
+        Only the part of the range that is not stored yet is downloaded.
+        '''
+        start = _timestamp(start)
+        end = _timestamp(end)
+        meta = self._meta(ticker)
+        parts = []
+        if meta is None:
+            stored_start, stored_end = start, end
+            parts.append((start, end))
+        else:
+            # keep the stored range contiguous
+            stored_start = pd.Timestamp(meta['start'])
+            stored_end = pd.Timestamp(meta['end'])
+            if start < stored_start:
+                parts.append((start, stored_start))
+            if end > stored_end:
+                parts.append((stored_end, end))
+        if parts:
+            if self.offline:
+                raise KeyError(f'{ticker} {start} - {end} not stored')
+            df = self.load(ticker)
+            dfs = [] if df is None else [df]
+            for s, e in parts:
+                dfs.append(vfin.fetch_ticker(ticker,
+                                             start=s.to_pydatetime(),
+                                             end=e.to_pydatetime()))
+            df = pd.concat(dfs).sort_index()
+            df = df[~df.index.duplicated(keep='last')]
+            self.save(ticker,
+                      df,
+                      start=min(start, stored_start),
+                      end=max(end, stored_end))
+        return self.slice(self.load(ticker), start, end)
+
+    @staticmethod
+    def slice(df: pd.DataFrame,
+              start: pd.Timestamp,
+              end: pd.Timestamp) -> pd.DataFrame:
+        '''
+        Return rows in [start, end) without copying.
+        '''
+        index = df.index
+        if index.tz is not None:
+            start = start.tz_localize(index.tz)
+            end = end.tz_localize(index.tz)
+        i = index.searchsorted(start, side='left')
+        j = index.searchsorted(end, side='left')
+        return df.iloc[i:j]
+
+
+def default_store() -> PriceStore:
+    '''
+    Return the store configured by the environment:
+    PRICE_STORE - store path,
+    PRICE_STORE_OFFLINE - if set, never download.
+    '''
+    return PriceStore(path=os.environ.get('PRICE_STORE', DEFAULT_PATH),
+                      offline=bool(os.environ.get('PRICE_STORE_OFFLINE')))
+
+
+def fetch_ticker(ticker: str,
+                 start: datetime.datetime,
+                 end: datetime.datetime,
+                 store: PriceStore = None) -> pd.DataFrame:
+    '''
+    vfin.fetch_ticker() through the price store.
+    '''
+    if store is None:
+        store = default_store()
+    return store.fetch_ticker(ticker, start=start, end=end)
@@ -0,0 +1,253 @@
+'''
+Streaming backtest in chunks with bounded lookback.
+
+Ops are compiled by backtest.program and executed chunk by chunk.
+Every column is a window of `lookback` history rows followed by
+the rows of the current chunk. After a chunk the last `lookback` rows
+are moved to the front, so memory does not depend on the table length
+and history slices passed to ops stay contiguous.
+
+Opgens declare their lookback in max_lookback(): the largest `k` of
+`x[-k]` any of their ops reads.
+Stateful functions that track the history length, e.g.
+strategies.indicators.RollingSma, may define `shift(rows)`,
+called when `rows` leading rows are dropped from the window.
+
+Results are returned chunk by chunk by chunks(),
+or written to a sink, e.g. DiskSink.
+'''
+import inspect
+import json
+import os
+import re
+import typing
+import numpy as np
+import pandas as pd
+import vfin
+import vfin_ops
+import vtable
+import backtest.program
+import backtest.table
+
+# ops of vfin_ops.TradingOpGen read x[-1] and x[-2]
+DEFAULT_LOOKBACK = 2
+CHUNK_SIZE = 2**16
+
+
+def max_lookback(opgens: list[vfin_ops.TradingOpGen]) -> int:
+    '''
+    Return the largest lookback of `opgens`,
+    DEFAULT_LOOKBACK for opgens that do not declare it.
+    '''
+    ret = DEFAULT_LOOKBACK
+    for opgen in opgens:
+        if hasattr(opgen, 'max_lookback'):
+            ret = max(ret, opgen.max_lookback())
+    return ret
+
+
+class DiskSink:
+    '''
+    Append result chunks to files in `path`:
+        meta.json   - columns, dtypes, time zone and the number of rows
+        index.bin   - int64 nanoseconds since epoch
+        <column>.bin - raw values, one file per column
+
+    Args:
+        path: sink directory, created if missing
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self._meta = None
+        self._files = {}
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def _file_name(col: str) -> str:
+        return re.sub(r'[^\w\-]', '_', col) + '.bin'
+
+    def write(self, df: pd.DataFrame):
+        '''
+        Append rows of `df`, all chunks must have the same columns.
+        '''
+        index = df.index
+        if self._meta is None:
+            self._meta = {'columns': list(df.columns),
+                          'dtypes': [df[c].dtype.str for c in df.columns],
+                          'index name': index.name,
+                          'tz': str(index.tz) if index.tz is not None
+                          else None}
+            # pylint: disable=consider-using-with
+            self._files['index'] = open(os.path.join(self.path,
+                                                     'index.bin'),
+                                        'wb')
+            for col in df.columns:
+                self._files[col] = open(os.path.join(self.path,
+                                                     self._file_name(col)),
+                                        'wb')
+        if index.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        self._files['index'].write(
+            index.to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+        for col in df.columns:
+            self._files[col].write(
+                np.ascontiguousarray(df[col].to_numpy()).tobytes())
+        self.rows += len(df)
+
+    def close(self):
+        '''
+        Close column files and write meta.json.
+        '''
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        meta = dict(self._meta or {'columns': [],
+                                   'dtypes': [],
+                                   'index name': None,
+                                   'tz': None})
+        meta['rows'] = self.rows
+        with open(os.path.join(self.path, 'meta.json'),
+                  'w',
+                  encoding='utf-8') as f:
+            json.dump(meta, f, indent=4)
+
+    @classmethod
+    def load(cls, path: str) -> pd.DataFrame:
+        '''
+        Return the table written to `path` with memory-mapped columns.
+        '''
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        rows = meta['rows']
+
+        def read(name, dtype):
+            if not rows:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(os.path.join(path, name),
+                             dtype=dtype,
+                             mode='r',
+                             shape=(rows,))
+
+        index = pd.DatetimeIndex(read('index.bin', np.int64)
+                                 .view('datetime64[ns]'),
+                                 name=meta['index name'])
+        if meta['tz']:
+            index = index.tz_localize('UTC').tz_convert(meta['tz'])
+        return pd.DataFrame({col: read(cls._file_name(col), np.dtype(dtype))
+                             for col, dtype in zip(meta['columns'],
+                                                   meta['dtypes'])},
+                            index=index,
+                            copy=False)
+
+
+class BacktestEngine:
+    '''
+    Backtest engine executing the compiled program chunk by chunk.
+
+    Vector ops are executed row by row, so no column is calculated
+    over the whole table.
+
+    Args:
+        ops: all ops, only vfin_ops.Call ops are supported
+        dfs: input tables, e.g. memory-mapped by backtest.store
+        lookback: history rows kept for ops, see max_lookback()
+        chunk_size: rows executed at once
+        transient: DataInfos that are not stored in the results
+        results: DataInfos returned in the results,
+                 if None - all that are not transient
+
+    Raises:
+        backtest.program.CompileError: if the ops can not be compiled
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 ops: list[vfin.Operation],
+                 dfs: dict[str, pd.DataFrame],
+                 lookback: int,
+                 chunk_size: int = CHUNK_SIZE,
+                 transient: list[vtable.DataInfo] = None,
+                 results: list[vtable.DataInfo] = None):
+        assert lookback > 0
+        assert chunk_size > 0
+        self.lookback = lookback
+        self.chunk_size = chunk_size
+        self.program = backtest.program.Program(
+            ops,
+            dfs,
+            transient={di.name for di in transient or []},
+            results=None if results is None
+            else {di.name for di in results})
+
+    def _shifts(self) -> list[typing.Callable]:
+        # functions shared by ops, e.g. through an indicator cache,
+        # are shifted once
+        functions = {}
+        for function in self.program.functions():
+            function = inspect.unwrap(function)
+            if hasattr(function, 'shift'):
+                functions[id(function)] = function
+        return [f.shift for f in functions.values()]
+
+    def chunks(self) -> typing.Iterator[pd.DataFrame]:
+        '''
+        Run the backtest, yield results of every chunk.
+        '''
+        p = self.program
+        table = backtest.table.ResultTable(
+            p.index,
+            p.dis,
+            scratch=p.transient,
+            rows=self.lookback + self.chunk_size)
+        program = p.compiled(table.columns)
+        outputs = p.outputs()
+        shifts = self._shifts()
+        # rows that are not inputs or scratch, reset for every chunk
+        written = [s for s in range(len(p.dis))
+                   if s not in p.inputs and s not in p.transient]
+        # the leading row is the first history row
+        history = 1
+        for start in range(0, len(p.index), self.chunk_size):
+            stop = min(start + self.chunk_size, len(p.index))
+            end = history + stop - start
+            for s, values in p.inputs.items():
+                table.columns[s][history:end] = values[start:stop]
+            for s in written:
+                table.columns[s][history:end] = \
+                    backtest.table.first_value(p.dis[s])
+            program(history + 1, end + 1)
+            yield pd.DataFrame({name: table.columns[s][history:end].copy()
+                                for name, s in outputs.items()},
+                               index=p.index[start:stop])
+
+            keep = min(self.lookback, end)
+            dropped = end - keep
+            if dropped:
+                for s, col in enumerate(table.columns):
+                    if s not in p.transient:
+                        col[:keep] = col[dropped:end]
+                for shift in shifts:
+                    shift(dropped)
+            history = keep
+
+    def run(self, sink: DiskSink = None) -> typing.Optional[pd.DataFrame]:
+        '''
+        Run the backtest.
+
+        Args:
+            sink: if set, every chunk is written to it
+                  and the sink is closed at the end
+
+        Returns:
+            the whole table if `sink` is None, otherwise None
+        '''
+        if sink is None:
+            chunks = list(self.chunks())
+            if not chunks:
+                return pd.DataFrame(columns=list(self.program.outputs()),
+                                    index=self.program.index)
+            return pd.concat(chunks)
+        for chunk in self.chunks():
+            sink.write(chunk)
+        sink.close()
+        return None
@@ -0,0 +1,177 @@
+'''
+Parameter surfaces of sweeps.
+
+Results of a sweep are points of the parameter space. They are mapped
+onto a dense grid over two or three chosen axes, the other axes are
+aggregated, e.g. the best score over all other params. Grid points
+without results are NaN.
+
+The grid index is built at once: every axis is encoded by np.unique(),
+codes are combined into flat cell numbers and results are aggregated
+per cell after one sort.
+'''
+import numpy as np
+import pandas as pd
+import vplot
+import backtest.plot
+
+AGGREGATES = ['max', 'min', 'mean', 'median', 'count']
+
+
+class Grid:
+    '''
+    Dense grid of aggregated results.
+
+    Args:
+        axes: param names of the grid axes
+        values: sorted param values of every axis
+        data: aggregated results, one dimension per axis,
+              NaN where no result falls into a cell
+        agg: aggregate name, see AGGREGATES
+    '''
+    def __init__(self,
+                 axes: list[str],
+                 values: list[np.ndarray],
+                 data: np.ndarray,
+                 agg: str):
+        self.axes = axes
+        self.values = values
+        self.data = data
+        self.agg = agg
+
+    def frame(self) -> pd.DataFrame:
+        '''
+        Return a 2-D grid as a table,
+        rows by the first axis, columns by the second one.
+        '''
+        assert len(self.axes) == 2
+        return pd.DataFrame(self.data,
+                            index=pd.Index(self.values[0], name=self.axes[0]),
+                            columns=pd.Index(self.values[1],
+                                             name=self.axes[1]))
+
+    def best(self) -> dict:
+        '''
+        Return axis values of the cell with the largest result.
+        '''
+        i = np.unravel_index(np.nanargmax(self.data), self.data.shape)
+        return {a: v[j].item() for a, v, j in zip(self.axes, self.values, i)}
+
+
+def params_table(defs: list) -> pd.DataFrame:
+    '''
+    Return params of sweep definitions, a row per strategy name,
+    missing params are 0, see strategies.sma_cross.SmaCrossOpGen.
+
+    Args:
+        defs: strategy definitions, see backtest.sweep.OpGenDef
+    '''
+    return pd.DataFrame([d.kwargs['params'] for d in defs],
+                        index=pd.Index([d.name for d in defs],
+                                       name='strategy')).fillna(0)
+
+
+def grid(params: pd.DataFrame,
+         results: pd.Series,
+         axes: list[str],
+         agg: str = 'max') -> Grid:
+    '''
+    Map results onto a dense grid over `axes`.
+
+    Args:
+        params: param values, a row per strategy, see params_table()
+        results: a result per strategy, e.g. a column of
+                 backtest.stats.summary(), NaNs are skipped
+        axes: two or three param names
+        agg: aggregate of results falling into one cell, see AGGREGATES
+    '''
+    assert 2 <= len(axes) <= 3
+    assert agg in AGGREGATES
+    y = results.reindex(params.index).to_numpy(dtype=np.float64)
+    values = []
+    codes = []
+    for a in axes:
+        v, c = np.unique(params[a].to_numpy(), return_inverse=True)
+        values.append(v)
+        codes.append(c.reshape(-1))
+    shape = tuple(len(v) for v in values)
+    cells = np.ravel_multi_index(codes, shape)
+
+    valid = ~np.isnan(y)
+    cells = cells[valid]
+    y = y[valid]
+    # results sorted by cell, then by value
+    order = np.lexsort((y, cells))
+    cells = cells[order]
+    y = y[order]
+    used, starts, counts = np.unique(cells,
+                                     return_index=True,
+                                     return_counts=True)
+
+    if agg == 'count':
+        agg_values = counts.astype(np.float64)
+    elif agg == 'min':
+        agg_values = y[starts]
+    elif agg == 'max':
+        agg_values = y[starts + counts - 1]
+    elif agg == 'mean':
+        agg_values = np.add.reduceat(y, starts) / counts if len(y) else y
+    else:
+        agg_values = (y[starts + (counts - 1) // 2]
+                      + y[starts + counts // 2]) / 2
+    data = np.full(int(np.prod(shape)), np.nan)
+    data[used] = agg_values
+    return Grid(list(axes), values, data.reshape(shape), agg)
+
+
+def plateau(g: Grid, radius: int = 1) -> Grid:
+    '''
+    Return the worst result within `radius` cells of every cell,
+    high values mark robust plateaus instead of single peaks.
+    Missing cells are skipped.
+    '''
+    data = g.data
+    ret = np.full(data.shape, np.inf)
+    padded = np.pad(data,
+                    radius,
+                    mode='constant',
+                    constant_values=np.nan)
+    for shift in np.ndindex(*(2 * radius + 1,) * data.ndim):
+        window = padded[tuple(slice(s, s + n)
+                              for s, n in zip(shift, data.shape))]
+        ret = np.fmin(ret, window)
+    ret[np.isnan(data)] = np.nan
+    return Grid(g.axes, g.values, ret, f'{g.agg}, plateau {radius}')
+
+
+def subplots(g: Grid, name: str = 'result') -> list[vplot.Subplot]:
+    '''
+    Return subplots of a grid: results over the first axis,
+    a line per value of the second axis,
+    a subplot per value of the third axis.
+    '''
+    data = g.data if g.data.ndim == 3 else g.data[:, :, np.newaxis]
+    third = g.values[2] if len(g.values) == 3 else [None]
+    ret = []
+    for k, z in enumerate(third):
+        traces = []
+        for j, v in enumerate(g.values[1]):
+            label = f'{g.axes[1]} {v}'
+            if z is not None:
+                label += f', {g.axes[2]} {z}'
+            traces.append(vplot.Scatter(
+                x=g.values[0],
+                y=data[:, j, k],
+                color=backtest.plot.color(j),
+                width=1.0,
+                mode='lines+markers',
+                name=f'{g.agg} {name}: {label}'))
+        ret.append(vplot.Subplot(col=1, row=k + 1, traces=traces))
+    return ret
+
+
+def to_file(g: Grid, filename: str, name: str = 'result'):
+    '''
+    Draw a grid into `filename`, see subplots().
+    '''
+    backtest.plot.to_file(subplots(g, name), filename)
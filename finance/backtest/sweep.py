@@ -0,0 +1,258 @@
+'''
+Parameter sweep over a process pool.
+
+Every worker process runs the backtest for a chunk of strategies.
+Input tables are passed to the workers once, with the `fork` start method
+they are shared read-only with the parent process.
+'''
+import concurrent.futures
+import inspect
+import math
+import multiprocessing
+import os
+import typing
+import pandas as pd
+import vfin_ops
+import vstats
+import backtest.checkpoint
+import backtest.memo
+import backtest.vector
+
+
+class OpGenDef:
+    '''
+    Picklable definition of an operation generator.
+
+    Workers receive definitions instead of op lists
+    and create the operation generators themselves.
+
+    Args:
+        name: strategy name, must be unique within a sweep
+        cls: operation generator class, must accept `name`
+        kwargs: other init arguments
+    '''
+    def __init__(self,
+                 name: str,
+                 cls: type,
+                 kwargs: dict):
+        self.name = name
+        self.cls = cls
+        self.kwargs = kwargs
+
+    def create(self) -> vfin_ops.TradingOpGen:
+        '''
+        Create the operation generator.
+        '''
+        return self.cls(name=self.name, **self.kwargs)
+
+
+# per-process state, set by _init_worker()
+_DFS = None
+_ENGINE = None
+_ENGINE_KWARGS = None
+
+
+def _init_worker(dfs: dict[str, pd.DataFrame], engine: type):
+    # pylint: disable=global-statement
+    global _DFS, _ENGINE, _ENGINE_KWARGS
+    _DFS = dfs
+    _ENGINE = engine
+    _ENGINE_KWARGS = {}
+    if 'cache' in inspect.signature(engine).parameters:
+        # indicators are shared by all chunks of this worker
+        _ENGINE_KWARGS['cache'] = {}
+
+
+def _backtest(defs: list[OpGenDef], transient: bool) \
+        -> tuple[list[vfin_ops.TradingOpGen], pd.DataFrame]:
+    opgens = [d.create() for d in defs]
+    ops = []
+    transient_dis = []
+    for opgen in opgens:
+        ops += opgen.ops()
+        if transient and hasattr(opgen, 'transient_dis'):
+            transient_dis += opgen.transient_dis()
+    kwargs = dict(_ENGINE_KWARGS)
+    if transient_dis and 'transient' in inspect.signature(_ENGINE).parameters:
+        kwargs['transient'] = transient_dis
+    return opgens, _ENGINE(ops, _DFS, **kwargs).run()
+
+
+def _run_chunk(defs: list[OpGenDef], transient: bool) -> pd.DataFrame:
+    return _backtest(defs, transient)[1]
+
+
+def _score_chunk(defs: list[OpGenDef],
+                 transient: bool,
+                 score: typing.Callable) -> list[float]:
+    opgens, table = _backtest(defs, transient)
+    return [score(opgen, table) for opgen in opgens]
+
+
+def _executor(dfs: dict[str, pd.DataFrame],
+              workers: int,
+              engine: type) -> concurrent.futures.ProcessPoolExecutor:
+    if 'fork' in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context('fork')
+    else:
+        mp_context = None
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(dfs, engine))
+
+
+def final_total(opgen: vfin_ops.TradingOpGen, table: pd.DataFrame) -> float:
+    '''
+    Return the total of the last row, the default score.
+    '''
+    return float(opgen.total(table).iloc[-1])
+
+
+def chunks(items: list, n: int) -> list[list]:
+    '''
+    Split `items` into chunks of at most `n` items.
+    '''
+    return [items[i:i + n] for i in range(0, len(items), n)]
+
+
+def tables(defs: list[OpGenDef],
+           dfs: dict[str, pd.DataFrame],
+           workers: int = None,
+           chunk_size: int = None,
+           engine: type = backtest.vector.BacktestEngine,
+           transient: bool = False,
+           checkpoint: str = None,
+           result_cache: backtest.memo.ResultCache = None) \
+        -> dict[str, pd.DataFrame]:
+    '''
+    Run a backtest for every definition, split into chunks over a process pool.
+
+    Args:
+        defs: strategy definitions
+        dfs: input tables
+        workers: number of worker processes,
+                 if None - number of CPUs
+        chunk_size: number of strategies per backtest,
+                    if None - spread evenly, 4 chunks per worker
+        engine: backtest engine class
+        transient: do not store opgen.transient_dis() in the tables,
+                   if supported by the engine
+        checkpoint: directory where every finished chunk is saved,
+                    see backtest.checkpoint; strategies saved there
+                    by a previous run over the same data are not run again
+        result_cache: strategies cached there are not run again,
+                      results of the others are added to it
+
+    Returns:
+        result table of every strategy by name, in the order of `defs`,
+        strategies of a chunk share one table
+    '''
+    assert len({d.name for d in defs}) == len(defs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(defs) / (workers * 4)))
+
+    saved = None
+    done = set()
+    if checkpoint:
+        saved = backtest.checkpoint.Checkpoint(checkpoint)
+        done = saved.begin(defs, dfs)
+    todo = [d for d in defs if d.name not in done]
+
+    keys = {}
+    found = {}
+    if result_cache:
+        # tables without transient columns are cached separately
+        keys, found = result_cache.lookup(
+            todo, dfs, engine, variant='transient' if transient else '')
+        todo = [d for d in todo if d.name not in found]
+        if saved:
+            for name, table in found.items():
+                saved.add([name], table)
+
+    def_chunks = chunks(todo, chunk_size)
+    with _executor(dfs, workers, engine) as executor:
+        results = executor.map(_run_chunk,
+                               def_chunks,
+                               [transient] * len(def_chunks))
+        for chunk, table in zip(def_chunks, results):
+            for d in chunk:
+                if result_cache:
+                    result_cache.put(keys[d.name], d.create(), table)
+                if not saved:
+                    found[d.name] = table
+            if saved:
+                saved.add([d.name for d in chunk], table)
+    if saved:
+        return saved.tables()
+    return {d.name: found[d.name] for d in defs}
+
+
+def run(defs: list[OpGenDef],
+        dfs: dict[str, pd.DataFrame],
+        workers: int = None,
+        chunk_size: int = None,
+        engine: type = backtest.vector.BacktestEngine,
+        transient: bool = False,
+        checkpoint: str = None,
+        result_cache: backtest.memo.ResultCache = None) \
+        -> list[vstats.StrategyInfo]:
+    '''
+    Run a backtest for every definition, see tables().
+
+    Returns:
+        strategy infos in the order of `defs`
+    '''
+    results = tables(defs,
+                     dfs,
+                     workers=workers,
+                     chunk_size=chunk_size,
+                     engine=engine,
+                     transient=transient,
+                     checkpoint=checkpoint,
+                     result_cache=result_cache)
+    return [vstats.StrategyInfo(d.name, d.create(), results[d.name])
+            for d in defs]
+
+
+# pylint: disable=too-many-arguments
+def scores(defs: list[OpGenDef],
+           dfs: dict[str, pd.DataFrame],
+           score: typing.Callable = final_total,
+           workers: int = None,
+           chunk_size: int = None,
+           engine: type = backtest.vector.BacktestEngine) -> list[float]:
+    '''
+    Run a backtest for every definition over a process pool
+    and return only scores, tables are not sent back from the workers.
+
+    Args:
+        defs: strategy definitions
+        dfs: input tables
+        score: picklable function of (opgen, table), higher is better
+        workers: number of worker processes,
+                 if None - number of CPUs
+        chunk_size: number of strategies per backtest,
+                    if None - spread evenly, 4 chunks per worker
+        engine: backtest engine class
+
+    Returns:
+        scores in the order of `defs`
+    '''
+    assert len({d.name for d in defs}) == len(defs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(defs) / (workers * 4)))
+    def_chunks = chunks(defs, chunk_size)
+    ret = []
+    with _executor(dfs, workers, engine) as executor:
+        for s in executor.map(_score_chunk,
+                              def_chunks,
+                              [True] * len(def_chunks),
+                              [score] * len(def_chunks)):
+            ret += s
+    return ret
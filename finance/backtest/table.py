@@ -0,0 +1,84 @@
+'''
+Preallocated result table.
+
+One contiguous array per column is allocated once, sized from the input
+index and the DataInfos of the op list, ops write into it by integer
+column offset and row. A pandas.DataFrame view is made only at the end.
+
+Every column keeps one leading row before the first table row, holding
+the DataInfo first_value.
+Scratch columns have only 2 rows: the previous and the current row.
+'''
+import numpy as np
+import pandas as pd
+import vtable
+
+
+def first_value(di: vtable.DataInfo):
+    '''
+    Return the value of `di` before the first row, NaN if not set.
+    '''
+    return np.nan if di.first_value is None else di.first_value
+
+
+def dtype(di: vtable.DataInfo) -> type:
+    '''
+    Return the column dtype of `di`:
+    bool if the first value is bool, otherwise float64.
+    '''
+    if isinstance(di.first_value, (bool, np.bool_)):
+        return np.bool_
+    return np.float64
+
+
+class ResultTable:
+    '''
+    Table of preallocated NumPy columns.
+
+    Args:
+        index: table index
+        dis: DataInfos, column offset is the position in the list
+        scratch: offsets of columns holding only 2 rows
+        rows: rows of other columns including the leading row,
+              if None - len(index) + 1
+    '''
+    def __init__(self,
+                 index: pd.Index,
+                 dis: list[vtable.DataInfo],
+                 scratch: set[int] = None,
+                 rows: int = None):
+        self.index = index
+        self.dis = dis
+        self.columns = []
+        if rows is None:
+            rows = len(index) + 1
+        for s, di in enumerate(dis):
+            self.columns.append(np.full(2 if scratch and s in scratch
+                                        else rows,
+                                        first_value(di),
+                                        dtype=dtype(di)))
+
+    @property
+    def nbytes(self) -> int:
+        '''
+        Allocated bytes.
+        '''
+        return sum(c.nbytes for c in self.columns)
+
+    def write(self, offset: int, values: np.ndarray):
+        '''
+        Write all rows of the column at `offset`.
+        '''
+        self.columns[offset][1:] = values
+
+    def frame(self, offsets: dict[str, int]) -> pd.DataFrame:
+        '''
+        Return a DataFrame view of the table rows.
+
+        Args:
+            offsets: column offset by column name
+        '''
+        return pd.DataFrame({name: self.columns[s][1:]
+                             for name, s in offsets.items()},
+                            index=self.index,
+                            copy=False)
@@ -0,0 +1,275 @@
+'''
+Backtests over a universe of tickers.
+
+Close prices of all tickers are aligned to one calendar and stored
+as one (ticker x bar) matrix in shared memory, a row per ticker,
+so every ticker is a contiguous array. Worker processes attach to the
+matrix without copying it and backtest chunks of tickers in parallel.
+A ticker without gaps in the calendar is backtested over a view of its
+row. A ticker with gaps, e.g. other holidays than the other tickers,
+is backtested over a copy of its bars only.
+
+Strategies are given as templates, instantiated for every ticker.
+Totals of all strategies and tickers are written by the workers into
+one shared (strategy x ticker x bar) array.
+'''
+import concurrent.futures
+import datetime
+import inspect
+import math
+import os
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import vfin
+import vfin_ops
+import vtable
+import backtest.program
+import backtest.store
+import backtest.sweep
+
+
+class Template:
+    '''
+    Strategy instantiated for every ticker.
+
+    Args:
+        name: strategy name, ticker name is appended
+        cls: operation generator class, must accept `name` and `price_info`
+        kwargs: other init arguments
+        slippage: price slippage in percents
+        col: price column
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 name: str,
+                 cls: type,
+                 kwargs: dict,
+                 slippage: float = 0.5,
+                 col: str = 'Close'):
+        self.name = name
+        self.cls = cls
+        self.kwargs = kwargs
+        self.slippage = slippage
+        self.col = col
+
+    def create(self, ticker: str) -> vfin_ops.TradingOpGen:
+        '''
+        Create the operation generator for `ticker`.
+        '''
+        price_info = vfin.InstrumentInfo(
+            ticker_name=ticker,
+            di={'close': vtable.DataInfo(ticker, self.col)},
+            slippage=self.slippage)
+        return self.cls(name=f'{self.name} {ticker}',
+                        price_info=price_info,
+                        **self.kwargs)
+
+
+def align(dfs: dict[str, pd.DataFrame],
+          col: str = 'Close') -> tuple[pd.DatetimeIndex, list[str], np.ndarray]:
+    '''
+    Align `col` of all tables to the union of their indexes.
+
+    Returns:
+        calendar,
+        tickers,
+        (ticker x bar) float64 matrix, NaN where a ticker has no bar
+    '''
+    tickers = list(dfs)
+    index = None
+    for df in dfs.values():
+        index = df.index if index is None else index.union(df.index)
+    matrix = np.full((len(tickers), len(index)), np.nan)
+    for i, t in enumerate(tickers):
+        matrix[i, index.get_indexer(dfs[t].index)] = \
+            dfs[t][col].to_numpy(dtype=np.float64)
+    return index, tickers, matrix
+
+
+def fetch(tickers: list[str],
+          start: datetime.datetime,
+          end: datetime.datetime,
+          store: backtest.store.PriceStore = None) -> dict[str, pd.DataFrame]:
+    '''
+    Fetch all `tickers` through the price store.
+    '''
+    return {t: backtest.store.fetch_ticker(t, start=start, end=end,
+                                           store=store)
+            for t in tickers}
+
+
+def _shared(shape: tuple, name: str = None) \
+        -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    if name is None:
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(1, math.prod(shape) * 8))
+    else:
+        try:
+            # attached, the creating process unlinks it
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+class Result:
+    '''
+    Totals of all strategies over all tickers.
+
+    Args:
+        names: strategy template names
+        tickers: ticker names
+        index: calendar
+        totals: (strategy x ticker x bar) totals,
+                NaN where a ticker has no bar
+    '''
+    def __init__(self,
+                 names: list[str],
+                 tickers: list[str],
+                 index: pd.DatetimeIndex,
+                 totals: np.ndarray):
+        self.names = names
+        self.tickers = tickers
+        self.index = index
+        self.totals = totals
+
+    def total(self, name: str, ticker: str) -> pd.Series:
+        '''
+        Return totals of strategy `name` over `ticker`.
+        '''
+        return pd.Series(self.totals[self.names.index(name),
+                                     self.tickers.index(ticker)],
+                         index=self.index,
+                         name=f'{name} {ticker}')
+
+    def final(self) -> pd.DataFrame:
+        '''
+        Return the last total of every strategy (row) and ticker (column).
+        '''
+        ret = np.full(self.totals.shape[:2], np.nan)
+        for i in range(len(self.tickers)):
+            valid = np.flatnonzero(~np.isnan(self.totals[0, i]))
+            if len(valid):
+                ret[:, i] = self.totals[:, i, valid[-1]]
+        return pd.DataFrame(ret, index=self.names, columns=self.tickers)
+
+
+# per-process state, set by _init_worker()
+_STATE = {}
+
+
+# pylint: disable=too-many-arguments
+def _init_worker(prices_name: str,
+                 totals_name: str,
+                 index: pd.DatetimeIndex,
+                 tickers: list[str],
+                 templates: list[Template],
+                 engine: type):
+    shape = (len(tickers), len(index))
+    prices_shm, prices = _shared(shape, prices_name)
+    totals_shm, totals = _shared((len(templates),) + shape, totals_name)
+    _STATE.update(shm=(prices_shm, totals_shm),
+                  prices=prices,
+                  totals=totals,
+                  index=index,
+                  tickers=tickers,
+                  templates=templates,
+                  engine=engine)
+
+
+def _run_tickers(ids: list[int]) -> int:
+    s = _STATE
+    engine = s['engine']
+    for i in ids:
+        ticker = s['tickers'][i]
+        rows = np.flatnonzero(~np.isnan(s['prices'][i]))
+        if not len(rows):
+            continue
+        if rows[-1] - rows[0] + 1 == len(rows):
+            # contiguous, a view of the shared matrix
+            rows = slice(rows[0], rows[-1] + 1)
+        # otherwise the bars of the ticker are copied, NaN gaps
+        # of the union calendar are not bars of the ticker
+        opgens = [t.create(ticker) for t in s['templates']]
+        cols = {t.col for t in s['templates']}
+        dfs = {ticker: pd.DataFrame({c: s['prices'][i][rows] for c in cols},
+                                    index=s['index'][rows],
+                                    copy=False)}
+        ops = []
+        transient = []
+        for opgen in opgens:
+            ops += opgen.ops()
+            if hasattr(opgen, 'transient_dis'):
+                transient += opgen.transient_dis()
+        if 'transient' in inspect.signature(engine).parameters:
+            table = engine(ops, dfs, transient=transient).run()
+        else:
+            table = engine(ops, dfs).run()
+        for j, opgen in enumerate(opgens):
+            s['totals'][j, i, rows] = opgen.total(table).to_numpy()
+    return len(ids)
+
+
+def run(templates: list[Template],
+        dfs: dict[str, pd.DataFrame],
+        workers: int = None,
+        chunk_size: int = None,
+        engine: type = backtest.program.BacktestEngine) -> Result:
+    '''
+    Backtest every template over every ticker, tickers in parallel.
+
+    All templates must use the same price column of one ticker
+    per table, e.g. 'Close'.
+
+    Args:
+        templates: strategies
+        dfs: price table of every ticker
+        workers: number of worker processes,
+                 if None - number of CPUs
+        chunk_size: tickers per task,
+                    if None - spread evenly, 4 chunks per worker
+        engine: backtest engine class
+
+    Returns:
+        totals of all strategies and tickers
+    '''
+    assert len({t.col for t in templates}) == 1
+    assert len({t.name for t in templates}) == len(templates)
+    index, tickers, matrix = align(dfs, templates[0].col)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(tickers) / (workers * 4)))
+
+    shape = (len(tickers), len(index))
+    prices_shm, prices = _shared(shape)
+    totals_shm, totals = _shared((len(templates),) + shape)
+    try:
+        prices[:] = matrix
+        del matrix
+        totals[:] = np.nan
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(prices_shm.name,
+                          totals_shm.name,
+                          index,
+                          tickers,
+                          templates,
+                          engine)) as executor:
+            for _ in executor.map(_run_tickers,
+                                  backtest.sweep.chunks(
+                                      list(range(len(tickers))),
+                                      chunk_size)):
+                pass
+        return Result([t.name for t in templates],
+                      tickers,
+                      index,
+                      totals.copy())
+    finally:
+        del prices, totals
+        prices_shm.close()
+        prices_shm.unlink()
+        totals_shm.close()
+        totals_shm.unlink()
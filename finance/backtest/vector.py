@@ -0,0 +1,257 @@
+'''
+Vector operations.
+
+Operations that do not depend on strategy state are calculated once
+over whole columns, before the sequential loop of the backtest engine.
+'''
+import functools
+import inspect
+import typing
+import numpy as np
+import pandas as pd
+import vfin
+import vfin_ops
+import vtable
+
+
+class Call(vfin_ops.Call):
+    '''
+    Call that can also be calculated over whole columns at once.
+
+    In vfin.BacktestEngine behaves as vfin_ops.Call.
+    In backtest.vector.BacktestEngine `vector_function` is called once
+    with whole columns instead, and the result is passed to the
+    sequential loop as an input column.
+
+    Args:
+        function: function called for every row with the history
+        vector_function: function called once with whole columns,
+                         returns an array of the same length
+        kwargs: function arguments, DataInfo or constants
+        ret: DataInfo for the result
+    '''
+    def __init__(self,
+                 function: typing.Callable,
+                 vector_function: typing.Callable,
+                 kwargs: dict,
+                 ret: vtable.DataInfo):
+        vfin_ops.Call.__init__(self,
+                               function=function,
+                               kwargs=kwargs,
+                               ret=ret)
+        self.vector_function = vector_function
+        self.vector_kwargs = kwargs
+        self.vector_ret = ret
+
+
+class Group:
+    '''
+    Ops calculating one column that can also be calculated at once
+    from the input tables, e.g. an alarm signal from the table index.
+
+    In vfin.BacktestEngine the ops run as they are.
+    In backtest.vector.BacktestEngine all ops of the group are replaced
+    by one call of `vector_function`, so the ops must not write
+    DataInfos other than `ret` that are read by other ops.
+
+    Args:
+        vector_function: function of the input tables, returns an array
+                         of the length of the first table
+        ret: DataInfo for the result
+        key: equal keys calculate equal columns over equal tables,
+             None if results are not shared
+    '''
+    def __init__(self,
+                 vector_function: typing.Callable,
+                 ret: vtable.DataInfo,
+                 key: typing.Hashable = None):
+        self.vector_function = vector_function
+        self.ret = ret
+        self.key = key
+
+
+def group(ops: list[vfin.Operation], g: Group) -> list[vfin.Operation]:
+    '''
+    Mark `ops` as the ops of group `g`.
+
+    Returns:
+        `ops`
+    '''
+    for op in ops:
+        op.vector_group = g
+    return ops
+
+
+def column(dfs: dict[str, pd.DataFrame],
+           di: vtable.DataInfo) -> typing.Optional[pd.Series]:
+    '''
+    Return the input column described by `di` or None if not in `dfs`.
+    '''
+    df = dfs.get(di.key)
+    if df is None or di.col not in df:
+        return None
+    return df[di.col]
+
+
+def cache_key(op: Call,
+              sources: dict[str, typing.Optional[tuple]] = None) \
+        -> typing.Optional[tuple]:
+    '''
+    Return the key of the vector op result:
+    (source keys, function, params).
+
+    Input table columns are keyed by their DataInfo name, columns
+    calculated by other vector ops by the key of the op calculating them,
+    so equal names calculated with other params have other keys.
+    Ops with equal keys calculate equal columns.
+    Returns None if the op can not be keyed.
+
+    Args:
+        op: vector op
+        sources: keys of calculated columns by DataInfo name,
+                 None for columns that can not be keyed
+    '''
+    sources = sources or {}
+    # e.g. instrumented by backtest.profile
+    function = inspect.unwrap(op.vector_function)
+    params = ()
+    if isinstance(function, functools.partial):
+        params = (function.args, tuple(sorted(function.keywords.items())))
+        function = function.func
+    srcs = []
+    for k, v in sorted(op.vector_kwargs.items()):
+        if not isinstance(v, vtable.DataInfo):
+            srcs.append((k, v))
+        elif v.name in sources:
+            if sources[v.name] is None:
+                return None
+            srcs.append((k, sources[v.name]))
+        else:
+            srcs.append((k, ('input', v.name)))
+    key = (tuple(srcs), function, params)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def prepare(ops: list[vfin.Operation],
+            dfs: dict[str, pd.DataFrame],
+            cache: dict = None,
+            sequential: set[str] = None) \
+        -> tuple[list[vfin.Operation], dict[str, pd.DataFrame]]:
+    '''
+    Calculate vector ops over whole columns.
+
+    A vector op is calculated only if all its inputs are input columns
+    or results of previous vector ops, otherwise it is kept
+    in the sequential ops.
+
+    Results are cached by cache_key(), so an indicator requested
+    by many strategies is calculated once, whatever the strategies
+    name their columns.
+
+    Ops of a Group are replaced by one call of its vector function.
+
+    Args:
+        ops: all ops
+        dfs: input tables
+        cache: results shared between calls of prepare(),
+               must only be shared for the same `dfs`
+        sequential: names of DataInfos that are not calculated
+                    over whole columns, their ops and the vector ops
+                    reading them are kept in the sequential ops,
+                    e.g. transient DataInfos, see backtest.program
+
+    Returns:
+        sequential ops,
+        `dfs` extended with the calculated columns
+    '''
+    if cache is None:
+        cache = {}
+    dfs = dict(dfs)
+    # tables that are already copied from the input `dfs`
+    copied = set()
+    seq_ops = []
+
+    def write(ret, values, index):
+        assert len(values) == len(index)
+        if ret.key not in dfs:
+            dfs[ret.key] = pd.DataFrame(index=index)
+        elif ret.key not in copied:
+            dfs[ret.key] = dfs[ret.key].copy()
+        copied.add(ret.key)
+        dfs[ret.key][ret.col] = values
+
+    # groups that are already calculated
+    groups = set()
+    # cache keys of calculated columns by DataInfo name
+    sources = {}
+    for op in ops:
+        g = getattr(op, 'vector_group', None)
+        if g is not None and dfs:
+            if id(g) not in groups:
+                groups.add(id(g))
+                key = None if g.key is None else ('group', g.key)
+                if key is not None and key in cache:
+                    values = cache[key]
+                else:
+                    values = np.asarray(g.vector_function(dfs))
+                    if key is not None:
+                        cache[key] = values
+                sources[g.ret.name] = key
+                write(g.ret, values, next(iter(dfs.values())).index)
+            continue
+        if not isinstance(op, Call) \
+                or sequential and op.vector_ret.name in sequential:
+            seq_ops.append(op)
+            continue
+        kwargs = {}
+        index = None
+        for k, v in op.vector_kwargs.items():
+            if not isinstance(v, vtable.DataInfo):
+                kwargs[k] = v
+                continue
+            col = column(dfs, v)
+            if col is None:
+                break
+            if index is None:
+                index = col.index
+            kwargs[k] = col.to_numpy()
+        else:
+            key = cache_key(op, sources)
+            if key is not None and key in cache:
+                values = cache[key]
+            else:
+                values = np.asarray(op.vector_function(**kwargs))
+                if key is not None:
+                    cache[key] = values
+            assert index is not None
+            sources[op.vector_ret.name] = key
+            write(op.vector_ret, values, index)
+            continue
+        seq_ops.append(op)
+    return seq_ops, dfs
+
+
+# pylint: disable=too-few-public-methods
+class BacktestEngine(vfin.BacktestEngine):
+    '''
+    Backtest engine that runs vector ops first over all data at once,
+    and the remaining sequential ops after.
+
+    Args:
+        ops: all ops
+        dfs: input tables
+        cache: vector op results, see prepare()
+    '''
+    def __init__(self,
+                 ops: list[vfin.Operation],
+                 dfs: dict[str, pd.DataFrame],
+                 cache: dict = None):
+        if cache is None:
+            cache = {}
+        self.cache = cache
+        seq_ops, dfs = prepare(ops, dfs, cache)
+        vfin.BacktestEngine.__init__(self, ops=seq_ops, dfs=dfs)
@@ -0,0 +1,273 @@
+'''
+Walk-forward evaluation.
+
+The timeline is split into folds, every fold is a train window followed
+by a test window. Strategies are backtested on every test window,
+either as given or with params optimized on the train window.
+
+Indicators are warm at the start of every test window: vector ops, see
+backtest.vector, are calculated once over the whole history and shared
+by all folds, so only the sequential ops are run per fold.
+Folds do not depend on each other and run in parallel.
+'''
+import concurrent.futures
+import multiprocessing
+import os
+import typing
+import pandas as pd
+import vstats
+import backtest.optimize
+import backtest.program
+import backtest.sweep
+import backtest.vector
+
+
+class Split:
+    '''
+    Train and test window of one fold, rows in [start, stop).
+    '''
+    def __init__(self,
+                 train_start: int,
+                 train_stop: int,
+                 test_start: int,
+                 test_stop: int):
+        self.train_start = train_start
+        self.train_stop = train_stop
+        self.test_start = test_start
+        self.test_stop = test_stop
+
+    def __repr__(self) -> str:
+        return (f'Split(train=[{self.train_start}, {self.train_stop}), '
+                f'test=[{self.test_start}, {self.test_stop}))')
+
+
+class Fold:
+    '''
+    Results of one fold.
+
+    Args:
+        split: fold windows
+        index: index of the test window
+        defs: strategies run on the test window
+        table: test window results
+        scores: score of every strategy by name
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 split: Split,
+                 index: pd.Index,
+                 defs: list[backtest.sweep.OpGenDef],
+                 table: pd.DataFrame,
+                 scores: dict[str, float]):
+        self.split = split
+        self.index = index
+        self.defs = defs
+        self.table = table
+        self.scores = scores
+
+    def strategy_infos(self) -> list[vstats.StrategyInfo]:
+        '''
+        Return strategy infos of the test window,
+        e.g. for vstats.print_results().
+        '''
+        return [vstats.StrategyInfo(d.name, d.create(), self.table)
+                for d in self.defs]
+
+
+def splits(n: int,
+           n_folds: int,
+           train_size: int,
+           anchored: bool = False) -> list[Split]:
+    '''
+    Split `n` rows into `n_folds` consecutive test windows
+    following the first `train_size` rows.
+
+    Args:
+        n: number of rows
+        n_folds: number of folds
+        train_size: rows of the train window
+        anchored: train windows start at the first row and grow,
+                  otherwise they roll with `train_size` rows
+    '''
+    assert 0 < train_size < n
+    test_size = (n - train_size) // n_folds
+    assert test_size > 0
+    ret = []
+    for k in range(n_folds):
+        test_start = train_size + k * test_size
+        test_stop = n if k == n_folds - 1 else test_start + test_size
+        train_start = 0 if anchored else test_start - train_size
+        ret.append(Split(train_start, test_start, test_start, test_stop))
+    return ret
+
+
+def _rows(dfs: dict[str, pd.DataFrame],
+          index: pd.Index,
+          start: int,
+          stop: int) -> dict[str, pd.DataFrame]:
+    # rows of all tables in the time range of index[start:stop]
+    first = index[start]
+    last = index[stop - 1]
+    return {k: df[(df.index >= first) & (df.index <= last)]
+            for k, df in dfs.items()}
+
+
+# per-process state, set by _init_worker()
+_DFS = None
+_CACHE = None
+_ENGINE = None
+
+
+def _init_worker(dfs: dict[str, pd.DataFrame], cache: dict, engine: type):
+    # pylint: disable=global-statement
+    global _DFS, _CACHE, _ENGINE
+    _DFS = dfs
+    _CACHE = cache
+    _ENGINE = engine
+
+
+def _run_fold(defs: list[backtest.sweep.OpGenDef],
+              index: pd.Index,
+              split: Split,
+              score: typing.Callable) -> tuple[pd.DataFrame, list[float]]:
+    opgens = [d.create() for d in defs]
+    ops = []
+    for opgen in opgens:
+        ops += opgen.ops()
+    # vector op results are taken from the shared cache
+    seq_ops, dfs = backtest.vector.prepare(ops, _DFS, _CACHE)
+    dfs = _rows(dfs, index, split.test_start, split.test_stop)
+    table = _ENGINE(seq_ops, dfs).run()
+    return table, [score(opgen, table) for opgen in opgens]
+
+
+class WalkForward:
+    '''
+    Walk-forward runner.
+
+    Args:
+        dfs: input tables
+        splits: fold windows, rows of `index`, see splits()
+        index: timeline of the folds,
+               if None - index of the first table
+        workers: number of worker processes,
+                 if None - number of CPUs
+        engine: engine running the sequential ops of every fold
+        score: picklable function of (opgen, table), higher is better
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 dfs: dict[str, pd.DataFrame],
+                 splits: list[Split],
+                 index: pd.Index = None,
+                 workers: int = None,
+                 engine: type = backtest.program.BacktestEngine,
+                 score: typing.Callable = backtest.sweep.final_total):
+        self.dfs = dfs
+        self.splits = splits
+        self.index = index if index is not None \
+            else next(iter(dfs.values())).index
+        self.workers = workers or os.cpu_count() or 1
+        self.engine = engine
+        self.score = score
+
+    def _warm(self, defs: list[backtest.sweep.OpGenDef]) -> dict:
+        # calculate vector ops of all strategies once over the whole history
+        cache = {}
+        ops = []
+        for d in defs:
+            ops += d.create().ops()
+        backtest.vector.prepare(ops, self.dfs, cache)
+        return cache
+
+    def run(self, fold_defs: list[list[backtest.sweep.OpGenDef]]) \
+            -> list[Fold]:
+        '''
+        Backtest strategies on the test window of every fold, in parallel.
+
+        Args:
+            fold_defs: strategies of every fold,
+                       names must be unique within a fold
+
+        Returns:
+            results in the order of splits
+        '''
+        assert len(fold_defs) == len(self.splits)
+        cache = self._warm([d for defs in fold_defs for d in defs])
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        else:
+            mp_context = None
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(self.workers, len(self.splits)),
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(self.dfs, cache, self.engine)) as executor:
+            results = executor.map(_run_fold,
+                                   fold_defs,
+                                   [self.index] * len(self.splits),
+                                   self.splits,
+                                   [self.score] * len(self.splits))
+            folds = []
+            for split, defs, (table, scores) in zip(self.splits,
+                                                    fold_defs,
+                                                    results):
+                folds.append(Fold(split,
+                                  self.index[split.test_start:
+                                             split.test_stop],
+                                  defs,
+                                  table,
+                                  {d.name: s for d, s in zip(defs, scores)}))
+        return folds
+
+    def evaluate(self, defs: list[backtest.sweep.OpGenDef]) -> list[Fold]:
+        '''
+        Backtest the same strategies on every test window.
+        '''
+        return self.run([defs] * len(self.splits))
+
+    def optimize(self,
+                 name: str,
+                 cls: type,
+                 kwargs: dict,
+                 space: dict[str, list],
+                 method: str = 'successive_halving',
+                 valid: typing.Callable[[dict], bool] = None,
+                 **method_kwargs) -> list[Fold]:
+        '''
+        Optimize params on the train window of every fold,
+        then backtest the best params on the test window.
+
+        Args:
+            name: strategy name in the results
+            cls: operation generator class, accepting `name` and `params`
+            kwargs: other init arguments
+            space: values of every param
+            method: backtest.optimize.Optimizer method name
+            valid: see backtest.optimize.Optimizer
+            method_kwargs: method arguments, e.g. `n`
+
+        Returns:
+            results in the order of splits,
+            best params of a fold are in `fold.defs[0].kwargs['params']`,
+            the strategy of fold `i` is named f'{name} fold {i}'
+        '''
+        fold_defs = []
+        for i, split in enumerate(self.splits):
+            optimizer = backtest.optimize.Optimizer(
+                cls,
+                kwargs,
+                _rows(self.dfs, self.index, split.train_start,
+                      split.train_stop),
+                space,
+                valid=valid,
+                score=self.score,
+                workers=self.workers,
+                engine=self.engine)
+            result = getattr(optimizer, method)(**method_kwargs)
+            # params differ by fold, so do the names of their columns
+            fold_defs.append([backtest.sweep.OpGenDef(
+                name=f'{name} fold {i}',
+                cls=cls,
+                kwargs=dict(kwargs, params=result.best_params))])
+        return self.run(fold_defs)
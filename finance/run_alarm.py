@@ -5,11 +5,12 @@ import datetime
 import vfin
 import vfin_ops
 import vtime
+import backtest.store
 
 dfs = {
-    '^SPX': vfin.fetch_ticker('^SPX',
-                              start=datetime.datetime(2020, 1, 1),
-                              end=datetime.datetime(2023, 11, 1))
+    '^SPX': backtest.store.fetch_ticker('^SPX',
+                                        start=datetime.datetime(2020, 1, 1),
+                                        end=datetime.datetime(2023, 11, 1))
 }
 
 alarm_opgen = vfin_ops.AlarmOpGen(vtime.Alarm('monthly'))
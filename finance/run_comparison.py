@@ -2,10 +2,18 @@
 Experiment for testing money saving.
 '''
 import datetime
+import os
 import vfin
 import vstats
 import vtime
 import vtable
+import backtest.memo
+import backtest.plot
+import backtest.profile
+import backtest.store
+import backtest.sweep
+import backtest.vector
+import strategies.indicators
 import strategies.saving
 import strategies.money_avg
 import strategies.sma_cross
@@ -16,85 +24,88 @@ instrument = vfin.InstrumentInfo(
     slippage=0.5)
 
 dfs = {
-    '^SPX': vfin.fetch_ticker('^SPX',
-                              start=datetime.datetime(1960, 1, 1),
-                              end=datetime.datetime(2023, 11, 1))
+    '^SPX': backtest.store.fetch_ticker('^SPX',
+                                        start=datetime.datetime(1960, 1, 1),
+                                        end=datetime.datetime(2023, 11, 1))
 }
 monthly_alarm = vtime.Alarm('monthly')
+indicator_cache = strategies.indicators.IndicatorCache()
 
-saving_opgen = strategies.saving.SavingOpGen(
-    initial_cash=1000,
-    add_cash=100,
-    add_cash_alarm=monthly_alarm)
+sma_params = {'sma_cross': {'long entry slow sma': 200,
+                            'long entry fast sma': 50,
+                            'long exit slow sma': 200,
+                            'long exit fast sma': 50,
+                            'short entry slow sma': 200,
+                            'short entry fast sma': 50,
+                            'short exit slow sma': 200,
+                            'short exit fast sma': 50},
+              'sma_cross_long': {'long entry slow sma': 200,
+                                 'long entry fast sma': 50,
+                                 'long exit slow sma': 200,
+                                 'long exit fast sma': 50},
+              'sma_cross_short': {'short entry slow sma': 200,
+                                  'short entry fast sma': 50,
+                                  'short exit slow sma': 200,
+                                  'short exit fast sma': 50}}
 
-money_avg_opgen = strategies.money_avg.MoneyAvgOpGen(
-    price_info=instrument,
-    initial_cash=1000,
-    add_cash=100,
-    add_cash_alarm=monthly_alarm)
+defs = [
+    backtest.sweep.OpGenDef(
+        name='saving',
+        cls=strategies.saving.SavingOpGen,
+        kwargs={'initial_cash': 1000,
+                'add_cash': 100,
+                'add_cash_alarm': monthly_alarm}),
+    backtest.sweep.OpGenDef(
+        name='money_avg',
+        cls=strategies.money_avg.MoneyAvgOpGen,
+        kwargs={'price_info': instrument,
+                'initial_cash': 1000,
+                'add_cash': 100,
+                'add_cash_alarm': monthly_alarm}),
+] + [
+    backtest.sweep.OpGenDef(
+        name=name,
+        cls=strategies.sma_cross.SmaCrossOpGen,
+        kwargs={'price_info': instrument,
+                'initial_cash': 1000,
+                'add_cash': 100,
+                'add_cash_alarm': monthly_alarm,
+                'indicator_cache': indicator_cache,
+                'params': params}) for name, params in sma_params.items()
+]
 
-sma_cross_opgen = strategies.sma_cross.SmaCrossOpGen(
-    price_info=instrument,
-    initial_cash=1000,
-    add_cash=100,
-    add_cash_alarm=monthly_alarm,
-    params={'long entry slow sma': 200,
-            'long entry fast sma': 50,
-            'long exit slow sma': 200,
-            'long exit fast sma': 50,
-            'short entry slow sma': 200,
-            'short entry fast sma': 50,
-            'short exit slow sma': 200,
-            'short exit fast sma': 50})
+# set PROFILE=1 to print the hot-op report,
+# otherwise strategies simulated before are loaded from the result cache
+if os.environ.get('PROFILE'):
+    profiler = backtest.profile.Profiler()
+    opgens = [d.create() for d in defs]
+    ops = []
+    for opgen in opgens:
+        ops += profiler.ops(opgen)
+    with profiler.run():
+        big_table = backtest.vector.BacktestEngine(ops, dfs).run()
+    print(profiler.report())
+    profiler.to_json('test_profile.json')
+    profiler.plot('test_profile.html')
+    results = [(opgen, big_table) for opgen in opgens]
+else:
+    results = backtest.memo.run(defs, dfs)
 
-sma_cross_long_opgen = strategies.sma_cross.SmaCrossOpGen(
-    price_info=instrument,
-    initial_cash=1000,
-    add_cash=100,
-    add_cash_alarm=monthly_alarm,
-    params={'long entry slow sma': 200,
-            'long entry fast sma': 50,
-            'long exit slow sma': 200,
-            'long exit fast sma': 50})
+sis = [vstats.StrategyInfo(d.name, opgen, table)
+       for d, (opgen, table) in zip(defs, results)]
+vstats.print_results(sis)
+# plots are drawn from downsampled tables
+vstats.plot_results([vstats.StrategyInfo(d.name,
+                                         opgen,
+                                         backtest.plot.debug_table(opgen,
+                                                                   table))
+                     for d, (opgen, table) in zip(defs, results)],
+                    'test_comparison.html')
 
-sma_cross_short_opgen = strategies.sma_cross.SmaCrossOpGen(
-    price_info=instrument,
-    initial_cash=1000,
-    add_cash=100,
-    add_cash_alarm=monthly_alarm,
-    params={'short entry slow sma': 200,
-            'short entry fast sma': 50,
-            'short exit slow sma': 200,
-            'short exit fast sma': 50})
-
-big_table = vfin.BacktestEngine(
-    saving_opgen.ops() +
-    money_avg_opgen.ops() +
-    sma_cross_opgen.ops() +
-    sma_cross_long_opgen.ops() +
-    sma_cross_short_opgen.ops(),
-    dfs
-).run()
-
-vstats.print_results([
-    vstats.StrategyInfo('saving', saving_opgen, big_table),
-    vstats.StrategyInfo('money_avg', money_avg_opgen, big_table),
-    vstats.StrategyInfo('sma_cross', sma_cross_opgen, big_table),
-    vstats.StrategyInfo('sma_cross_long', sma_cross_long_opgen, big_table),
-    vstats.StrategyInfo('sma_cross_short', sma_cross_short_opgen, big_table),
-    ])
-
-vstats.plot_results([
-    vstats.StrategyInfo('saving', saving_opgen, big_table),
-    vstats.StrategyInfo('money_avg', money_avg_opgen, big_table),
-    vstats.StrategyInfo('sma_cross', sma_cross_opgen, big_table),
-    vstats.StrategyInfo('sma_cross_long', sma_cross_long_opgen, big_table),
-    vstats.StrategyInfo('sma_cross_short', sma_cross_short_opgen, big_table),
-    ], 'test_comparison.html')
-
-# debug
-saving_opgen.debug_plot(big_table, 'test_saving.html')
-money_avg_opgen.debug_plot(big_table, 'test_money_avg.html')
-sma_cross_opgen.debug_plot(big_table, 'test_sma_cross.html')
-sma_cross_long_opgen.debug_plot(big_table, 'test_sma_cross_long.html')
-sma_cross_short_opgen.debug_plot(big_table, 'test_sma_cross_short.html')
+# debug, set DEBUG_PLOTS to comma-separated strategy names
+# to draw only them
+debug = os.environ.get('DEBUG_PLOTS')
+debug = debug.split(',') if debug else [d.name for d in defs]
+backtest.plot.debug_plots({f'test_{d.name}.html': (opgen, table)
+                           for d, (opgen, table) in zip(defs, results)
+                           if d.name in debug})
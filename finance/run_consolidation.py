@@ -0,0 +1,71 @@
+'''
+Experiment for trading SMA crosses at decision points.
+'''
+import datetime
+import vfin
+import vlog
+import vparams
+import vtable
+import vtime
+import backtest.memo
+import backtest.program
+import backtest.stats
+import backtest.store
+import backtest.surface
+import backtest.sweep
+import strategies.consolidation
+import strategies.indicators
+
+
+vlog.configure('info')
+
+dfs = {
+    '^SPX': backtest.store.fetch_ticker('^SPX',
+                                        start=datetime.datetime(1960, 1, 1),
+                                        end=datetime.datetime(2023, 11, 1))
+}
+instrument = vfin.InstrumentInfo(ticker_name='^SPX',
+                                 di={'close': vtable.DataInfo('^SPX', 'Close')},
+                                 slippage=0.5)
+monthly_alarm = vtime.Alarm('monthly')
+indicator_cache = strategies.indicators.IndicatorCache()
+
+# consolidation thresholds together with the SMA periods,
+# a period of 0 is the plain SMA cross for comparison
+params = [p for p in vparams.cortesian_product({
+              'long entry fast sma': [20, 50],
+              'long entry slow sma': [100, 200],
+              'long exit fast sma': [20, 50],
+              'long exit slow sma': [100, 200],
+              'consolidation period': [0, 10, 20, 40],
+              'consolidation width bp': [200, 400, 800]})
+          if p['consolidation period'] or p['consolidation width bp'] == 200]
+defs = [backtest.sweep.OpGenDef(
+            name=f'consolidation({tuple(p.values())})',
+            cls=strategies.consolidation.ConsolidationOpGen,
+            kwargs={'price_info': instrument,
+                    'initial_cash': 1000,
+                    'add_cash': 100,
+                    'add_cash_alarm': monthly_alarm,
+                    'params': p,
+                    'indicator_cache': indicator_cache}) for p in params]
+
+tables = backtest.sweep.tables(defs,
+                               dfs,
+                               engine=backtest.program.BacktestEngine,
+                               transient=True,
+                               result_cache=backtest.memo.default_cache())
+stats = backtest.stats.from_tables(
+    {d.name: d.create() for d in defs},
+    tables)
+print(backtest.stats.top(stats, k=10, by='sharpe').to_string())
+
+surface = backtest.surface.grid(backtest.surface.params_table(defs),
+                                stats['sharpe'],
+                                axes=['consolidation period',
+                                      'consolidation width bp'],
+                                agg='max')
+print(surface.frame().to_string())
+backtest.surface.to_file(surface,
+                         'test_consolidation_surface.html',
+                         name='sharpe')
@@ -0,0 +1,51 @@
+'''
+Experiment for probability heatmaps of price moves after SMA crosses.
+'''
+import datetime
+import numpy as np
+import vfin
+import vtable
+import backtest.heatmap
+import backtest.kernel
+import backtest.store
+import backtest.surface
+import strategies.sma_cross_batch
+
+dfs = {
+    '^SPX': backtest.store.fetch_ticker('^SPX',
+                                        start=datetime.datetime(1960, 1, 1),
+                                        end=datetime.datetime(2023, 11, 1))
+}
+instrument = vfin.InstrumentInfo(ticker_name='^SPX',
+                                 di={'close': vtable.DataInfo('^SPX', 'Close')},
+                                 slippage=0.5)
+close = backtest.kernel.close_price(instrument, dfs).to_numpy(dtype=np.float64)
+
+# entry signals of SmaCrossOpGen, all pairs calculated at once
+pairs = [(5, 20), (20, 50), (50, 200)]
+batch = strategies.sma_cross_batch.SmaCrossBatch(
+    params=[{'long entry fast sma': f, 'long entry slow sma': s}
+            for f, s in pairs],
+    initial_cash=1000,
+    price_info=instrument)
+signals = batch.signals(close)['long entry']
+
+# where the price is up to a year after the fast SMA crosses above the slow
+horizons = np.arange(1, 253)
+edges = np.linspace(-0.3, 0.3, 61)
+heatmaps = [backtest.heatmap.heatmap(close,
+                                     signals[:, i],
+                                     horizons,
+                                     edges,
+                                     name=f'sma({f}) > sma({s})')
+            for i, (f, s) in enumerate(pairs)]
+combined = backtest.heatmap.combine(heatmaps)
+
+for h in heatmaps + [combined]:
+    p = h.probabilities()
+    up = np.nansum(p[:, h.edges[1:] > 0], axis=1)
+    print(f'{h.name}: P(up) after 21 bars {up[20]:.3f}, '
+          f'after 252 bars {up[-1]:.3f}')
+backtest.surface.to_file(combined.grid(),
+                         'test_heatmap.html',
+                         name='probability')
@@ -8,6 +8,13 @@ import vparams
 import vstats
 import vtable
 import vtime
+import backtest.memo
+import backtest.store
+import backtest.program
+import backtest.stats
+import backtest.surface
+import backtest.sweep
+import strategies.indicators
 import strategies.sma_cross
 
 
@@ -15,9 +22,9 @@ vlog.configure('debug')
 
 # fetch input dataframes
 dfs = {
-    '^SPX': vfin.fetch_ticker('^SPX',
-                              start=datetime.datetime(2000, 1, 1),
-                              end=datetime.datetime(2023, 11, 1))
+    '^SPX': backtest.store.fetch_ticker('^SPX',
+                                        start=datetime.datetime(2000, 1, 1),
+                                        end=datetime.datetime(2023, 11, 1))
 }
 
 # generate parameters
@@ -28,43 +35,59 @@ params = list(vparams.cortesian_product({
             'short entry fast sma': list(range(5, 7))
         }))
 
-# generate operation generators
+# generate operation generator definitions
 instrument = vfin.InstrumentInfo(ticker_name='^SPX',
                                  di={'close': vtable.DataInfo('^SPX', 'Close')},
                                  slippage=0.5)
 monthly_alarm = vtime.Alarm('monthly')
-opgs = [strategies.sma_cross.SmaCrossOpGen(
-            price_info=instrument,
-            initial_cash=1000,
-            add_cash=100,
-            add_cash_alarm=monthly_alarm,
-            params=param,
-            name=f'sma({param.values()})') for param in params]
+indicator_cache = strategies.indicators.IndicatorCache()
+defs = [backtest.sweep.OpGenDef(
+            name=f'sma({param.values()})',
+            cls=strategies.sma_cross.SmaCrossOpGen,
+            kwargs={'price_info': instrument,
+                    'initial_cash': 1000,
+                    'add_cash': 100,
+                    'add_cash_alarm': monthly_alarm,
+                    'params': param,
+                    'indicator_cache': indicator_cache}) for param in params]
 
-# generate operations
-ops = []
-for opg in opgs:
-    ops += opg.ops()
+# backtest over a process pool and generate result tables,
+# SMAs and signals are not stored in the tables,
+# finished strategies are saved and not run again,
+# remove the checkpoint directory to run all again,
+# strategies run before by other experiments are loaded from the result cache
+tables = backtest.sweep.tables(defs,
+                               dfs,
+                               engine=backtest.program.BacktestEngine,
+                               transient=True,
+                               checkpoint='__sma_cross_checkpoint__',
+                               result_cache=backtest.memo.default_cache())
+opgens = {d.name: d.create() for d in defs}
 
-# backtest
-be = vfin.BacktestEngine(ops=ops, dfs=dfs)
-bt = be.run()
-
-# TODO: save for reuse
-# pickle_data = [opgs, bt]
-# with open(filename, "wb") as f:
-#     pickle.dump(pickle_data, f)
-# with open(filename, "rb") as f:
-#     pickle_data = pickle.load(f)
-
-# generate strategy infos
-sis = [vstats.StrategyInfo(opg.name,
-                           opg,
-                           bt) for opg in opgs]
-
-# generate results
+# generate results,
+# statistics of all strategies are calculated at once,
+# only the best ones are reported in detail
+stats = backtest.stats.from_tables(opgens, tables)
+best = backtest.stats.top(stats, k=10, by='sharpe')
+print(best.to_string())
+sis = [vstats.StrategyInfo(name, opgens[name], tables[name])
+       for name in best.index]
 vstats.print_results(sis)
 vstats.plot_results(sis, 'test_sma_cross_comparison.html')
 # TODO: remove debug print
-print(f'total strategies analized: {len(sis)}')
-# TODO: vstats.plot_surface()
+print(f'total strategies analized: {len(stats)}')
+
+# parameter surface: the best Sharpe ratio of every long entry SMA pair
+# over all other params, and its worst neighbour for spotting plateaus
+surface = backtest.surface.grid(backtest.surface.params_table(defs),
+                                stats['sharpe'],
+                                axes=['long entry fast sma',
+                                      'long entry slow sma'],
+                                agg='max')
+print(surface.frame().to_string())
+backtest.surface.to_file(surface,
+                         'test_sma_cross_surface.html',
+                         name='sharpe')
+backtest.surface.to_file(backtest.surface.plateau(surface),
+                         'test_sma_cross_plateau.html',
+                         name='sharpe')
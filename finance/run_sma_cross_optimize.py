@@ -0,0 +1,79 @@
+'''
+Experiment for finding optimal SMA cross parameters for daily SPX.
+'''
+import datetime
+import vfin
+import vlog
+import vtable
+import vstats
+import vtime
+import backtest.optimize
+import backtest.program
+import backtest.store
+import backtest.sweep
+import backtest.walk_forward
+import strategies.sma_cross
+
+
+vlog.configure('info')
+
+# fetch input dataframes
+dfs = {
+    '^SPX': backtest.store.fetch_ticker('^SPX',
+                                        start=datetime.datetime(1960, 1, 1),
+                                        end=datetime.datetime(2023, 11, 1))
+}
+
+instrument = vfin.InstrumentInfo(ticker_name='^SPX',
+                                 di={'close': vtable.DataInfo('^SPX', 'Close')},
+                                 slippage=0.5)
+periods = list(range(5, 205, 5))
+space = {p: periods for p in strategies.sma_cross.SmaCrossOpGen.PARAMS}
+
+
+def valid(params: dict) -> bool:
+    '''
+    Fast SMA period below slow SMA period.
+    '''
+    return all(params[f'{s} fast sma'] < params[f'{s} slow sma']
+               for s in ['long entry', 'long exit', 'short entry', 'short exit'])
+
+
+optimizer = backtest.optimize.Optimizer(
+    cls=strategies.sma_cross.SmaCrossOpGen,
+    kwargs={'price_info': instrument,
+            'initial_cash': 1000,
+            'add_cash': 100,
+            'add_cash_alarm': vtime.Alarm('monthly')},
+    dfs=dfs,
+    space=space,
+    valid=valid,
+    engine=backtest.program.BacktestEngine,
+    seed=0)
+
+# prune losing candidates on short history first, at least the longest
+# SMA and a year of bars, then refine the best one parameter at a time
+result = optimizer.successive_halving(n=729, eta=3)
+result = optimizer.coordinate_descent(start=result.best_params)
+
+print(f'space: {optimizer.size()} points, '
+      f'evaluated: {len(result.history)}')
+print(f'best score: {result.best_score}')
+print(f'best params: {result.best_params}')
+
+# out of sample: the best params on 10 test windows after the first
+# 20 years, indicators are warm at the start of every window
+walk_forward = backtest.walk_forward.WalkForward(
+    dfs,
+    backtest.walk_forward.splits(len(dfs['^SPX']),
+                                 n_folds=10,
+                                 train_size=20 * 252,
+                                 anchored=True),
+    engine=backtest.program.BacktestEngine)
+folds = walk_forward.evaluate([backtest.sweep.OpGenDef(
+    name='sma_cross_best',
+    cls=strategies.sma_cross.SmaCrossOpGen,
+    kwargs=dict(optimizer.kwargs, params=result.best_params))])
+for fold in folds:
+    print(f'fold {fold.index[0]} - {fold.index[-1]}: {fold.scores}')
+    vstats.print_results(fold.strategy_infos())
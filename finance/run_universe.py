@@ -0,0 +1,37 @@
+'''
+Experiment for comparing strategies over many tickers.
+'''
+import datetime
+import vtime
+import backtest.universe
+import strategies.money_avg
+import strategies.sma_cross
+
+TICKERS = ['^SPX', '^DJI', '^IXIC', '^RUT', '^N225', '^FTSE', '^GDAXI']
+
+dfs = backtest.universe.fetch(TICKERS,
+                              start=datetime.datetime(1960, 1, 1),
+                              end=datetime.datetime(2023, 11, 1))
+monthly_alarm = vtime.Alarm('monthly')
+templates = [
+    backtest.universe.Template(
+        name='money_avg',
+        cls=strategies.money_avg.MoneyAvgOpGen,
+        kwargs={'initial_cash': 1000,
+                'add_cash': 100,
+                'add_cash_alarm': monthly_alarm}),
+    backtest.universe.Template(
+        name='sma_cross_long',
+        cls=strategies.sma_cross.SmaCrossOpGen,
+        kwargs={'initial_cash': 1000,
+                'add_cash': 100,
+                'add_cash_alarm': monthly_alarm,
+                'params': {'long entry slow sma': 200,
+                           'long entry fast sma': 50,
+                           'long exit slow sma': 200,
+                           'long exit fast sma': 50}}),
+]
+
+# tickers are backtested in parallel over one shared price matrix
+result = backtest.universe.run(templates, dfs)
+print(result.final())
@@ -0,0 +1,220 @@
+'''
+SMA cross strategy trading at decision points.
+'''
+import functools
+import numpy as np
+import vfin
+import vplot
+import vtable
+import backtest.vector
+import strategies.indicators
+import strategies.sma_cross
+
+
+def _consolidated(width, threshold):
+    # NaN width compares as False
+    return width[-1] < threshold
+
+
+def _vector_consolidated(width, threshold):
+    return width < threshold
+
+
+def _above_consolidated(fast, slow, consolidated):
+    return bool(consolidated[-1]) and fast[-1] > slow[-1]
+
+
+def _below_consolidated(fast, slow, consolidated):
+    return bool(consolidated[-1]) and fast[-1] < slow[-1]
+
+
+def _vector_above_consolidated(fast, slow, consolidated):
+    return np.asarray(consolidated, dtype=bool) & (fast > slow)
+
+
+def _vector_below_consolidated(fast, slow, consolidated):
+    return np.asarray(consolidated, dtype=bool) & (fast < slow)
+
+
+class ConsolidationOpGen(strategies.sma_cross.SmaCrossOpGen):
+    '''
+    Generate an operation sequence for an SMA cross trading strategy
+    that enters and exits only at decision points: bars where the market
+    consolidates, i.e. the range of the last 'consolidation period' prices
+    is narrower than 'consolidation width bp' basis points of the price.
+
+    Long:
+        Enter when consolidated and fast SMA is above slow SMA.
+        Exit when consolidated and fast SMA is below slow SMA.
+
+    Short:
+        Enter when consolidated and fast SMA is below slow SMA.
+        Exit when consolidated and fast SMA is above slow SMA.
+
+    Params are the SmaCrossOpGen params and:
+        'consolidation period': number of prices in the range, at least 2,
+                                if 0 - same as SmaCrossOpGen
+        'consolidation width bp': range width threshold in basis points
+    '''
+    CONSOLIDATION_PARAMS = {'consolidation period',
+                            'consolidation width bp'}
+    PARAMS = strategies.sma_cross.SmaCrossOpGen.SMA_PARAMS \
+        | CONSOLIDATION_PARAMS
+
+    def _init_di_params(self):
+        strategies.sma_cross.SmaCrossOpGen._init_di_params(self)
+        self.di['range width'] = vtable.DataInfo(self.name, 'range width')
+        self.di['consolidation'] = vtable.DataInfo(self.name,
+                                                   'consolidation',
+                                                   first_value=False)
+
+    def _consolidation(self) -> bool:
+        return bool(self.params['consolidation period'])
+
+    def transient_dis(self) -> list[vtable.DataInfo]:
+        '''
+        Return DataInfos that are only needed within the current row:
+        SMAs, range width and signals, see SmaCrossOpGen.transient_dis().
+        '''
+        ret = strategies.sma_cross.SmaCrossOpGen.transient_dis(self)
+        if self._consolidation():
+            ret += [self.di['range width'], self.di['consolidation']]
+        return ret
+
+    def max_lookback(self) -> int:
+        '''
+        Return the largest history any op reads, see backtest.stream.
+        '''
+        return max(strategies.sma_cross.SmaCrossOpGen.max_lookback(self),
+                   self.params['consolidation period'])
+
+    def ops_prepare(self) -> list[vfin.Operation]:
+        '''
+        Perform preparation operations before the main cycle.
+
+        Generate operations to:
+        - Calculate SMAs
+        - Calculate the range width and the consolidation signal
+
+        The range width is streaming in O(1) per row, shared through
+        the indicator cache, and a vector op, see backtest.vector.
+        '''
+        ops = strategies.sma_cross.SmaCrossOpGen.ops_prepare(self)
+        if not self._consolidation():
+            return ops
+        src = self.opgens['price close'].di['src']
+        period = self.params['consolidation period']
+        threshold = self.params['consolidation width bp'] / 10000
+        ops += [
+            backtest.vector.Call(
+                function=self.indicator_cache.get(
+                    src,
+                    strategies.indicators.RollingRange,
+                    period=period),
+                vector_function=functools.partial(
+                    strategies.indicators.range_width,
+                    period=period),
+                kwargs={'x': src},
+                ret=self.di['range width']),
+            backtest.vector.Call(
+                function=_consolidated,
+                vector_function=_vector_consolidated,
+                kwargs={'width': self.di['range width'],
+                        'threshold': threshold},
+                ret=self.di['consolidation']),
+        ]
+        return ops
+
+    def _ops_signal(self, side: str, above: bool) -> list[vfin.Operation]:
+        if not self.params[f'{side} slow sma'] \
+                or not self.params[f'{side} fast sma']:
+            return []
+        ops = [
+            backtest.vector.Call(
+                function=_above_consolidated if above
+                else _below_consolidated,
+                vector_function=_vector_above_consolidated if above
+                else _vector_below_consolidated,
+                kwargs={'fast': self.di[f'{side} fast sma'],
+                        'slow': self.di[f'{side} slow sma'],
+                        'consolidated': self.di['consolidation']},
+                ret=self.di[f'{side} signal']),
+        ]
+        return ops
+
+    def ops_long_entry_signal(self) -> list[vfin.Operation]:
+        '''
+        Long entry signal.
+
+        Generate operations to:
+        - Calculate long entry signal self.di['long entry signal']
+        '''
+        if not self._consolidation():
+            return strategies.sma_cross.SmaCrossOpGen \
+                .ops_long_entry_signal(self)
+        return self._ops_signal('long entry', above=True)
+
+    def ops_long_exit_signal(self) -> list[vfin.Operation]:
+        '''
+        Long exit signal.
+
+        Generate operations to:
+        - Calculate long exit signal self.di['long exit signal']
+        '''
+        if not self._consolidation():
+            return strategies.sma_cross.SmaCrossOpGen \
+                .ops_long_exit_signal(self)
+        return self._ops_signal('long exit', above=False)
+
+    def ops_short_entry_signal(self) -> list[vfin.Operation]:
+        '''
+        Short entry signal.
+
+        Generate operations to:
+        - Calculate short entry signal self.di['short entry signal']
+        '''
+        if not self._consolidation():
+            return strategies.sma_cross.SmaCrossOpGen \
+                .ops_short_entry_signal(self)
+        return self._ops_signal('short entry', above=False)
+
+    def ops_short_exit_signal(self) -> list[vfin.Operation]:
+        '''
+        Short exit signal.
+
+        Generate operations to:
+        - Calculate short exit signal self.di['short exit signal']
+        '''
+        if not self._consolidation():
+            return strategies.sma_cross.SmaCrossOpGen \
+                .ops_short_exit_signal(self)
+        return self._ops_signal('short exit', above=True)
+
+    def debug_subplots(self, table, first_row=1) -> list[vplot.Subplot]:
+        '''
+        Return a list of debug subplots.
+        Also used to draw debug_plot().
+
+        Args:
+            table: pd.DataFrame object containing the data to debug.
+        '''
+        subplots = strategies.sma_cross.SmaCrossOpGen.debug_subplots(
+            self, table, first_row=first_row)
+        if not self._consolidation():
+            return subplots
+        subplots += [
+            vplot.Subplot(
+                col=1,
+                row=first_row + len(subplots),
+                traces=[
+                    vplot.Scatter(
+                        x=table.index,
+                        y=table[self.di['range width'].name],
+                        color=vplot.CSSColor.BLACK,
+                        width=1.0,
+                        mode='lines',
+                        name='range width'),
+                ]
+            ),
+        ]
+        return subplots
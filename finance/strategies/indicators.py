@@ -0,0 +1,247 @@
+'''
+Indicators used by strategies.
+'''
+import collections
+import math
+import numpy as np
+import talib as ta
+
+
+def sma(x, period: int) -> np.ndarray:
+    '''
+    Simple moving average over the whole column.
+
+    Args:
+        x: source column
+        period: number of values to average
+    '''
+    return ta.SMA(np.asarray(x, dtype=np.float64), period)
+
+
+class RollingSma:
+    '''
+    Streaming simple moving average.
+
+    Called once per row with the history of the source column,
+    only the last value is consumed and the average is updated in O(1)
+    using a running sum over a ring buffer of the last `period` values.
+
+    Summation order follows ta.SMA, so the output is identical to
+    `ta.SMA(x, period)[-1]` for every row, including NaN for the first
+    `period - 1` valid values and skipped leading NaNs.
+
+    If the history is not continued row by row (e.g. the table is
+    re-run from the start), the state is rebuilt from the whole history.
+
+    Args:
+        period: number of values to average
+    '''
+    def __init__(self, period: int):
+        assert isinstance(period, int)
+        assert period > 0
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        '''
+        Drop accumulated state.
+        '''
+        self._buf = [0.0] * self.period
+        self._pos = 0
+        self._count = 0
+        # sum of the last `period - 1` values
+        self._total = 0.0
+        self._rows = 0
+        self._last = math.nan
+
+    def update(self, value: float) -> float:
+        '''
+        Add the next value and return the current average.
+        '''
+        self._rows += 1
+        if not self._count and math.isnan(value):
+            # ta.SMA skips leading NaNs
+            self._last = math.nan
+            return self._last
+        total = self._total + value
+        self._count += 1
+        self._buf[self._pos] = value
+        self._pos = (self._pos + 1) % self.period
+        if self._count >= self.period:
+            self._last = total / self.period
+            # oldest value of the current window
+            self._total = total - self._buf[self._pos]
+        else:
+            self._last = math.nan
+            self._total = total
+        return self._last
+
+    def shift(self, rows: int):
+        '''
+        The history passed to the next call starts `rows` rows later,
+        see backtest.stream.
+        '''
+        self._rows -= rows
+
+    def __call__(self, x) -> float:
+        '''
+        Return the average for the last row of `x`.
+
+        Args:
+            x: source history up to and including the current row
+        '''
+        n = len(x)
+        if n == self._rows:
+            # same row requested again by another op
+            return self._last
+        if n != self._rows + 1:
+            self.reset()
+            for v in x[:-1]:
+                self.update(v)
+        return self.update(x[-1])
+
+
+def range_width(x, period: int) -> np.ndarray:
+    '''
+    Relative range over the whole column:
+    (max - min) of the last `period` values divided by the last value.
+
+    A narrow range marks a consolidation, the market slowing down.
+
+    Leading NaNs are skipped, a window holding a NaN after the first
+    valid value gives NaN, e.g. gaps of a union calendar.
+    ta.MAX and ta.MIN carry stale values over such gaps instead.
+
+    Args:
+        x: source column
+        period: number of values, at least 2
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    width = (ta.MAX(x, period) - ta.MIN(x, period)) / x
+    gaps = np.isnan(x)
+    gaps[:np.argmax(~gaps)] = False
+    # number of gaps in the window ending at every row
+    counts = np.convolve(gaps, np.ones(period, dtype=int))[:len(x)]
+    width[counts > 0] = np.nan
+    return width
+
+
+class RollingRange:
+    '''
+    Streaming relative range, see range_width().
+
+    Minimum and maximum of the window are kept in monotonic queues,
+    so every row is O(1) amortized. Output is identical to
+    `range_width(x, period)[-1]` for every row, including NaN for the
+    first `period - 1` valid values, skipped leading NaNs and NaN
+    for windows holding a gap.
+
+    If the history is not continued row by row, the state is rebuilt
+    from the whole history, same as RollingSma.
+
+    Args:
+        period: number of values, at least 2
+    '''
+    def __init__(self, period: int):
+        assert isinstance(period, int)
+        assert period > 1
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        '''
+        Drop accumulated state.
+        '''
+        # (value number, value), values decreasing / increasing
+        self._max = collections.deque()
+        self._min = collections.deque()
+        self._count = 0
+        # value number of the last gap
+        self._gap = -self.period
+        self._rows = 0
+        self._last = math.nan
+
+    def update(self, value: float) -> float:
+        '''
+        Add the next value and return the current relative range.
+        '''
+        self._rows += 1
+        if not self._count and math.isnan(value):
+            # ta.MAX and ta.MIN skip leading NaNs
+            self._last = math.nan
+            return self._last
+        n = self._count
+        self._count += 1
+        if math.isnan(value):
+            self._gap = n
+        else:
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((n, value))
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((n, value))
+        # drop values older than the window
+        first = n - self.period + 1
+        if self._max and self._max[0][0] < first:
+            self._max.popleft()
+        if self._min and self._min[0][0] < first:
+            self._min.popleft()
+        if self._count >= self.period and self._gap < first:
+            self._last = (self._max[0][1] - self._min[0][1]) / value
+        else:
+            self._last = math.nan
+        return self._last
+
+    def shift(self, rows: int):
+        '''
+        The history passed to the next call starts `rows` rows later,
+        see backtest.stream.
+        '''
+        self._rows -= rows
+
+    def __call__(self, x) -> float:
+        '''
+        Return the relative range for the last row of `x`.
+
+        Args:
+            x: source history up to and including the current row
+        '''
+        n = len(x)
+        if n == self._rows:
+            # same row requested again by another op
+            return self._last
+        if n != self._rows + 1:
+            self.reset()
+            for v in x[:-1]:
+                self.update(v)
+        return self.update(x[-1])
+
+
+class IndicatorCache:
+    '''
+    Indicators shared between strategies of one backtest.
+
+    Indicators are keyed by (source DataInfo, indicator, params),
+    so every distinct indicator is created once and reused by all
+    strategies that request it.
+    '''
+    def __init__(self):
+        self._indicators = {}
+
+    def __len__(self) -> int:
+        return len(self._indicators)
+
+    def get(self, src, indicator: type, **params):
+        '''
+        Return the indicator for `src`, create it if not yet cached.
+
+        Args:
+            src: DataInfo of the source column
+            indicator: indicator class, e.g. RollingSma
+            params: indicator init arguments
+        '''
+        key = (src.name, indicator, tuple(sorted(params.items())))
+        if key not in self._indicators:
+            self._indicators[key] = indicator(**params)
+        return self._indicators[key]
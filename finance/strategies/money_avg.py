@@ -2,9 +2,18 @@
 Simple money averaging strategy.
 '''
 import typing
+import numpy as np
+import pandas as pd
 import vfin
 import vfin_ops
+import vtable
 import vtime
+import backtest.alarm
+import backtest.kernel
+
+
+def _last(x):
+    return x[-1]
 
 
 # pylint: disable=too-few-public-methods
@@ -18,12 +27,15 @@ class MoneyAvgOpGen(vfin_ops.TradingOpGen):
         add_cash_alarm: alarm for adding cash
         price_di: price data for buying/selling asset
         price_slippage_pct: price slippage in percents
+        name: strategy name,
+              if None - generated automatically
     '''
     def __init__(self,
                  initial_cash: typing.Union[int, float],
                  add_cash: typing.Union[int, float] = 0,
                  add_cash_alarm: typing.Union[str, vtime.Alarm] = None,
-                 price_info: vfin.InstrumentInfo = None):
+                 price_info: vfin.InstrumentInfo = None,
+                 name: str = None):
 
         if not price_info.di['close']:
             raise ValueError
@@ -32,7 +44,26 @@ class MoneyAvgOpGen(vfin_ops.TradingOpGen):
                                        initial_cash=initial_cash,
                                        add_cash=add_cash,
                                        add_cash_alarm=add_cash_alarm,
-                                       price_info=price_info)
+                                       price_info=price_info,
+                                       name=name)
+        self.initial_cash = initial_cash
+        self.add_cash_alarm = add_cash_alarm
+        self.price_info = price_info
+        if add_cash and 'add cash alarm' in self.opgens:
+            backtest.alarm.vectorize(self.opgens['add cash alarm'],
+                                     add_cash_alarm)
+
+    def transient_dis(self) -> list[vtable.DataInfo]:
+        '''
+        Return DataInfos that are only needed within the current row.
+        '''
+        return [self.di['long entry signal']]
+
+    def max_lookback(self) -> int:
+        '''
+        Return the largest history any op reads, see backtest.stream.
+        '''
+        return 2
 
     def ops_long_entry_signal(self) -> list[vfin.Operation]:
         '''
@@ -43,8 +74,29 @@ class MoneyAvgOpGen(vfin_ops.TradingOpGen):
         '''
         ops = [
             vfin_ops.Call(
-                function=lambda x: x[-1],
+                function=_last,
                 kwargs={'x': self.opgens['add cash alarm'].di['signal']},
                 ret=self.di['long entry signal'])
         ]
         return ops
+
+    def vector_total(self, dfs: dict[str, pd.DataFrame]) -> pd.Series:
+        '''
+        Return the total for every row of the price table,
+        calculated at once, equal to the total of the sequential ops.
+        '''
+        key = self.price_info.di['close'].key
+        close = backtest.kernel.close_price(self.price_info, dfs)
+        if self.add_cash:
+            alarm = backtest.alarm.mask(self.add_cash_alarm,
+                                        {key: dfs[key]})
+        else:
+            alarm = np.zeros(len(close), dtype=bool)
+        return pd.Series(backtest.kernel.money_avg(
+                             close.to_numpy(dtype=np.float64),
+                             self.price_info.slippage,
+                             self.initial_cash,
+                             self.add_cash,
+                             alarm),
+                         index=close.index,
+                         name=self.di['total'].name)
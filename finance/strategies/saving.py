@@ -1,30 +1,60 @@
 '''
 Simple saving strategy.
 '''
+import numpy as np
+import pandas as pd
 import vfin_ops
 import vplot
 import vtime
 import vtable
+import backtest.alarm
+import backtest.kernel
+
+
+def _carry(x):
+    return x[-2]
+
+
+def _deposit(m, x, add_cash):
+    return (x[-1] + add_cash) if m[-1] else x[-1]
 
 
 class SavingOpGen(vfin_ops.TradingOpGen):
     '''
     Generate an operation sequence for  saving over time.
+
+    Args:
+        initial_cash: initial cash
+        add_cash: cash that is added periodically
+        add_cash_alarm: alarm for adding cash
+        name: strategy name,
+              if None - generated automatically
     '''
     def __init__(self,
                  initial_cash: float,
                  add_cash: float = None,
-                 add_cash_alarm: vtime.Alarm = None):
+                 add_cash_alarm: vtime.Alarm = None,
+                 name: str = None):
         vfin_ops.TradingOpGen.__init__(self,
                                        initial_cash,
                                        add_cash,
-                                       add_cash_alarm)
+                                       add_cash_alarm,
+                                       name=name)
+        self.initial_cash = initial_cash
+        self.add_cash_alarm = add_cash_alarm
 
         self.di['total'] = vtable.DataInfo(self.name,
                                            'total',
                                            first_value=initial_cash)
         if add_cash:
-            self.opgens['alarm'] = vfin_ops.AlarmOpGen(add_cash_alarm)
+            self.opgens['alarm'] = backtest.alarm.vectorize(
+                vfin_ops.AlarmOpGen(add_cash_alarm), add_cash_alarm)
+
+    def max_lookback(self) -> int:
+        '''
+        Return the largest history any op reads, see backtest.stream.
+        '''
+        return 2
 
     def ops(self):
         '''
@@ -32,7 +62,7 @@ class SavingOpGen(vfin_ops.TradingOpGen):
         '''
         ops = [
             # move assets from previous datetime
-            vfin_ops.Call(function=lambda x: x[-2],
+            vfin_ops.Call(function=_carry,
                           kwargs={'x': self.di['total']},
                           ret=self.di['total']),
         ]
@@ -40,14 +70,30 @@ class SavingOpGen(vfin_ops.TradingOpGen):
             ops += self.opgens['alarm'].ops()
             ops += [
                 # receive monthly deposit
-                vfin_ops.Call(function=lambda m, x: \
-                              (x[-1] + self.add_cash) if m[-1] else x[-1],
+                vfin_ops.Call(function=_deposit,
                               kwargs={'m': self.opgens['alarm'].di['signal'],
-                                      'x': self.di['total']},
+                                      'x': self.di['total'],
+                                      'add_cash': self.add_cash},
                               ret=self.di['total']),
             ]
         return ops
 
+    def vector_total(self, dfs: dict[str, pd.DataFrame]) -> pd.Series:
+        '''
+        Return the total for every row of the first table of `dfs`,
+        calculated at once, equal to the total of the sequential ops.
+        '''
+        index = next(iter(dfs.values())).index
+        if self.add_cash:
+            alarm = backtest.alarm.mask(self.add_cash_alarm, dfs)
+        else:
+            alarm = np.zeros(len(index), dtype=bool)
+        return pd.Series(backtest.kernel.saving(self.initial_cash,
+                                                self.add_cash,
+                                                alarm),
+                         index=index,
+                         name=self.di['total'].name)
+
     def debug_subplots(self, table) -> list[vplot.Subplot]:
         '''
         Return a list of debug subplots.
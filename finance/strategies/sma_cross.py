@@ -2,13 +2,42 @@
 SMA cross strategy.
 '''
 
+import functools
 import typing
-import talib as ta
+import numpy as np
 import vfin
 import vfin_ops
 import vplot
 import vtable
 import vtime
+import backtest.alarm
+import backtest.vector
+import strategies.indicators
+
+
+def _above(fast, slow):
+    return fast[-1] > slow[-1]
+
+
+def _below(fast, slow):
+    return fast[-1] < slow[-1]
+
+
+def _vector_above(fast, slow):
+    return fast > slow
+
+
+def _vector_below(fast, slow):
+    return fast < slow
+
+
+def _zero(x):
+    # pylint: disable=unused-argument
+    return 0
+
+
+def _vector_zero(x):
+    return np.zeros(len(x))
 
 
 class SmaCrossOpGen(vfin_ops.TradingOpGen):
@@ -25,14 +54,16 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
 
     SMA coefficients for Long and Short may differ.
     '''
-    PARAMS = {'long entry fast sma',
-              'long entry slow sma',
-              'long exit fast sma',
-              'long exit slow sma',
-              'short entry fast sma',
-              'short entry slow sma',
-              'short exit fast sma',
-              'short exit slow sma'}
+    SMA_PARAMS = {'long entry fast sma',
+                  'long entry slow sma',
+                  'long exit fast sma',
+                  'long exit slow sma',
+                  'short entry fast sma',
+                  'short entry slow sma',
+                  'short exit fast sma',
+                  'short exit slow sma'}
+    # all params, subclasses add their own
+    PARAMS = SMA_PARAMS
 
     # pylint: disable=too-many-arguments
     def __init__(self,
@@ -49,7 +80,8 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
                  add_cash: typing.Union[int, float] = 0,
                  add_cash_alarm: typing.Union[str, vtime.Alarm] = None,
                  price_info: vfin.InstrumentInfo = None,
-                 name: str = None):
+                 name: str = None,
+                 indicator_cache: strategies.indicators.IndicatorCache = None):
         '''
         Init.
 
@@ -69,6 +101,8 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
             price_info: description of the asset price data
             name: strategy name,
                   if None - generated automatically
+            indicator_cache: indicators shared with other strategies,
+                             if None - not shared
         '''
         assert price_info.di['close']
         assert isinstance(params, dict)
@@ -82,6 +116,9 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
                 self.params[p] = params[p]
             else:
                 self.params[p] = 0
+        if indicator_cache is None:
+            indicator_cache = strategies.indicators.IndicatorCache()
+        self.indicator_cache = indicator_cache
 
         vfin_ops.TradingOpGen.__init__(self,
                                        initial_cash=initial_cash,
@@ -89,32 +126,73 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
                                        add_cash_alarm=add_cash_alarm,
                                        price_info=price_info,
                                        name=name)
+        self.add_cash_alarm = add_cash_alarm
+        if add_cash and 'add cash alarm' in self.opgens:
+            backtest.alarm.vectorize(self.opgens['add cash alarm'],
+                                     add_cash_alarm)
         self._init_di_params()
 
     def _init_di_params(self):
-        for p in self.PARAMS:
+        for p in self.SMA_PARAMS:
             self.di[p] = vtable.DataInfo(self.name, p)
 
+    def transient_dis(self) -> list[vtable.DataInfo]:
+        '''
+        Return DataInfos that are only needed within the current row:
+        SMAs and signals.
+        If the engine supports it they are calculated row by row
+        in 2-row scratch columns instead of over whole columns,
+        see backtest.program, debug_plot() needs them stored.
+        '''
+        return [self.di[p] for p in self.SMA_PARAMS] + \
+            [self.di[f'{s} signal'] for s in ['long entry',
+                                              'long exit',
+                                              'short entry',
+                                              'short exit']]
+
+    def max_lookback(self) -> int:
+        '''
+        Return the largest history any op reads, see backtest.stream.
+        SMAs are streaming, the largest period bounds the history
+        they are rebuilt from if not called row by row.
+        '''
+        return max([2] + [self.params[p] for p in self.SMA_PARAMS])
+
     def ops_prepare(self) -> list[vfin.Operation]:
         '''
         Perform preparation operations before the main cycle.
 
         Generate operations to:
         - Calculate SMAs
+
+        SMAs with equal periods share one streaming state
+        through the indicator cache.
+        SMAs are vector ops, see backtest.vector.
         '''
         ops = []
-        for p in self.PARAMS:
+        src = self.opgens['price close'].di['src']
+        for p in self.SMA_PARAMS:
             if self.params[p]:
+                d = self.params[p]
                 ops += [
-                    vfin_ops.Call(
-                        function=lambda x, d: ta.SMA(x, d)[-1],
-                        kwargs={'x': self.opgens['price close'].di['src'],
-                                'd': self.params[p]},
+                    backtest.vector.Call(
+                        function=self.indicator_cache.get(
+                            src,
+                            strategies.indicators.RollingSma,
+                            period=d),
+                        vector_function=functools.partial(
+                            strategies.indicators.sma,
+                            period=d),
+                        kwargs={'x': src},
                         ret=self.di[p]),
                 ]
             else:
                 ops += [
-                    vfin_ops.Set(0, self.di[p])
+                    backtest.vector.Call(
+                        function=_zero,
+                        vector_function=_vector_zero,
+                        kwargs={'x': src},
+                        ret=self.di[p]),
                 ]
         return ops
 
@@ -129,10 +207,12 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
                 or not self.params['long entry fast sma']:
             return []
         ops = [
-            vfin_ops.Call(function=lambda fast, slow: fast[-1] > slow[-1],
-                          kwargs={'fast': self.di['long entry fast sma'],
-                                  'slow': self.di['long entry slow sma']},
-                          ret=self.di['long entry signal']),
+            backtest.vector.Call(
+                function=_above,
+                vector_function=_vector_above,
+                kwargs={'fast': self.di['long entry fast sma'],
+                        'slow': self.di['long entry slow sma']},
+                ret=self.di['long entry signal']),
         ]
         return ops
 
@@ -147,10 +227,12 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
                 or not self.params['long exit fast sma']:
             return []
         ops = [
-            vfin_ops.Call(function=lambda fast, slow: fast[-1] < slow[-1],
-                          kwargs={'fast': self.di['long exit fast sma'],
-                                  'slow': self.di['long exit slow sma']},
-                          ret=self.di['long exit signal']),
+            backtest.vector.Call(
+                function=_below,
+                vector_function=_vector_below,
+                kwargs={'fast': self.di['long exit fast sma'],
+                        'slow': self.di['long exit slow sma']},
+                ret=self.di['long exit signal']),
         ]
         return ops
 
@@ -165,10 +247,12 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
                 or not self.params['short entry fast sma']:
             return []
         ops = [
-            vfin_ops.Call(function=lambda fast, slow: fast[-1] < slow[-1],
-                          kwargs={'fast': self.di['short entry fast sma'],
-                                  'slow': self.di['short entry slow sma']},
-                          ret=self.di['short entry signal']),
+            backtest.vector.Call(
+                function=_below,
+                vector_function=_vector_below,
+                kwargs={'fast': self.di['short entry fast sma'],
+                        'slow': self.di['short entry slow sma']},
+                ret=self.di['short entry signal']),
         ]
         return ops
 
@@ -183,10 +267,12 @@ class SmaCrossOpGen(vfin_ops.TradingOpGen):
                 or not self.params['short exit fast sma']:
             return []
         ops = [
-            vfin_ops.Call(function=lambda fast, slow: fast[-1] > slow[-1],
-                          kwargs={'fast': self.di['short exit fast sma'],
-                                  'slow': self.di['short exit slow sma']},
-                          ret=self.di['short exit signal']),
+            backtest.vector.Call(
+                function=_above,
+                vector_function=_vector_above,
+                kwargs={'fast': self.di['short exit fast sma'],
+                        'slow': self.di['short exit slow sma']},
+                ret=self.di['short exit signal']),
         ]
         return ops
 
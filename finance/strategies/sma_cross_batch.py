@@ -0,0 +1,120 @@
+'''
+SMA cross strategy for a whole parameter grid at once.
+'''
+import typing
+import numpy as np
+import pandas as pd
+import vfin
+import vtime
+import backtest.kernel
+import strategies.indicators
+import strategies.sma_cross
+
+
+class SmaCrossBatch:
+    '''
+    Simulate SmaCrossOpGen for every parameter set of a grid at once.
+
+    Every distinct SMA and every distinct (fast, slow) signal is calculated
+    once over the whole column, state of all parameter sets is stepped
+    through time together by backtest.kernel.simulate().
+    '''
+    SIDES = {'long entry': 'above',
+             'long exit': 'below',
+             'short entry': 'below',
+             'short exit': 'above'}
+
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 params: list[dict[str, int]],
+                 initial_cash: typing.Union[int, float],
+                 add_cash: typing.Union[int, float] = 0,
+                 add_cash_alarm: typing.Union[str, vtime.Alarm] = None,
+                 price_info: vfin.InstrumentInfo = None):
+        '''
+        Init.
+
+        Args:
+            params: list of SmaCrossOpGen params
+            initial_cash
+            add_cash: the amount of cash to be added
+            add_cash_alarm: rules for adding the `add_cash` amount
+            price_info: description of the asset price data
+        '''
+        assert price_info.di['close']
+        assert isinstance(params, list)
+        self.params = []
+        for p in params:
+            assert isinstance(p, dict)
+            for k, v in p.items():
+                assert k in strategies.sma_cross.SmaCrossOpGen.PARAMS
+                assert isinstance(v, int)
+            self.params.append(
+                {k: p.get(k, 0)
+                 for k in strategies.sma_cross.SmaCrossOpGen.PARAMS})
+        self.initial_cash = initial_cash
+        self.add_cash = add_cash
+        self.add_cash_alarm = add_cash_alarm
+        self.price_info = price_info
+
+    def __len__(self) -> int:
+        return len(self.params)
+
+    def signals(self, close: np.ndarray) -> dict[str, np.ndarray]:
+        '''
+        Return signals of all parameter sets, (n_bars, n_params) each.
+
+        Args:
+            close: close price, (n_bars,)
+        '''
+        smas = {}
+        signals = {}
+        for side, cmp in self.SIDES.items():
+            pairs = [(p[f'{side} fast sma'], p[f'{side} slow sma'])
+                     for p in self.params]
+            if not any(f and s for f, s in pairs):
+                signals[side] = None
+                continue
+            unique, inverse = np.unique(pairs, axis=0, return_inverse=True)
+            cols = np.zeros((len(close), len(unique)), dtype=bool)
+            for i, (f, s) in enumerate(unique):
+                if not f or not s:
+                    continue
+                for d in (f, s):
+                    if d not in smas:
+                        smas[d] = strategies.indicators.sma(close, int(d))
+                if cmp == 'above':
+                    cols[:, i] = smas[f] > smas[s]
+                else:
+                    cols[:, i] = smas[f] < smas[s]
+            signals[side] = cols[:, inverse.reshape(-1)]
+        return signals
+
+    def run(self, dfs: dict[str, pd.DataFrame]) -> pd.DataFrame:
+        '''
+        Run all parameter sets.
+
+        Args:
+            dfs: input tables
+
+        Returns:
+            total of every parameter set, one column per parameter set
+            in the order of `params`
+        '''
+        close = backtest.kernel.close_price(self.price_info, dfs)
+        alarm = None
+        if self.add_cash:
+            alarm = backtest.kernel.alarm_signal(self.add_cash_alarm, dfs)
+        signals = self.signals(close.to_numpy(dtype=np.float64))
+        total = backtest.kernel.simulate(
+            close=close.to_numpy(),
+            slippage=self.price_info.slippage,
+            initial_cash=self.initial_cash,
+            add_cash=self.add_cash,
+            alarm=alarm,
+            long_entry=signals['long entry'],
+            long_exit=signals['long exit'],
+            short_entry=signals['short entry'],
+            short_exit=signals['short exit'],
+            n=len(self))
+        return pd.DataFrame(total, index=close.index)
@@ -0,0 +1,38 @@
+'''
+Test configuration.
+
+Tests run offline: the default price store is the committed fixture,
+see fixtures/make_fixture.py. Tests marked `network` need the real price
+history and are skipped unless NETWORK=1 is set.
+'''
+import os
+import pytest
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__),
+                            'fixtures',
+                            'price_store')
+
+
+def pytest_configure(config):
+    '''
+    Register markers and point the default store to the fixture.
+    '''
+    config.addinivalue_line('markers',
+                            'network: needs the real price history, '
+                            'run with NETWORK=1')
+    if not os.environ.get('NETWORK'):
+        os.environ['PRICE_STORE'] = FIXTURE_PATH
+        os.environ['PRICE_STORE_OFFLINE'] = '1'
+
+
+def pytest_collection_modifyitems(config, items):
+    '''
+    Skip network tests unless NETWORK=1 is set.
+    '''
+    # pylint: disable=unused-argument
+    if os.environ.get('NETWORK'):
+        return
+    skip = pytest.mark.skip(reason='needs network, run with NETWORK=1')
+    for item in items:
+        if 'network' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,48 @@
+'''
+Generate the offline price fixture.
+
+Synthetic daily ^SPX-like prices for 1960-2023, stored in the
+backtest.store format, so tests run without network.
+The fixture is committed, rerun only to change it deliberately.
+'''
+import datetime
+import os
+import numpy as np
+import pandas as pd
+import backtest.store
+
+PATH = os.path.join(os.path.dirname(__file__), 'price_store')
+TICKER = '^SPX'
+START = datetime.datetime(1960, 1, 1)
+END = datetime.datetime(2023, 11, 1)
+
+
+def generate() -> pd.DataFrame:
+    '''
+    Return a deterministic random walk with fetch_ticker() columns.
+    '''
+    rng = np.random.default_rng(1960)
+    index = pd.bdate_range(START, END, inclusive='left', name='Date')
+    n = len(index)
+    # ~7% drift and ~15% volatility per year
+    returns = rng.normal(0.07 / 252, 0.15 / np.sqrt(252), n)
+    close = np.round(60 * np.exp(np.cumsum(returns)), 2)
+    open_ = np.round(np.r_[close[0], close[:-1]]
+                     * np.exp(rng.normal(0, 0.002, n)), 2)
+    spread = np.abs(rng.normal(0, 0.006, n))
+    high = np.round(np.maximum(open_, close) * (1 + spread), 2)
+    low = np.round(np.minimum(open_, close) * (1 - spread), 2)
+    volume = rng.integers(1_000_000, 5_000_000, n)
+    return pd.DataFrame({'Open': open_,
+                         'High': high,
+                         'Low': low,
+                         'Close': close,
+                         'Volume': volume},
+                        index=index)
+
+
+if __name__ == '__main__':
+    backtest.store.PriceStore(PATH).save(TICKER,
+                                         generate(),
+                                         start=pd.Timestamp(START),
+                                         end=pd.Timestamp(END))
@@ -0,0 +1,61 @@
+'''
+Test vectorized alarm signals.
+'''
+import datetime
+import os
+import numpy as np
+import pandas as pd
+import vtime
+import backtest.alarm
+import backtest.store
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__),
+                            'fixtures',
+                            'price_store')
+
+
+def test_period_mask():
+    '''
+    Monthly signal is on for the first row and the first row of every month.
+    '''
+    index = pd.bdate_range('2019-12-20', periods=60)
+    mask = backtest.alarm.period_mask('monthly', index)
+    assert list(index[mask]) == [pd.Timestamp('2019-12-20'),
+                                 pd.Timestamp('2020-01-01'),
+                                 pd.Timestamp('2020-02-03'),
+                                 pd.Timestamp('2020-03-02')]
+
+
+def test_reference():
+    '''
+    Monthly signal is equal to the signal of the reference engine.
+    '''
+    store = backtest.store.PriceStore(FIXTURE_PATH, offline=True)
+    dfs = {'^SPX': store.fetch_ticker('^SPX',
+                                      start=datetime.datetime(1960, 1, 1),
+                                      end=datetime.datetime(2023, 11, 1))}
+    alarm = vtime.Alarm('monthly')
+    mask = backtest.alarm.mask(alarm, dfs)
+    np.testing.assert_array_equal(mask,
+                                  backtest.alarm.reference_mask(alarm, dfs))
+    assert backtest.alarm.mask(alarm, dfs) is mask
+
+
+class _OffsetAlarm:
+    def __init__(self, p, offset=0):
+        self.p = p
+        self.offset = offset
+
+
+def test_cache():
+    '''
+    Only alarms equal to the plain periodic alarm are vectorized,
+    the cache is bounded.
+    '''
+    assert backtest.alarm.period(_OffsetAlarm('monthly')) == 'monthly'
+    assert backtest.alarm.period(_OffsetAlarm('monthly', 3)) is None
+    for i in range(backtest.alarm.MAX_MASKS + 1):
+        index = pd.bdate_range('2020-01-01', periods=10 + i)
+        backtest.alarm.mask('monthly', {'^SPX': pd.DataFrame(index=index)})
+    # pylint: disable=protected-access
+    assert len(backtest.alarm._MASKS) == backtest.alarm.MAX_MASKS
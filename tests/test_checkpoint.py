@@ -0,0 +1,70 @@
+'''
+Test saving and loading backtest results.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+import backtest.checkpoint
+import backtest.sweep
+
+
+def test_table(tmp_path):
+    '''
+    Saved tables load back equal, with columns that need file name escaping.
+    '''
+    df = pd.DataFrame({'sma(5, 6) total': np.arange(5.0),
+                       'sma(5, 6) long entry signal': np.arange(5) > 2},
+                      index=pd.date_range('2020-01-01',
+                                          periods=5,
+                                          tz='America/New_York')
+                      .as_unit('ns'))
+    backtest.checkpoint.save_table(str(tmp_path / 'table'), df)
+    loaded = backtest.checkpoint.load_table(str(tmp_path / 'table'))
+    assert loaded.index.equals(df.index)
+    assert list(loaded.columns) == list(df.columns)
+    for col in df.columns:
+        np.testing.assert_array_equal(loaded[col].to_numpy(),
+                                      df[col].to_numpy())
+
+
+def test_data_hash():
+    '''
+    Hash changes with the input data.
+    '''
+    index = pd.date_range('2020-01-01', periods=3)
+    dfs = {'^SPX': pd.DataFrame({'Close': [1.0, 2.0, 3.0]}, index=index)}
+    other = {'^SPX': pd.DataFrame({'Close': [1.0, 2.0, 4.0]}, index=index)}
+    assert backtest.checkpoint.data_hash(dfs) == \
+        backtest.checkpoint.data_hash(dfs)
+    assert backtest.checkpoint.data_hash(dfs) != \
+        backtest.checkpoint.data_hash(other)
+
+
+class _OpGen:
+    def __init__(self, name, period):
+        self.name = name
+        self.period = period
+
+
+def test_begin(tmp_path):
+    '''
+    A sweep resumes only if saved strategies are defined equally.
+    '''
+    dfs = {'^SPX': pd.DataFrame({'Close': [1.0, 2.0, 3.0]},
+                                index=pd.date_range('2020-01-01', periods=3))}
+    defs = [backtest.sweep.OpGenDef(f's{i}', _OpGen, {'period': i})
+            for i in range(3)]
+    path = str(tmp_path / 'checkpoint')
+    checkpoint = backtest.checkpoint.Checkpoint(path)
+    assert checkpoint.begin(defs, dfs) == set()
+    checkpoint.add(['s0', 's1'], dfs['^SPX'])
+    assert backtest.checkpoint.Checkpoint(path).begin(defs, dfs) == \
+        {'s0', 's1'}
+    changed = defs[:1] + [backtest.sweep.OpGenDef('s1', _OpGen, {'period': 5})]
+    with pytest.raises(ValueError):
+        backtest.checkpoint.Checkpoint(path).begin(changed, dfs)
+    # s1 is not in the sweep anymore, its results are dropped
+    assert backtest.checkpoint.Checkpoint(path).begin(defs[:1], dfs) == \
+        {'s0'}
+    assert backtest.checkpoint.Checkpoint(path).begin(changed, dfs) == \
+        {'s0'}
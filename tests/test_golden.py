@@ -0,0 +1,207 @@
+'''
+Golden-result regression tests.
+
+Strategies run over the offline price fixture, see fixtures/make_fixture.py.
+The total of every row is compared bit for bit with the recording made
+by the reference engine vfin.BacktestEngine.
+
+Recordings are committed in golden/, a missing recording fails.
+They are made only by `make golden` (GOLDEN_RECORD=1),
+which records the reference engine again before the other runners.
+Independent of recordings, every runner is also compared with
+the reference engine run over the same fixture.
+'''
+import datetime
+import functools
+import os
+import numpy as np
+import pytest
+import vfin
+import vtime
+import vtable
+import backtest.program
+import backtest.store
+import backtest.stream
+import backtest.vector
+import strategies.consolidation
+import strategies.money_avg
+import strategies.saving
+import strategies.sma_cross
+import strategies.sma_cross_batch
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__),
+                            'fixtures',
+                            'price_store')
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), 'golden')
+REFERENCE = 'vfin'
+
+INSTRUMENT = vfin.InstrumentInfo(ticker_name='^SPX',
+                                 di={'close': vtable.DataInfo('^SPX', 'Close')},
+                                 slippage=0.5)
+SMA_CROSS_PARAMS = {
+    'sma_cross': {'long entry slow sma': 200,
+                  'long entry fast sma': 50,
+                  'long exit slow sma': 200,
+                  'long exit fast sma': 50,
+                  'short entry slow sma': 200,
+                  'short entry fast sma': 50,
+                  'short exit slow sma': 200,
+                  'short exit fast sma': 50},
+    'sma_cross_long': {'long entry slow sma': 200,
+                       'long entry fast sma': 50,
+                       'long exit slow sma': 200,
+                       'long exit fast sma': 50},
+    'sma_cross_short': {'short entry slow sma': 200,
+                        'short entry fast sma': 50,
+                        'short exit slow sma': 200,
+                        'short exit fast sma': 50},
+}
+
+
+def fixture_dfs() -> dict:
+    '''
+    Return input tables from the offline fixture.
+    '''
+    store = backtest.store.PriceStore(FIXTURE_PATH, offline=True)
+    return {
+        '^SPX': store.fetch_ticker('^SPX',
+                                   start=datetime.datetime(1960, 1, 1),
+                                   end=datetime.datetime(2023, 11, 1))
+    }
+
+
+def opgens() -> dict:
+    '''
+    Return all recorded strategies by name.
+    '''
+    monthly_alarm = vtime.Alarm('monthly')
+    ret = {
+        'saving': strategies.saving.SavingOpGen(
+            initial_cash=1000,
+            add_cash=100,
+            add_cash_alarm=monthly_alarm,
+            name='saving'),
+        'money_avg': strategies.money_avg.MoneyAvgOpGen(
+            price_info=INSTRUMENT,
+            initial_cash=1000,
+            add_cash=100,
+            add_cash_alarm=monthly_alarm,
+            name='money_avg'),
+    }
+    ret['consolidation'] = strategies.consolidation.ConsolidationOpGen(
+        price_info=INSTRUMENT,
+        initial_cash=1000,
+        add_cash=100,
+        add_cash_alarm=monthly_alarm,
+        params={'long entry slow sma': 200,
+                'long entry fast sma': 50,
+                'long exit slow sma': 200,
+                'long exit fast sma': 50,
+                'consolidation period': 20,
+                'consolidation width bp': 500},
+        name='consolidation')
+    for name, params in SMA_CROSS_PARAMS.items():
+        ret[name] = strategies.sma_cross.SmaCrossOpGen(
+            price_info=INSTRUMENT,
+            initial_cash=1000,
+            add_cash=100,
+            add_cash_alarm=monthly_alarm,
+            params=params,
+            name=name)
+    return ret
+
+
+def run_engine(engine: type) -> dict:
+    '''
+    Return totals of all strategies run by `engine`.
+    '''
+    ogs = opgens()
+    ops = []
+    for og in ogs.values():
+        ops += og.ops()
+    big_table = engine(ops, dfs=fixture_dfs()).run()
+    return {name: og.total(big_table).to_numpy()
+            for name, og in ogs.items()}
+
+
+def run_sma_cross_batch() -> dict:
+    '''
+    Return totals of SMA cross strategies run by SmaCrossBatch.
+    '''
+    totals = strategies.sma_cross_batch.SmaCrossBatch(
+        params=list(SMA_CROSS_PARAMS.values()),
+        price_info=INSTRUMENT,
+        initial_cash=1000,
+        add_cash=100,
+        add_cash_alarm=vtime.Alarm('monthly')).run(fixture_dfs())
+    return {name: totals[i].to_numpy()
+            for i, name in enumerate(SMA_CROSS_PARAMS)}
+
+
+def run_vector_total() -> dict:
+    '''
+    Return totals of deposit-only strategies calculated at once.
+    '''
+    ogs = opgens()
+    dfs = fixture_dfs()
+    return {name: ogs[name].vector_total(dfs).to_numpy()
+            for name in ('saving', 'money_avg')}
+
+
+def run_stream() -> dict:
+    '''
+    Return totals of all strategies run in chunks by backtest.stream.
+    '''
+    lookback = backtest.stream.max_lookback(list(opgens().values()))
+    try:
+        return run_engine(functools.partial(backtest.stream.BacktestEngine,
+                                            lookback=lookback,
+                                            chunk_size=1000))
+    except backtest.program.CompileError as e:
+        pytest.skip(f'not compiled: {e}')
+        return {}
+
+
+RUNNERS = {
+    REFERENCE: lambda: run_engine(vfin.BacktestEngine),
+    'vector': lambda: run_engine(backtest.vector.BacktestEngine),
+    'program': lambda: run_engine(backtest.program.BacktestEngine),
+    'stream': run_stream,
+    'sma_cross_batch': run_sma_cross_batch,
+    'vector_total': run_vector_total,
+}
+
+
+@functools.cache
+def reference() -> dict:
+    '''
+    Return totals of the reference engine, run once per session.
+    '''
+    return RUNNERS[REFERENCE]()
+
+
+@pytest.mark.parametrize('runner', [r for r in RUNNERS if r != REFERENCE])
+def test_reference(runner):
+    '''
+    Totals of every row are equal to the reference engine.
+    '''
+    expected = reference()
+    for name, total in RUNNERS[runner]().items():
+        np.testing.assert_array_equal(total, expected[name])
+
+
+@pytest.mark.parametrize('runner', list(RUNNERS))
+def test_golden(runner):
+    '''
+    Totals of every row match the recordings.
+    '''
+    record = bool(os.environ.get('GOLDEN_RECORD'))
+    for name, total in RUNNERS[runner]().items():
+        path = os.path.join(GOLDEN_PATH, f'{name}.npy')
+        if runner == REFERENCE and record:
+            os.makedirs(GOLDEN_PATH, exist_ok=True)
+            np.save(path, total)
+            continue
+        if not os.path.exists(path):
+            pytest.fail(f'{name} not recorded, run `make golden`')
+        np.testing.assert_array_equal(total, np.load(path))
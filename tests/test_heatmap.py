@@ -0,0 +1,29 @@
+'''
+Test probability heatmaps of forward returns.
+'''
+import numpy as np
+import backtest.heatmap
+
+
+def test_heatmap(tmp_path):
+    '''
+    Forward returns of every trigger are counted per horizon,
+    past the last bar they are skipped.
+    '''
+    close = np.array([100.0, 110.0, 99.0, 100.0, 120.0])
+    signal = np.array([True, False, False, True, True])
+    events = backtest.heatmap.triggers(signal)
+    np.testing.assert_array_equal(events, [0, 3])
+    returns = backtest.heatmap.forward_returns(close, events, [1, 2])
+    np.testing.assert_allclose(returns, [[0.1, -0.01], [0.2, np.nan]])
+
+    edges = [-1.0, 0.0, 1.0]
+    h = backtest.heatmap.heatmap(close, signal, [1, 2], edges,
+                                 path=str(tmp_path))
+    np.testing.assert_array_equal(h.counts, [[0, 2], [1, 0]])
+    cached = backtest.heatmap.heatmap(close, signal, [1, 2], edges,
+                                      path=str(tmp_path))
+    np.testing.assert_array_equal(cached.counts, h.counts)
+    np.testing.assert_array_equal(
+        backtest.heatmap.combine([h, h]).probabilities(),
+        [[0.0, 1.0], [1.0, 0.0]])
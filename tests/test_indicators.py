@@ -0,0 +1,56 @@
+'''
+Test correctness of indicators.
+'''
+import numpy as np
+import talib as ta
+import vtable
+import strategies.indicators
+
+
+def test_rolling_sma():
+    '''
+    Streaming SMA matches ta.SMA row by row.
+    '''
+    rng = np.random.default_rng(0)
+    x = np.concatenate([[np.nan] * 3, rng.random(300) * 100])
+    for d in [1, 2, 5, 50]:
+        sma = strategies.indicators.RollingSma(d)
+        for i in range(len(x)):
+            np.testing.assert_equal(sma(x[:i + 1]), ta.SMA(x[:i + 1], d)[-1])
+        # restart from a non-continuous history
+        np.testing.assert_equal(sma(x[:10]), ta.SMA(x[:10], d)[-1])
+
+
+def test_rolling_range():
+    '''
+    Streaming relative range matches range_width() row by row,
+    windows holding a gap are NaN.
+    '''
+    rng = np.random.default_rng(0)
+    x = np.concatenate([[np.nan] * 3, rng.random(300) * 100])
+    x[100:120] = x[99]
+    # gaps after the first valid value
+    x[150] = np.nan
+    x[200:203] = np.nan
+    for d in [2, 5, 50]:
+        width = strategies.indicators.RollingRange(d)
+        expected = strategies.indicators.range_width(x, d)
+        for i in range(len(x)):
+            np.testing.assert_equal(width(x[:i + 1]), expected[i])
+        assert np.isnan(expected[150:150 + d]).all()
+        assert not np.isnan(expected[203 + d:]).any()
+        # restart from a non-continuous history
+        np.testing.assert_equal(
+            width(x[:10]), strategies.indicators.range_width(x[:10], d)[-1])
+
+
+def test_indicator_cache():
+    '''
+    Equal indicators are created once.
+    '''
+    src = vtable.DataInfo('^SPX', 'Close')
+    cache = strategies.indicators.IndicatorCache()
+    sma = cache.get(src, strategies.indicators.RollingSma, period=5)
+    assert cache.get(src, strategies.indicators.RollingSma, period=5) is sma
+    assert cache.get(src, strategies.indicators.RollingSma, period=6) is not sma
+    assert len(cache) == 2
@@ -0,0 +1,39 @@
+'''
+Test cache keys of strategy results.
+'''
+import pytest
+import backtest.memo
+import backtest.program
+import backtest.sweep
+import backtest.vector
+
+
+class _OpGen:
+    def __init__(self, name, price, score=None):
+        self.name = name
+        self.price = price
+        self.score = score
+
+
+def _score(total):
+    return total
+
+
+def test_key():
+    '''
+    Keys are equal for equal definitions and engines,
+    functions are keyed by name, unknown objects are rejected.
+    '''
+    def key(kwargs, engine=backtest.vector.BacktestEngine):
+        d = backtest.sweep.OpGenDef('test', _OpGen, kwargs)
+        return backtest.memo.key(d, 'digest', engine)
+
+    assert key({'price': 1.0, 'score': _score}) == \
+        key({'price': 1.0, 'score': _score})
+    assert key({'price': 1.0}) != key({'price': 2.0})
+    assert key({'price': 1.0}) != \
+        key({'price': 1.0}, backtest.program.BacktestEngine)
+    with pytest.raises(TypeError):
+        key({'price': 1.0, 'score': lambda total: total})
+    with pytest.raises(TypeError):
+        key({'price': object()})
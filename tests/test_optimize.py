@@ -0,0 +1,127 @@
+'''
+Test parameter optimization.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+import vtable
+import backtest.optimize
+import backtest.sweep
+
+DFS = {'^SPX': pd.DataFrame({'Close': np.arange(1000.0)},
+                            index=pd.date_range('2000-01-01', periods=1000))}
+SPACE = {'fast': list(range(20)), 'slow': list(range(10))}
+
+
+class OpGen:
+    '''
+    Strategy with the final total peaking at fast=7, slow=3.
+    '''
+    def __init__(self, name: str, params: dict):
+        self.name = name
+        self.params = params
+        self.di = {'total': vtable.DataInfo(name, 'total')}
+
+    def ops(self) -> list:
+        '''
+        Return (column, params) instead of ops, see Engine.
+        '''
+        return [(self.di['total'].name, self.params)]
+
+    def total(self, table: pd.DataFrame) -> pd.Series:
+        '''
+        Return the total column.
+        '''
+        return table[self.di['total'].name]
+
+
+# pylint: disable=too-few-public-methods
+class Engine:
+    '''
+    Engine writing the score of every candidate.
+    '''
+    def __init__(self, ops: list, dfs: dict):
+        self.ops = ops
+        self.dfs = dfs
+
+    def run(self) -> pd.DataFrame:
+        '''
+        Run.
+        '''
+        index = self.dfs['^SPX'].index
+        return pd.DataFrame({name: np.full(len(index),
+                                           -(p['fast'] - 7) ** 2
+                                           - (p['slow'] - 3) ** 2
+                                           + len(index) / 1000)
+                             for name, p in self.ops},
+                            index=index)
+
+
+def optimizer() -> backtest.optimize.Optimizer:
+    '''
+    Return an optimizer of OpGen.
+    '''
+    return backtest.optimize.Optimizer(OpGen,
+                                       {},
+                                       DFS,
+                                       SPACE,
+                                       workers=2,
+                                       engine=Engine,
+                                       seed=1)
+
+
+def test_successive_halving():
+    '''
+    Candidates are pruned on part of the history,
+    long enough to score after the lookback.
+    '''
+    result = optimizer().successive_halving(81)
+    full = [e for e in result.history if e.fraction >= 1]
+    assert len(full) == 1
+    first = min(e.fraction for e in result.history)
+    assert len(backtest.optimize.head(DFS, first)['^SPX']) >= \
+        backtest.optimize.EVAL_BARS
+    assert len(result.history) < 81 * 2
+    assert result.best is full[0]
+
+
+def test_coordinate_descent():
+    '''
+    The maximum is found from the corner of the space.
+    '''
+    result = optimizer().coordinate_descent({'fast': 0, 'slow': 0})
+    assert result.best_params == {'fast': 7, 'slow': 3}
+    assert len(result.history) < len(SPACE['fast']) * len(SPACE['slow'])
+
+
+def _nan_score(opgen: OpGen, table: pd.DataFrame) -> float:
+    # the maximum can not be scored
+    if opgen.params == {'fast': 7, 'slow': 3}:
+        return np.nan
+    return backtest.sweep.final_total(opgen, table)
+
+
+def test_nan_score():
+    '''
+    NaN scores are never the best.
+    '''
+    opt = optimizer()
+    opt.score = _nan_score
+    result = opt.coordinate_descent({'fast': 7, 'slow': 3})
+    assert np.isnan(result.history[0].score)
+    assert result.best_params != {'fast': 7, 'slow': 3}
+    assert result.best_score == max(e.score for e in result.history[1:])
+
+
+def test_no_score():
+    '''
+    ValueError if no candidate is scored over the whole history.
+    '''
+    with pytest.raises(ValueError):
+        optimizer().random(0)
+    opt = optimizer()
+    opt.valid = lambda p: False
+    with pytest.raises(ValueError):
+        opt.random(10)
+    with pytest.raises(ValueError):
+        opt.coordinate_descent()
@@ -0,0 +1,20 @@
+'''
+Test downsampling of plotted tables.
+'''
+import numpy as np
+import backtest.plot
+
+
+def test_decimate():
+    '''
+    Downsampled rows keep the first and last row and the extremes.
+    '''
+    values = np.sin(np.arange(10000) / 100.0)
+    values[1234] = 5.0
+    values[2000:2100] = np.nan
+    rows = backtest.plot.decimate(values, 100)
+    assert len(rows) <= 100
+    assert rows[0] == 0 and rows[-1] == len(values) - 1
+    assert np.all(np.diff(rows) > 0)
+    assert 1234 in rows
+    assert np.nanmin(values[rows]) == np.nanmin(values)
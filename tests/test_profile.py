@@ -0,0 +1,36 @@
+'''
+Test per-op profiling.
+'''
+import backtest.profile
+
+
+# pylint: disable=too-few-public-methods
+class Op:
+    '''
+    Op calling a function with kwargs.
+    '''
+    def __init__(self, function, kwargs):
+        self.function = function
+        self.kwargs = kwargs
+
+    def execute(self):
+        '''
+        Call the function.
+        '''
+        return self.function(**self.kwargs)
+
+
+def test_profiler():
+    '''
+    Calls of instrumented ops are counted per op and per opgen.
+    '''
+    profiler = backtest.profile.Profiler()
+    ops = profiler.instrument([Op(lambda x: x + 1, {'x': 1}),
+                               Op(lambda x: x * 2, {'x': 2})],
+                              'opgen')
+    with profiler.run():
+        for _ in range(3):
+            assert [op.execute() for op in ops] == [2, 4]
+    assert [s.calls for s in profiler.stats] == [3, 3]
+    assert profiler.opgens()['opgen']['calls'] == 6
+    assert 'opgen[0] function=' in profiler.report()
@@ -0,0 +1,123 @@
+'''
+Test batch statistics of strategies.
+'''
+import numpy as np
+import pandas as pd
+import vtable
+import backtest.alarm
+import backtest.stats
+
+
+def test_summary():
+    '''
+    Statistics of a held asset and of cash only receiving deposits.
+    '''
+    index = pd.bdate_range('2000-01-03', periods=500)
+    prices = 100.0 * np.exp(np.sin(np.arange(500) / 20.0) / 10.0)
+    hold = 1000.0 * prices / prices[0]
+    deposits = np.where(np.arange(500) % 21 == 0, 100.0, 0.0)
+    deposits[0] = 0.0
+    cash = 1000.0 + np.cumsum(deposits)
+    stats = backtest.stats.summary(['hold', 'cash'],
+                                   index,
+                                   np.stack([hold, cash], axis=1),
+                                   deposits=np.stack([np.zeros(500),
+                                                      deposits], axis=1))
+
+    r = np.diff(hold) / hold[:-1]
+    assert np.isclose(stats.loc['hold', 'sharpe'],
+                      r.mean() / r.std(ddof=1) * np.sqrt(252))
+    peak = np.maximum.accumulate(hold)
+    assert np.isclose(stats.loc['hold', 'max drawdown'],
+                      (hold / peak - 1).min())
+    assert stats.loc['hold', 'exposure'] == 1.0
+    assert stats.loc['hold', 'trades'] == 1
+    assert stats.loc['cash', 'final'] == cash[-1]
+    assert stats.loc['cash', 'cagr'] == 0.0
+    assert stats.loc['cash', 'exposure'] == 0.0
+    assert stats.loc['cash', 'trades'] == 0
+    assert list(backtest.stats.top(stats, k=1).index) == ['hold']
+
+
+class _OpGen:
+    def __init__(self, name, add_cash=0, add_cash_alarm=None):
+        self.add_cash = add_cash
+        self.add_cash_alarm = add_cash_alarm
+        self.di = {'total': vtable.DataInfo(name, 'total')}
+
+
+def test_from_tables():
+    '''
+    Deposits are taken from the add cash alarm of every strategy.
+    '''
+    index = pd.bdate_range('2000-01-03', periods=100)
+    deposits = np.where(backtest.alarm.period_mask('monthly', index),
+                        100.0, 0.0)
+    opgens = {'cash': _OpGen('cash', 100, 'monthly'),
+              'hold': _OpGen('hold')}
+    table = pd.DataFrame({'cash total': 1000.0 + np.cumsum(deposits),
+                          'hold total': np.linspace(1000.0, 1100.0, 100)},
+                         index=index)
+    stats = backtest.stats.from_tables(opgens,
+                                       {name: table for name in opgens})
+    assert stats.loc['cash', 'exposure'] == 0.0
+    assert stats.loc['hold', 'exposure'] == 1.0
+
+
+class _SignalOpGen(_OpGen):
+    def __init__(self, name):
+        _OpGen.__init__(self, name)
+        for s in backtest.stats.SIGNALS:
+            self.di[f'{s} signal'] = vtable.DataInfo(name, f'{s} signal')
+
+
+def test_signals():
+    '''
+    Exposure and trades are replayed from the signals if they are
+    in the table, bars in the market with an unchanged price count,
+    otherwise they are estimated from returns.
+    '''
+    index = pd.bdate_range('2000-01-03', periods=10)
+    # long from the close of bar 2 to the close of bar 6,
+    # the price is unchanged in bar 4
+    total = np.array([1000.0, 1000, 1000, 1010, 1010, 1020, 1030,
+                      1030, 1030, 1030])
+    entry = np.zeros(10, dtype=bool)
+    entry[[2, 4]] = True
+    exit_ = np.zeros(10, dtype=bool)
+    exit_[[1, 6]] = True
+    table = pd.DataFrame({'sig total': total,
+                          'sig long entry signal': entry,
+                          'sig long exit signal': exit_,
+                          'sig short entry signal': False,
+                          'sig short exit signal': False,
+                          'est total': total},
+                         index=index)
+    opgens = {'sig': _SignalOpGen('sig'), 'est': _OpGen('est')}
+    stats = backtest.stats.from_tables(opgens,
+                                       {name: table for name in opgens})
+    assert stats.loc['sig', 'exposure'] == 4 / 9
+    assert stats.loc['sig', 'trades'] == 1
+    assert stats.loc['est', 'exposure'] == 3 / 9
+    assert stats.loc['est', 'trades'] == 2
+
+
+def test_positions():
+    '''
+    Entries need cash, exits before entries return it,
+    NaN signals are off.
+    '''
+    nan = np.nan
+    held = backtest.stats.positions(
+        [1000.0, 0.0],
+        np.array([[0.0, 0], [0, 0], [0, 100], [0, 0], [0, 0]]),
+        long_entry=np.array([[1.0], [0], [1], [nan], [1]]),
+        long_exit=np.array([[0.0], [0], [0], [1], [1]]),
+        short_entry=np.array([[0.0], [1], [0], [1], [0]]),
+        short_exit=np.array([[0.0], [0], [0], [0], [1]]))
+    long, short = backtest.stats.LONG, backtest.stats.SHORT
+    np.testing.assert_array_equal(held, [[long, 0],
+                                         [long, 0],
+                                         [long, long],
+                                         [short, short],
+                                         [long, long]])
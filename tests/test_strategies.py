@@ -2,16 +2,34 @@
 Test correctness of strategy simulations.
 '''
 import datetime
+import os
 import numpy as np
+import pytest
 import vfin
+import vfin_ops
 import vtime
 import vtable
+import backtest.kernel
+import backtest.program
+import backtest.store
+import backtest.vector
+import strategies.indicators
 import strategies.saving
 import strategies.money_avg
 import strategies.sma_cross
+import strategies.sma_cross_batch
 
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__),
+                            'fixtures',
+                            'price_store')
 
-def test():
+
+# expected totals are of the real ^SPX history
+@pytest.mark.network
+@pytest.mark.parametrize('engine', [vfin.BacktestEngine,
+                                    backtest.vector.BacktestEngine,
+                                    backtest.program.BacktestEngine])
+def test(engine):
     '''
     Test.
     '''
@@ -20,11 +38,12 @@ def test():
                                      slippage=0.5)
 
     dfs = {
-        '^SPX': vfin.fetch_ticker('^SPX',
-                                  start=datetime.datetime(1960, 1, 1),
-                                  end=datetime.datetime(2023, 11, 1))
+        '^SPX': backtest.store.fetch_ticker('^SPX',
+                                            start=datetime.datetime(1960, 1, 1),
+                                            end=datetime.datetime(2023, 11, 1))
     }
     monthly_alarm = vtime.Alarm('monthly')
+    indicator_cache = strategies.indicators.IndicatorCache()
 
     saving_opgen = strategies.saving.SavingOpGen(
         initial_cash=1000,
@@ -42,6 +61,7 @@ def test():
         initial_cash=1000,
         add_cash=100,
         add_cash_alarm=monthly_alarm,
+        indicator_cache=indicator_cache,
         params={'long entry slow sma': 200,
                 'long entry fast sma': 50,
                 'long exit slow sma': 200,
@@ -56,6 +76,7 @@ def test():
         initial_cash=1000,
         add_cash=100,
         add_cash_alarm=monthly_alarm,
+        indicator_cache=indicator_cache,
         params={'long entry slow sma': 200,
                 'long entry fast sma': 50,
                 'long exit slow sma': 200,
@@ -66,12 +87,13 @@ def test():
         initial_cash=1000,
         add_cash=100,
         add_cash_alarm=monthly_alarm,
+        indicator_cache=indicator_cache,
         params={'short entry slow sma': 200,
                 'short entry fast sma': 50,
                 'short exit slow sma': 200,
                 'short exit fast sma': 50})
 
-    big_table = vfin.BacktestEngine(
+    big_table = engine(
         saving_opgen.ops() +
         money_avg_opgen.ops() +
         sma_cross_opgen.ops() +
@@ -95,3 +117,159 @@ def test():
     np.testing.assert_almost_equal(
         sma_cross_short_opgen.total(big_table).iloc[-1],
         53469.464345512264)
+
+
+def fixture_dfs() -> dict:
+    '''
+    Return input tables from the offline fixture.
+    '''
+    store = backtest.store.PriceStore(FIXTURE_PATH, offline=True)
+    return {
+        '^SPX': store.fetch_ticker('^SPX',
+                                   start=datetime.datetime(1960, 1, 1),
+                                   end=datetime.datetime(2023, 11, 1))
+    }
+
+
+def test_sma_cross_batch():
+    '''
+    Batch simulation by backtest.kernel matches SmaCrossOpGen
+    run by the reference engine for every parameter set, offline.
+    '''
+    instrument = vfin.InstrumentInfo(ticker_name='^SPX',
+                                     di={'close': vtable.DataInfo('^SPX', 'Close')},
+                                     slippage=0.5)
+    dfs = fixture_dfs()
+    monthly_alarm = vtime.Alarm('monthly')
+
+    params = [
+        {'long entry slow sma': 200,
+         'long entry fast sma': 50,
+         'long exit slow sma': 200,
+         'long exit fast sma': 50,
+         'short entry slow sma': 200,
+         'short entry fast sma': 50,
+         'short exit slow sma': 200,
+         'short exit fast sma': 50},
+        {'long entry slow sma': 200,
+         'long entry fast sma': 50,
+         'long exit slow sma': 200,
+         'long exit fast sma': 50},
+        {'short entry slow sma': 200,
+         'short entry fast sma': 50,
+         'short exit slow sma': 200,
+         'short exit fast sma': 50},
+        {'long entry slow sma': 20,
+         'long entry fast sma': 5,
+         'long exit slow sma': 30,
+         'long exit fast sma': 10},
+    ]
+    opgens = [strategies.sma_cross.SmaCrossOpGen(
+        price_info=instrument,
+        initial_cash=1000,
+        add_cash=100,
+        add_cash_alarm=monthly_alarm,
+        params=p) for p in params]
+    ops = []
+    for opgen in opgens:
+        ops += opgen.ops()
+    big_table = vfin.BacktestEngine(ops, dfs=dfs).run()
+
+    totals = strategies.sma_cross_batch.SmaCrossBatch(
+        params=params,
+        price_info=instrument,
+        initial_cash=1000,
+        add_cash=100,
+        add_cash_alarm=monthly_alarm).run(dfs)
+
+    for i, opgen in enumerate(opgens):
+        np.testing.assert_allclose(totals[i].to_numpy(),
+                                   opgen.total(big_table).to_numpy())
+
+
+def test_kernel_closed_forms():
+    '''
+    Closed-form totals of backtest.kernel and the alarm signal match
+    the reference engine bit for bit, offline.
+    '''
+    instrument = vfin.InstrumentInfo(ticker_name='^SPX',
+                                     di={'close': vtable.DataInfo('^SPX', 'Close')},
+                                     slippage=0.5)
+    dfs = fixture_dfs()
+    monthly_alarm = vtime.Alarm('monthly')
+    saving_opgen = strategies.saving.SavingOpGen(
+        initial_cash=1000,
+        add_cash=100,
+        add_cash_alarm=monthly_alarm)
+    money_avg_opgen = strategies.money_avg.MoneyAvgOpGen(
+        price_info=instrument,
+        initial_cash=1000,
+        add_cash=100,
+        add_cash_alarm=monthly_alarm)
+    big_table = vfin.BacktestEngine(saving_opgen.ops() +
+                                    money_avg_opgen.ops(),
+                                    dfs=dfs).run()
+
+    np.testing.assert_array_equal(
+        backtest.kernel.alarm_signal(monthly_alarm, dfs),
+        big_table[money_avg_opgen.opgens['add cash alarm']
+                  .di['signal'].name].to_numpy(dtype=bool))
+    for opgen in [saving_opgen, money_avg_opgen]:
+        np.testing.assert_array_equal(opgen.vector_total(dfs).to_numpy(),
+                                      opgen.total(big_table).to_numpy())
+
+
+@pytest.mark.parametrize('initial_cash', [1000, 0])
+def test_kernel_simulate(initial_cash):
+    '''
+    Closed-form totals of backtest.kernel are equal bit for bit
+    to backtest.kernel.simulate(), including NaN closes.
+    '''
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(size=300))
+    alarm = rng.random(300) < 0.05
+    alarm[:10] = False
+    np.testing.assert_array_equal(
+        backtest.kernel.saving(initial_cash, 100, alarm),
+        backtest.kernel.simulate(close, 0.5, initial_cash, 100,
+                                 alarm=alarm)[:, 0])
+    # NaN closes before and after the first alarm, on an alarm row
+    close[[3, 150, np.flatnonzero(alarm)[-1]]] = np.nan
+    np.testing.assert_array_equal(
+        backtest.kernel.money_avg(close, 0.5, initial_cash, 100, alarm),
+        backtest.kernel.simulate(close, 0.5, initial_cash, 100,
+                                 alarm=alarm, long_entry=alarm)[:, 0])
+
+
+def _double(x):
+    return x[-1] * 2
+
+
+def _add_one(x):
+    return x[-1] + 1
+
+
+def test_program_duplicates():
+    '''
+    Duplicate calls are aliased only if their inputs can not change
+    within the row, calls reading a slot with several writers are not.
+    '''
+    close = vtable.DataInfo('^SPX', 'Close')
+    cash = vtable.DataInfo('test', 'cash', first_value=0.0)
+    ret = [vtable.DataInfo('test', f'ret {i}') for i in range(4)]
+    ops = [
+        vfin_ops.Call(function=_double, kwargs={'x': close}, ret=ret[0]),
+        vfin_ops.Call(function=_double, kwargs={'x': close}, ret=ret[1]),
+        vfin_ops.Call(function=_double, kwargs={'x': cash}, ret=ret[2]),
+        vfin_ops.Call(function=_add_one, kwargs={'x': cash}, ret=cash),
+        vfin_ops.Call(function=_add_one, kwargs={'x': cash}, ret=cash),
+        vfin_ops.Call(function=_double, kwargs={'x': cash}, ret=ret[3]),
+    ]
+    dfs = fixture_dfs()
+    program = backtest.program.Program(ops, dfs)
+    assert program.duplicates == 1
+    expected = vfin.BacktestEngine(ops, dfs).run()
+    table = program.run()
+    for di in ret:
+        np.testing.assert_array_equal(table[di.name].to_numpy(),
+                                      expected[di.name].to_numpy())
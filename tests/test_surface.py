@@ -0,0 +1,28 @@
+'''
+Test parameter surfaces.
+'''
+import numpy as np
+import pandas as pd
+import backtest.surface
+
+
+def test_grid():
+    '''
+    Results are aggregated per cell, missing cells are NaN.
+    '''
+    params = pd.DataFrame({'fast': [5, 5, 5, 6, 7],
+                           'slow': [10, 10, 20, 20, 30],
+                           'other': [1, 2, 1, 1, 1]},
+                          index=list('abcde'))
+    results = pd.Series([1.0, 3.0, 2.0, np.nan, 4.0], index=list('abcde'))
+    g = backtest.surface.grid(params, results, ['fast', 'slow'], agg='max')
+    np.testing.assert_array_equal(g.values[0], [5, 6, 7])
+    np.testing.assert_array_equal(g.values[1], [10, 20, 30])
+    np.testing.assert_array_equal(g.data,
+                                  [[3.0, 2.0, np.nan],
+                                   [np.nan, np.nan, np.nan],
+                                   [np.nan, np.nan, 4.0]])
+    assert g.best() == {'fast': 7, 'slow': 30}
+    g = backtest.surface.grid(params, results, ['fast', 'slow'],
+                              agg='median')
+    assert g.data[0, 0] == 2.0
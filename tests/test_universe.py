@@ -0,0 +1,77 @@
+'''
+Test backtests over a universe of tickers.
+'''
+import numpy as np
+import pandas as pd
+import vfin_ops
+import vtable
+import backtest.program
+import backtest.universe
+
+INDEX = pd.bdate_range('2020-01-01', periods=40)
+DFS = {
+    'A': pd.DataFrame({'Close': np.arange(40.0) + 1},
+                      index=INDEX),
+    # gaps in the union calendar
+    'B': pd.DataFrame({'Close': np.arange(30.0) + 100},
+                      index=INDEX[5:].delete([3, 10, 11, 20, 30])),
+}
+
+
+def _add(close, x):
+    return x[-2] + close[-1]
+
+
+class OpGen:
+    '''
+    Strategy summing close prices.
+    '''
+    def __init__(self, name, price_info):
+        self.name = name
+        self.price_info = price_info
+        self.di = {'total': vtable.DataInfo(name, 'total', first_value=0.0)}
+
+    def ops(self) -> list:
+        '''
+        Return the sum op.
+        '''
+        return [vfin_ops.Call(function=_add,
+                              kwargs={'close': self.price_info.di['close'],
+                                      'x': self.di['total']},
+                              ret=self.di['total'])]
+
+    def total(self, table: pd.DataFrame) -> pd.Series:
+        '''
+        Return the total column.
+        '''
+        return table[self.di['total'].name]
+
+
+def test_align():
+    '''
+    Prices are aligned to the union calendar, NaN where a ticker has no bar.
+    '''
+    index, tickers, matrix = backtest.universe.align(DFS)
+    assert index.equals(INDEX)
+    assert tickers == ['A', 'B']
+    np.testing.assert_array_equal(matrix[0], DFS['A']['Close'].to_numpy())
+    rows = index.get_indexer(DFS['B'].index)
+    np.testing.assert_array_equal(matrix[1, rows],
+                                  DFS['B']['Close'].to_numpy())
+    assert np.isnan(np.delete(matrix[1], rows)).all()
+
+
+def test_run():
+    '''
+    Totals of every ticker are equal to a backtest of the ticker alone.
+    '''
+    template = backtest.universe.Template('sum', OpGen, {})
+    result = backtest.universe.run([template], DFS, workers=2, chunk_size=1)
+    for ticker, df in DFS.items():
+        opgen = template.create(ticker)
+        expected = opgen.total(backtest.program.BacktestEngine(
+            opgen.ops(), {ticker: df}).run())
+        total = result.total('sum', ticker)
+        np.testing.assert_array_equal(total[df.index].to_numpy(),
+                                      expected.to_numpy())
+        assert np.isnan(total.drop(df.index)).all()
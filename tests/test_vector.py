@@ -0,0 +1,88 @@
+'''
+Test vector operations.
+'''
+import functools
+import numpy as np
+import pandas as pd
+import vfin_ops
+import vtable
+import backtest.program
+import backtest.vector
+
+
+def _shift(x, n):
+    return np.concatenate((np.full(n, np.nan), x[:len(x) - n]))
+
+
+def _above(x, y):
+    return x > y
+
+
+def _row_shift(x, n):
+    return x[-1 - n] if len(x) > n else np.nan
+
+
+def _row_above(x, y):
+    return x[-1] > y[-1]
+
+
+def _count(signal, x):
+    return x[-2] + 1.0 if signal[-1] else x[-2]
+
+
+def _ops(n: int) -> list:
+    # the same column names for every `n`
+    close = vtable.DataInfo('^SPX', 'Close')
+    shifted = vtable.DataInfo('test', 'shifted')
+    signal = vtable.DataInfo('test', 'signal')
+    return [
+        backtest.vector.Call(function=functools.partial(_row_shift, n=n),
+                             vector_function=functools.partial(_shift, n=n),
+                             kwargs={'x': close},
+                             ret=shifted),
+        backtest.vector.Call(function=_row_above,
+                             vector_function=_above,
+                             kwargs={'x': close, 'y': shifted},
+                             ret=signal),
+    ]
+
+
+def test_cache_key():
+    '''
+    Calculated columns are cached by what calculates them, not by name.
+    '''
+    close = np.array([3.0, 1.0, 2.0, 5.0, 4.0, 6.0])
+    dfs = {'^SPX': pd.DataFrame({'Close': close},
+                                index=pd.date_range('2020-01-01', periods=6))}
+    cache = {}
+    for n in [1, 2, 1]:
+        _, prepared = backtest.vector.prepare(_ops(n), dfs, cache)
+        np.testing.assert_array_equal(prepared['test']['signal'].to_numpy(),
+                                      close > _shift(close, n))
+    assert len(cache) == 4
+
+
+def test_transient():
+    '''
+    Transient vector results are calculated row by row in scratch rows,
+    with equal results.
+    '''
+    close = np.array([3.0, 1.0, 2.0, 5.0, 4.0, 6.0])
+    dfs = {'^SPX': pd.DataFrame({'Close': close},
+                                index=pd.date_range('2020-01-01', periods=6))}
+    total = vtable.DataInfo('test', 'total', first_value=0.0)
+    ops = _ops(2) + [vfin_ops.Call(function=_count,
+                                   kwargs={'signal': _ops(2)[1].ret,
+                                           'x': total},
+                                   ret=total)]
+    full = backtest.program.BacktestEngine(ops, dfs)
+    transient = backtest.program.BacktestEngine(
+        ops, dfs, transient=[op.ret for op in _ops(2)])
+    p = transient.program
+    assert {p.dis[s].name for s in p.transient} == \
+        {'test shifted', 'test signal'}
+    assert not set(p.inputs) & p.transient
+    table = transient.run()
+    assert not {'test shifted', 'test signal'} & set(table.columns)
+    np.testing.assert_array_equal(table['test total'].to_numpy(),
+                                  full.run()['test total'].to_numpy())
@@ -0,0 +1,113 @@
+'''
+Test walk-forward evaluation.
+'''
+import functools
+import numpy as np
+import pandas as pd
+import vfin_ops
+import vtable
+import backtest.vector
+import backtest.walk_forward
+
+DFS = {'^SPX': pd.DataFrame(
+    {'Close': 100.0 + np.cumsum(np.sin(np.arange(300) / 7.0))},
+    index=pd.date_range('2000-01-01', periods=300))}
+SPACE = {'period': [1, 3, 5, 9]}
+
+
+def _shift(x, period):
+    return np.concatenate((np.full(period, np.nan), x[:len(x) - period]))
+
+
+def _row_shift(x, period):
+    return x[-1 - period] if len(x) > period else np.nan
+
+
+def _rising(x, y):
+    return x > y
+
+
+def _row_rising(x, y):
+    return x[-1] > y[-1]
+
+
+def _carry(x):
+    return x[-2]
+
+
+def _count(signal, x):
+    return x[-1] + 1.0 if signal[-1] else x[-1]
+
+
+class OpGen:
+    '''
+    Strategy counting bars where the price rose over 'period' bars.
+    '''
+    def __init__(self, name: str, params: dict):
+        self.name = name
+        self.params = params
+        self.di = {'shifted': vtable.DataInfo(name, 'shifted'),
+                   'signal': vtable.DataInfo(name, 'signal'),
+                   'total': vtable.DataInfo(name, 'total', first_value=0.0)}
+
+    def ops(self) -> list:
+        '''
+        Return vector signal ops and the sequential count.
+        '''
+        close = vtable.DataInfo('^SPX', 'Close')
+        period = self.params['period']
+        return [
+            backtest.vector.Call(
+                function=functools.partial(_row_shift, period=period),
+                vector_function=functools.partial(_shift, period=period),
+                kwargs={'x': close},
+                ret=self.di['shifted']),
+            backtest.vector.Call(function=_row_rising,
+                                 vector_function=_rising,
+                                 kwargs={'x': close,
+                                         'y': self.di['shifted']},
+                                 ret=self.di['signal']),
+            vfin_ops.Call(function=_carry,
+                          kwargs={'x': self.di['total']},
+                          ret=self.di['total']),
+            vfin_ops.Call(function=_count,
+                          kwargs={'signal': self.di['signal'],
+                                  'x': self.di['total']},
+                          ret=self.di['total']),
+        ]
+
+    def total(self, table: pd.DataFrame) -> pd.Series:
+        '''
+        Return the total column.
+        '''
+        return table[self.di['total'].name]
+
+
+def _score(opgen: OpGen, table: pd.DataFrame) -> float:
+    # prefers other periods in other folds
+    return -abs(opgen.params['period'] - len(table) / 40)
+
+
+def test_optimize():
+    '''
+    Every fold trades on its own params, equal to a single-fold run.
+    '''
+    splits = backtest.walk_forward.splits(300,
+                                          n_folds=3,
+                                          train_size=60,
+                                          anchored=True)
+    folds = backtest.walk_forward.WalkForward(DFS,
+                                              splits,
+                                              workers=1,
+                                              score=_score).optimize(
+        'rising', OpGen, {}, SPACE, method='coordinate_descent')
+    params = [fold.defs[0].kwargs['params'] for fold in folds]
+    assert len({p['period'] for p in params}) > 1
+    for split, fold in zip(splits, folds):
+        d = fold.defs[0]
+        single = backtest.walk_forward.WalkForward(DFS,
+                                                   [split],
+                                                   workers=1).run([[d]])[0]
+        np.testing.assert_array_equal(
+            d.create().total(fold.table).to_numpy(),
+            d.create().total(single.table).to_numpy())